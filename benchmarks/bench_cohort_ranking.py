@@ -0,0 +1,108 @@
+"""
+群体趋势排名测试：在临时数据库中生成大量患者和评估，记录全量载入、排名接口和增量更新的耗时，
+并抽样与逐个患者 np.polyfit 的结果比对。载入或排名超出时限、或结果不一致时退出码为 1
+
+用法:
+    python benchmarks/bench_cohort_ranking.py [--patients 100000] [--assessments 1000000] [--limit-seconds 10]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dbseed import BASE_TIME, seed, setup_database  # noqa: E402
+
+
+def add_assessments(pairs, count, rng):
+    """用原生 SQL 追加 count 条评估（时间晚于已有数据），模拟新到达的评估"""
+    from datetime import timedelta
+    from django.db import connection, transaction
+
+    start = BASE_TIME + timedelta(days=3650)
+    rows = []
+    for i in range(count):
+        patient_id, conversation_id = pairs[rng.randrange(len(pairs))]
+        rows.append((patient_id, conversation_id, (start + timedelta(minutes=i)).isoformat(sep=' '),
+                     'mild', 0.7, json.dumps({'severity_score': round(rng.random(), 2)})))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO core_dementiaassessment '
+            '(patient_id, conversation_id, assessment_date, severity, confidence_score, detailed_results, predictor_version) '
+            "VALUES (%s, %s, %s, %s, %s, %s, '')", rows)
+
+
+def check_slopes(sample):
+    """抽样比对排名结果与逐个患者 np.polyfit 的斜率，返回最大绝对误差"""
+    from core.models import DementiaAssessment
+
+    worst = 0.0
+    for row in sample:
+        points = [
+            (date.timestamp() / 86400, results.get('severity_score'))
+            for date, results in DementiaAssessment.objects.filter(patient_id=row['patient_pk'])
+            .values_list('assessment_date', 'detailed_results')
+        ]
+        x, y = np.array(points, dtype=np.float64).T
+        worst = max(worst, abs(np.polyfit(x, y, 1)[0] - row['slope_per_day']))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=100_000, help='患者数')
+    parser.add_argument('--assessments', type=int, default=1_000_000, help='评估总数')
+    parser.add_argument('--new', type=int, default=1000, help='增量更新测试追加的评估数')
+    parser.add_argument('--limit-seconds', type=float, default=10.0, help='全量载入和排名的总耗时上限（秒）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        from core.models import Patient
+        from core.utils.cohort import cohort_ranking, reset_cohort_index
+
+        start = time.perf_counter()
+        _, pairs = seed(patients=args.patients, assessments=args.assessments)
+        print(f'seeded {args.patients} patients, {args.assessments} assessments in '
+              f'{time.perf_counter() - start:.1f}s')
+        patient_ids = list(Patient.objects.values_list('id', flat=True))
+
+        reset_cohort_index()
+        start = time.perf_counter()
+        rows, total, summary = cohort_ranking(patient_ids, limit=100)
+        cold = time.perf_counter() - start
+        print(f'cold ranking (full load + rank): {cold:.2f}s, {total} ranked patients')
+
+        start = time.perf_counter()
+        cohort_ranking(patient_ids, limit=100)
+        warm = time.perf_counter() - start
+        print(f'warm ranking: {warm * 1000:.1f} ms')
+
+        add_assessments(pairs, args.new, random.Random(1))
+        start = time.perf_counter()
+        incremental_rows, _, _ = cohort_ranking(patient_ids, limit=100)
+        incremental = time.perf_counter() - start
+        print(f'ranking after {args.new} new assessments: {incremental * 1000:.1f} ms')
+
+        reset_cohort_index()
+        full_rows, _, _ = cohort_ranking(patient_ids, limit=100)
+        same = [row['patient_pk'] for row in incremental_rows] == [row['patient_pk'] for row in full_rows]
+        drift = max(abs(a['slope_per_day'] - b['slope_per_day']) for a, b in zip(incremental_rows, full_rows))
+        print(f'incremental vs full reload: same order {same}, max slope difference {drift:.2e}')
+
+        error = check_slopes(full_rows[:20])
+        print(f'max slope error vs np.polyfit on 20 patients: {error:.2e}')
+        print(f'cohort slope percentiles: {summary}')
+
+    failed = cold > args.limit_seconds or not same or drift > 1e-9 or error > 1e-9
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
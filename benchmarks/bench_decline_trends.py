@@ -0,0 +1,99 @@
+"""
+语言下降趋势基准测试：比较逐样本提取特征 + 逐指标 np.polyfit 与闭式向量化实现
+
+用法:
+    python benchmarks/bench_decline_trends.py [--samples 10000] [--window 50]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.text_processor import TextProcessor  # noqa: E402
+from core.utils.trends import linear_trends  # noqa: E402
+
+SEED = 20250323
+PHRASES = [
+    '我 今天 去 公园 散步', '嗯 那个 那个 东西', '我 忘了 刚才 做 什么', '医院 在哪里',
+    '然后 就是 这个', '记不起来 了...', '昨天 女儿 来 看 我', '这是哪里', '那个人 是 谁',
+]
+
+
+def polyfit_indicators(processor, text_samples):
+    """原始实现：逐样本提取特征，逐指标调用 np.polyfit"""
+    features_over_time = [processor.extract_features(text) for text in text_samples]
+    x = np.array(range(len(text_samples)))
+    result = {}
+    for name, column, _ in processor.DECLINE_METRICS:
+        result[name] = np.polyfit(x, np.array([f[column] for f in features_over_time]), 1)[0]
+    return result
+
+
+def run(sample_count, window):
+    rng = random.Random(SEED)
+    texts = [
+        '。'.join(rng.choice(PHRASES) for _ in range(rng.randint(1, 4)))
+        for _ in range(sample_count)
+    ]
+    start_time = datetime(2024, 1, 1)
+    timestamps = []
+    current = start_time
+    for _ in range(sample_count):
+        current += timedelta(minutes=rng.randint(1, 600))
+        timestamps.append(current)
+
+    processor = TextProcessor()
+
+    start = time.perf_counter()
+    expected = polyfit_indicators(processor, texts)
+    polyfit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = processor.compute_language_decline_indicators(texts)
+    closed_time = time.perf_counter() - start
+
+    for name in expected:
+        if not np.isclose(expected[name], actual[name], rtol=1e-9, atol=1e-12):
+            raise AssertionError(f'{name}: polyfit {expected[name]} != closed-form {actual[name]}')
+
+    # 仅比较斜率求解部分（特征矩阵已预先计算）
+    values, _ = processor._decline_matrix(texts)
+    x = np.arange(len(values))
+    start = time.perf_counter()
+    for column in range(values.shape[1]):
+        np.polyfit(x, values[:, column], 1)
+    polyfit_slope_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear_trends(values)
+    closed_slope_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor.compute_language_decline_indicators(texts, timestamps=timestamps, last_days=30)
+    windowed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor.compute_rolling_decline_indicators(texts, window, timestamps=timestamps)
+    rolling_time = time.perf_counter() - start
+
+    print(f'samples: {sample_count}')
+    print(f'{"polyfit (per metric)":<28}{polyfit_time * 1000:>10.1f} ms')
+    print(f'{"closed-form (all metrics)":<28}{closed_time * 1000:>10.1f} ms')
+    print(f'{"slopes only, polyfit":<28}{polyfit_slope_time * 1000:>10.2f} ms')
+    print(f'{"slopes only, closed-form":<28}{closed_slope_time * 1000:>10.2f} ms')
+    print(f'{"last 30 days, timestamps":<28}{windowed_time * 1000:>10.1f} ms')
+    print(f'{f"rolling window={window}":<28}{rolling_time * 1000:>10.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=10000, help='历史样本数量')
+    parser.add_argument('--window', type=int, default=50, help='滑动窗口大小')
+    args = parser.parse_args()
+    run(args.samples, args.window)
@@ -0,0 +1,65 @@
+"""
+评估数据 CSV 导出的内存测试：在临时数据库中写入大量评估记录，
+流式消费导出响应并记录 Python 堆内存峰值，峰值超过上限时退出码为 1
+
+用法:
+    python benchmarks/bench_export_memory.py [--rows 1000000] [--limit-mb 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dbseed import seed, setup_database  # noqa: E402
+
+
+def consume_export(user):
+    """请求批量导出并逐块读取响应，返回 (行数, 字节数, 耗时, 内存峰值)"""
+    from django.test import RequestFactory
+    from core.views import export_bulk_assessment_data
+
+    request = RequestFactory().get('/caregiver/export/')
+    request.user = user
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = export_bulk_assessment_data(request)
+    lines = size = 0
+    for chunk in response.streaming_content:
+        lines += 1
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return lines - 1, size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='评估记录数')
+    parser.add_argument('--limit-mb', type=float, default=64, help='内存峰值上限（MB）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        start = time.perf_counter()
+        user, _ = seed(patients=100, assessments=args.rows)
+        print(f'seeded {args.rows} assessments in {time.perf_counter() - start:.1f}s')
+
+        rows, size, elapsed, peak = consume_export(user)
+        peak_mb = peak / 1024 / 1024
+        print(f'exported {rows} rows ({size / 1024 / 1024:.1f} MB) in {elapsed:.1f}s, '
+              f'peak traced memory {peak_mb:.1f} MB (limit {args.limit_mb:.0f} MB)')
+
+    if rows != args.rows:
+        print(f'expected {args.rows} rows')
+        sys.exit(1)
+    sys.exit(1 if peak_mb > args.limit_mb else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+历史评估状态测试：比较按完整历史列表与按 PatientHistoryState 调整预测的耗时，
+并校验两者结果一致（容差为 0）；结果不一致时退出码为 1
+
+用法:
+    python benchmarks/bench_history_state.py [--lengths 10 100 1000 10000] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.predictor import DementiaPredictor, PatientHistoryState  # noqa: E402
+
+SEED = 20240101
+
+
+def synthetic_history(dimensions, length, rng):
+    """按时间顺序排列的历史评估；部分评估缺少个别维度"""
+    history = []
+    for _ in range(length):
+        scores = {dimension: round(rng.uniform(0, 1), 2) for dimension in dimensions if rng.random() > 0.1}
+        history.append({'dimension_scores': scores})
+    return history
+
+
+def per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[10, 100, 1000, 10000], help='历史评估条数')
+    parser.add_argument('--repeat', type=int, default=200, help='每种长度的重复次数')
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    predictor = DementiaPredictor()
+    dimensions = list(predictor.dimensions)
+    features = predictor._extract_features_from_text('我最近常常忘记吃药，有时候也找不到回家的路')
+
+    failed = False
+    print(f'{"history":>8}{"list us/call":>15}{"state us/call":>15}{"update us":>12}{"max diff":>10}')
+    for length in args.lengths:
+        history = synthetic_history(dimensions, length, rng)
+        state = PatientHistoryState()
+        start = time.perf_counter()
+        for assessment in history:
+            state.update(assessment['dimension_scores'])
+        update_time = (time.perf_counter() - start) / length
+        # 经 JSON 往返，与保存在 PatientSummary 中的状态相同
+        state = PatientHistoryState.from_dict(json.loads(json.dumps(state.to_dict())))
+
+        expected = predictor._adjust_with_history(dict(features), history)
+        actual = predictor._adjust_with_history(dict(features), state)
+        diff = max(abs(expected[dimension] - actual[dimension]) for dimension in expected)
+        failed |= diff != 0
+
+        repeat = max(1, args.repeat * 100 // max(length, 100))
+        list_time = per_call(lambda: predictor._adjust_with_history(dict(features), history), repeat)
+        state_time = per_call(lambda: predictor._adjust_with_history(dict(features), state), args.repeat)
+        print(f'{length:>8}{list_time * 1e6:>15.1f}{state_time * 1e6:>15.1f}{update_time * 1e6:>12.1f}{diff:>10.1g}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+键集分页测试：在一个对话中生成大量消息和评估，测量分页接口在不同深度读取一页的耗时，
+并与 OFFSET 分页比较（http 列为经完整请求处理的耗时）；同时记录对话详情和患者详情页面
+（未命中缓存时）的耗时和大小。
+逐页读完全部数据时有重复或遗漏、或最深一页明显慢于第一页时退出码为 1
+
+用法:
+    python benchmarks/bench_keyset_pagination.py [--messages 200000] [--assessments 100000] [--requests 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dbseed import seed, setup_database  # noqa: E402
+
+DEPTHS = (0.0, 0.25, 0.5, 0.75, 0.999)
+
+
+def median_ms(func, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def cursors_at_depths(rows, field, limit, descending):
+    """逐页读完全部数据，返回 (各深度处的游标, 读到的主键列表)"""
+    from core.utils.pagination import keyset_page
+
+    cursors = []
+    pks = []
+    cursor = None
+    while True:
+        cursors.append(cursor)
+        items, cursor = keyset_page(rows, field, cursor, limit=limit, descending=descending)
+        pks += [item.pk for item in items]
+        if cursor is None:
+            break
+    return [cursors[min(int(depth * len(cursors)), len(cursors) - 1)] for depth in DEPTHS], pks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200_000, help='对话中的消息数')
+    parser.add_argument('--assessments', type=int, default=100_000, help='对话中的评估数')
+    parser.add_argument('--requests', type=int, default=20, help='每个深度的请求次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from django.conf import settings
+        settings.CACHES['pages']['LOCATION'] = os.path.join(tmp, 'pages')
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        from django.core.cache import caches
+        from django.test import Client
+        from core.models import DementiaAssessment, Message, Patient
+        from core.utils.pagination import keyset_page
+        from core.views import CONVERSATION_MESSAGES_PAGE_SIZE, PATIENT_ASSESSMENTS_PAGE_SIZE
+        settings.ALLOWED_HOSTS.append('testserver')
+
+        start = time.perf_counter()
+        user, pairs = seed(patients=1, conversations=1, messages=args.messages, assessments=args.assessments)
+        patient_pk, conversation_pk = pairs[0]
+        code = Patient.objects.get(pk=patient_pk).patient_id
+        print(f'seeded {args.messages} messages, {args.assessments} assessments in one conversation '
+              f'in {time.perf_counter() - start:.1f}s\n')
+
+        client = Client()
+        client.force_login(user)
+        failed = False
+        endpoints = (
+            ('messages', f'/caregiver/conversation/{conversation_pk}/messages/',
+             Message.objects.filter(conversation_id=conversation_pk), 'timestamp',
+             CONVERSATION_MESSAGES_PAGE_SIZE, False),
+            ('patient assessments', f'/caregiver/patient/{code}/assessments/',
+             DementiaAssessment.objects.filter(patient_id=patient_pk), 'assessment_date',
+             PATIENT_ASSESSMENTS_PAGE_SIZE, True),
+        )
+        print(f'{"endpoint":<22}{"depth":>7}{"keyset ms":>12}{"offset ms":>12}{"http ms":>10}')
+        for name, url, rows, field, limit, descending in endpoints:
+            cursors, pks = cursors_at_depths(rows, field, limit, descending)
+            if len(pks) != len(set(pks)) or len(pks) != rows.count():
+                print(f'{name}: paging returned {len(pks)} rows ({len(set(pks))} distinct), expected {rows.count()}')
+                failed = True
+            order = (f'-{field}', '-pk') if descending else (field, 'pk')
+            total = rows.count()
+            timings = []
+            for depth, cursor in zip(DEPTHS, cursors):
+                keyset_ms = median_ms(lambda: keyset_page(rows, field, cursor, limit=limit, descending=descending),
+                                      args.requests)
+                offset = int(depth * total)
+                offset_ms = median_ms(lambda: list(rows.order_by(*order)[offset:offset + limit]), args.requests)
+                params = {'cursor': cursor} if cursor else {}
+                http_ms = median_ms(lambda: client.get(url, params), args.requests)
+                timings.append(keyset_ms)
+                print(f'{name:<22}{depth:>7.0%}{keyset_ms:>12.2f}{offset_ms:>12.2f}{http_ms:>10.2f}')
+            # 最深一页的耗时应与第一页相当（留出计时抖动的余量）
+            failed |= timings[-1] > timings[0] * 2 + 0.5
+
+        print(f'\n{"page (cache miss)":<22}{"ms":>10}{"KB":>10}')
+        for name, url in (('conversation_detail', f'/caregiver/conversation/{conversation_pk}/'),
+                          ('patient_detail', f'/caregiver/patient/{code}/')):
+            def render():
+                caches['pages'].clear()
+                return client.get(url)
+            size = len(render().content)
+            print(f'{name:<22}{median_ms(render, args.requests):>10.2f}{size / 1024:>10.1f}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+消息写入吞吐量测试：多个线程并发保存对话轮次，比较两种写入方式的持续吞吐量
+
+- legacy：原来的写入方式，患者消息、特征状态、系统回复和评估分别自动提交，
+  SQLite 使用默认的回滚日志模式（journal_mode=DELETE, synchronous=FULL）
+- atomic：views._save_exchange 在一个事务中写入整轮对话，
+  SQLite 使用 settings.SQLITE_PRAGMAS（WAL, synchronous=NORMAL, busy_timeout）
+
+推理不计入测试，所有轮次使用同一个预先计算好的评估结果。
+
+用法:
+    python benchmarks/bench_message_throughput.py [--writers 8] [--duration 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transmbd.settings')
+
+MODES = ('legacy', 'atomic')
+
+
+def legacy_save(conversation, patient_input, response, assessment):
+    """原来 process_message 的写入顺序：每次写入单独自动提交"""
+    from core.models import DementiaAssessment, Message
+    Message.objects.create(conversation=conversation, sender_type='patient', content=patient_input)
+    conversation.update_feature_state(patient_input)
+    Message.objects.create(conversation=conversation, sender_type='system', content=response)
+    DementiaAssessment.objects.create(
+        patient_id=conversation.patient_id,
+        conversation=conversation,
+        severity=assessment['severity_category'],
+        confidence_score=assessment['confidence'],
+        detailed_results=assessment,
+    )
+
+
+def use_database(path, pragmas):
+    """切换到新的数据库文件和 PRAGMA 配置并执行迁移"""
+    import django
+    from django.apps import apps
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    settings.DATABASES['default']['NAME'] = path
+    settings.SQLITE_PRAGMAS = pragmas
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+    call_command('migrate', verbosity=0)
+
+
+def run_mode(mode, path, writers, duration, pragmas):
+    """运行一种写入方式，返回 (轮次数, 锁错误数, 实际耗时)"""
+    use_database(path, pragmas if mode == 'atomic' else {})
+    from django.db import OperationalError, connection
+    from core.models import Conversation, Patient
+    from core.utils.predictor import ConversationManager, DementiaPredictor
+    from core.views import _save_exchange
+
+    save = _save_exchange if mode == 'atomic' else legacy_save
+    response, assessment = ConversationManager(predictor=DementiaPredictor()).generate_response('我想不起来了')
+    conversation_ids = [
+        Conversation.objects.create(
+            patient=Patient.objects.create(patient_id=f'W{i:03d}', name=f'患者{i}', age=70, gender='M')
+        ).id
+        for i in range(writers)
+    ]
+
+    counts = [0] * writers
+    errors = [0] * writers
+    start_barrier = threading.Barrier(writers + 1)
+    deadline = [0.0]
+
+    def writer(index):
+        conversation = Conversation.objects.get(id=conversation_ids[index])
+        start_barrier.wait()
+        try:
+            while time.perf_counter() < deadline[0]:
+                try:
+                    save(conversation, f'第{counts[index]}条：我今天有点想不起来事情了', response, assessment)
+                    counts[index] += 1
+                except OperationalError:
+                    errors[index] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    started = time.perf_counter()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    return sum(counts), sum(errors), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8, help='并发写入线程数')
+    parser.add_argument('--duration', type=float, default=10.0, help='每种方式的运行时间（秒）')
+    parser.add_argument('--mode', choices=MODES, help='只运行一种写入方式')
+    args = parser.parse_args()
+
+    from django.conf import settings
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ([args.mode] if args.mode else MODES):
+            exchanges, errors, elapsed = run_mode(
+                mode, os.path.join(tmp, f'{mode}.sqlite3'), args.writers, args.duration, pragmas
+            )
+            results[mode] = exchanges / elapsed
+            print(f'{mode:<8}{exchanges:>8} exchanges in {elapsed:.1f}s  '
+                  f'{exchanges / elapsed:>8.1f} exchanges/s  {2 * exchanges / elapsed:>8.1f} messages/s  '
+                  f'{errors} lock errors')
+
+    if len(results) == 2 and results['legacy']:
+        print(f'\natomic / legacy throughput: {results["atomic"] / results["legacy"]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+运行指标开销测试：比较开启和关闭 settings.METRICS_ENABLED 时热点函数和页面请求的耗时，
+请求耗时增加超过上限时退出码为 1
+
+- 函数：predict_from_text 和 TextProcessor.extract_features 每次调用增加的耗时
+- 请求：在临时数据库中生成数据，交替以两种状态请求各页面，比较中位数
+
+用法:
+    python benchmarks/bench_metrics_overhead.py [--calls 20000] [--requests 200] [--limit-pct 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SEED, make_utterance  # noqa: E402
+from benchmarks.dbseed import seed, setup_database  # noqa: E402
+
+VIEW_URLS = [
+    ('caregiver_dashboard', '/caregiver/'),
+    ('patient_detail', '/caregiver/patient/{patient}/'),
+    ('patient_progress_data', '/caregiver/patient/{patient}/progress/data/'),
+]
+
+
+def time_calls(func, texts):
+    """逐条调用 func，返回平均每次耗时（微秒）"""
+    start = time.perf_counter()
+    for text in texts:
+        func(text)
+    return (time.perf_counter() - start) / len(texts) * 1e6
+
+
+def compare_functions(calls):
+    """返回 [(名称, 关闭时 µs, 开启时 µs), ...]"""
+    import random
+    from core.utils import metrics
+    from core.utils.predictor import DementiaPredictor
+    from core.utils.text_processor import TextProcessor
+
+    rng = random.Random(SEED)
+    texts = [make_utterance(rng, 2) for _ in range(calls)]
+    predictor = DementiaPredictor()
+    processor = TextProcessor()
+    results = []
+    for name, func in [('predict_from_text', predictor.predict_from_text),
+                       ('extract_features', processor.extract_features)]:
+        timings = {False: [], True: []}
+        for _ in range(3):
+            for enabled in (False, True):
+                metrics.set_enabled(enabled)
+                timings[enabled].append(time_calls(func, texts))
+        results.append((name, min(timings[False]), min(timings[True])))
+    metrics.set_enabled(True)
+    return results
+
+
+def compare_requests(client, urls, requests):
+    """交替请求，返回 [(名称, 关闭时中位数 ms, 开启时中位数 ms), ...]"""
+    from core.utils import metrics
+
+    results = []
+    for name, url in urls:
+        client.get(url)
+        timings = {False: [], True: []}
+        for _ in range(requests):
+            for enabled in (False, True):
+                metrics.set_enabled(enabled)
+                start = time.perf_counter()
+                response = client.get(url)
+                timings[enabled].append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{url} returned {response.status_code}')
+        results.append((name, statistics.median(timings[False]), statistics.median(timings[True])))
+    metrics.set_enabled(True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=20000, help='每个函数的调用次数')
+    parser.add_argument('--requests', type=int, default=200, help='每个页面在每种状态下的请求次数')
+    parser.add_argument('--limit-pct', type=float, default=5.0, help='请求耗时增加的上限（%%）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        from django.conf import settings
+        from django.test import Client
+        from core.models import Patient
+        settings.ALLOWED_HOSTS.append('testserver')
+
+        print(f'{"function":<24}{"off µs":>10}{"on µs":>10}{"added µs":>10}')
+        for name, off, on in compare_functions(args.calls):
+            print(f'{name:<24}{off:>10.2f}{on:>10.2f}{on - off:>10.2f}')
+
+        user, pairs = seed(patients=50, conversations=5, messages=20000, assessments=10000)
+        client = Client()
+        client.force_login(user)
+        patient = Patient.objects.get(pk=pairs[0][0]).patient_id
+        urls = [(name, url.format(patient=patient)) for name, url in VIEW_URLS]
+
+        failed = False
+        print(f'\n{"view":<24}{"off ms":>10}{"on ms":>10}{"overhead":>10}')
+        for name, off, on in compare_requests(client, urls, args.requests):
+            overhead = (on - off) / off * 100
+            failed |= overhead > args.limit_pct
+            print(f'{name:<24}{off:>10.2f}{on:>10.2f}{overhead:>9.1f}%')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
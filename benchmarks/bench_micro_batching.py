@@ -0,0 +1,65 @@
+"""
+微批处理调度器负载测试：以确定性 CPU 替身后端比较逐条推理与动态微批处理
+
+用法:
+    python benchmarks/bench_micro_batching.py [--clients 32] [--requests 20]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.batching import MicroBatchScheduler, SimulatedBackend  # noqa: E402
+
+
+def run_clients(call, clients, requests_per_client):
+    """启动 clients 个并发客户端，每个依次发送 requests_per_client 个请求"""
+    def client(index):
+        for i in range(requests_per_client):
+            call(f'患者{index}的第{i}条回答：我想不起来了')
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run(clients, requests_per_client, max_batch_size, max_wait_ms):
+    total = clients * requests_per_client
+    backend = SimulatedBackend()
+
+    # 基线：每个请求单独调用后端（后端串行执行，模拟单个模型实例）
+    lock = threading.Lock()
+
+    def unbatched(text):
+        with lock:
+            return backend.generate_response_batch([text])[0]
+
+    unbatched_time = run_clients(unbatched, clients, requests_per_client)
+
+    scheduler = MicroBatchScheduler(backend, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    batched_time = run_clients(scheduler.generate_response, clients, requests_per_client)
+    stats = scheduler.stats()
+    scheduler.shutdown()
+
+    print(f'clients={clients} requests={total} max_batch_size={max_batch_size} max_wait_ms={max_wait_ms}')
+    print(f'{"unbatched":<12}{total / unbatched_time:>10.1f} req/s')
+    print(f'{"batched":<12}{total / batched_time:>10.1f} req/s')
+    print(f'batch sizes: {stats["batch_size_histogram"]}')
+    print(f'latency (ms): {stats["latency_ms"]}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=32, help='并发客户端数量')
+    parser.add_argument('--requests', type=int, default=20, help='每个客户端的请求数')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+    run(args.clients, args.requests, args.max_batch_size, args.max_wait_ms)
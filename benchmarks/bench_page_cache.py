@@ -0,0 +1,120 @@
+"""
+页面片段缓存测试：比较照护人员页面未命中和命中缓存时的耗时和 SQL 查询数，
+并检查新增一轮对话后只有相关页面失效。命中时仍有页面数据查询、
+或失效范围不符合预期时退出码为 1
+
+查询数不含会话和登录用户的查询（SESSION_SAVE_EVERY_REQUEST 下每个请求都会读写会话）。
+
+用法:
+    python benchmarks/bench_page_cache.py [--requests 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dbseed import seed, setup_database  # noqa: E402
+
+SESSION_TABLES = ('"django_session"', '"auth_user"')
+
+
+def page_queries(queries):
+    """页面数据查询数：排除会话、登录用户和事务控制语句"""
+    return sum(
+        1 for query in queries
+        if not any(table in query['sql'] for table in SESSION_TABLES)
+        and query['sql'] not in ('BEGIN', 'COMMIT')
+    )
+
+
+def measure(client, url, requests, clear):
+    """返回 (中位数 ms, 最后一次请求的页面数据查询数)"""
+    from django.core.cache import caches
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    client.get(url)
+    timings = []
+    for _ in range(requests):
+        if clear:
+            caches['pages'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned {response.status_code}')
+    return statistics.median(timings), page_queries(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50, help='每个页面在每种状态下的请求次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from django.conf import settings
+        settings.CACHES['pages']['LOCATION'] = os.path.join(tmp, 'pages')
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+        from core.models import Conversation, DementiaAssessment, Patient
+        from core.utils.registry import get_predictor
+        from core.views import _generate_response, _save_exchange
+        settings.ALLOWED_HOSTS.append('testserver')
+
+        user, pairs = seed(patients=50, conversations=5, messages=20000, assessments=10000)
+        predictor = get_predictor()
+        urls = {}
+        for label, (patient_pk, conversation_pk) in (('a', pairs[0]), ('b', pairs[-1])):
+            conversation = Conversation.objects.get(pk=conversation_pk)
+            # 生成的评估没有完整的预测结果，评估报告页使用一条真实预测的评估
+            assessment = DementiaAssessment.objects.create(
+                patient_id=patient_pk, conversation=conversation, severity='mild', confidence_score=0.7,
+                detailed_results=predictor.predict_from_text('我记不清今天早上吃了什么'),
+            )
+            code = Patient.objects.get(pk=patient_pk).patient_id
+            urls[f'patient_detail[{label}]'] = f'/caregiver/patient/{code}/'
+            urls[f'conversation_detail[{label}]'] = f'/caregiver/conversation/{conversation_pk}/'
+            urls[f'assessment_report[{label}]'] = f'/caregiver/assessment/{assessment.pk}/'
+        urls['caregiver_dashboard'] = '/caregiver/'
+
+        client = Client()
+        client.force_login(user)
+        failed = False
+        print(f'{"view":<26}{"miss ms":>10}{"hit ms":>10}{"miss q":>8}{"hit q":>7}')
+        for name, url in urls.items():
+            miss_ms, miss_queries = measure(client, url, args.requests, clear=True)
+            hit_ms, hit_queries = measure(client, url, args.requests, clear=False)
+            failed |= hit_queries > 0
+            print(f'{name:<26}{miss_ms:>10.2f}{hit_ms:>10.2f}{miss_queries:>8}{hit_queries:>7}')
+
+        # 在患者 a 的对话中新增一轮对话：只有 a 的页面和仪表板应失效
+        for url in urls.values():
+            client.get(url)
+        conversation = Conversation.objects.get(pk=pairs[0][1])
+        response, assessment = _generate_response('我好像忘了吃药')
+        start = time.perf_counter()
+        _save_exchange(conversation, '我好像忘了吃药', response, assessment)
+        save_ms = (time.perf_counter() - start) * 1000
+
+        print(f'\nafter one exchange in conversation {conversation.pk} (saved in {save_ms:.2f} ms):')
+        for name, url in urls.items():
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            invalidated = page_queries(queries) > 0
+            expected = name.endswith('[a]') or name == 'caregiver_dashboard'
+            failed |= invalidated != expected
+            status = 're-rendered' if invalidated else 'cached'
+            print(f'  {name:<24}{status:>12}{"" if invalidated == expected else "  UNEXPECTED"}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+视图查询计划回归测试：在临时数据库中写入百万行级数据，请求各个页面和接口，
+对每条 SELECT 执行 SQLite EXPLAIN QUERY PLAN，检查大表是否走索引，
+并检查每个视图的响应时间是否在预算内。有全表扫描或超出预算时退出码为 1
+
+用法:
+    python benchmarks/bench_query_plans.py [--patients 1000] [--messages 2000000] [--assessments 1000000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dbseed import seed, setup_database  # noqa: E402
+
+# 随数据量增长的大表：查询计划中不允许出现对这些表的 SCAN
+LARGE_TABLES = {'core_conversation', 'core_message', 'core_dementiaassessment', 'core_assessmentcounter'}
+
+# (名称, URL 模板, 响应时间预算 ms)；{patient} 和 {conversation} 在运行时替换
+VIEW_CASES = [
+    ('patient_interface', '/patient/{patient}/', 50),
+    ('caregiver_dashboard', '/caregiver/', 100),
+    ('patient_detail', '/caregiver/patient/{patient}/', 600),
+    ('conversation_detail', '/caregiver/conversation/{conversation}/', 400),
+    ('patient_progress', '/caregiver/patient/{patient}/progress/', 100),
+    ('patient_progress_data', '/caregiver/patient/{patient}/progress/data/', 200),
+    ('patient_progress_data[raw]', '/caregiver/patient/{patient}/progress/data/?bucket=raw&points=200', 100),
+    ('export_assessment_data', '/caregiver/patient/{patient}/export/', 200),
+]
+
+
+def explain(sql):
+    """返回一条 SQL 的 EXPLAIN QUERY PLAN 明细行"""
+    from django.db import connection
+    return [row[3] for row in connection.connection.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()]
+
+
+def full_scans(plan):
+    """找出查询计划中对大表的扫描（SCAN 表示逐行遍历，SEARCH 表示走索引定位）"""
+    scans = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in LARGE_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def fetch(client, url):
+    """请求 URL 并读取完整响应（包括流式响应）"""
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}')
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def check_view(client, name, url, budget_ms, repeat, verbose=False):
+    """检查单个视图的查询计划和耗时，返回发现的问题列表"""
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    # 查询日志有长度上限，写入测试数据后已经写满，需先清空
+    reset_queries()
+    with CaptureQueriesContext(connection) as captured:
+        fetch(client, url)
+
+    problems = []
+    selects = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('SELECT')]
+    for sql in selects:
+        scans = full_scans(explain(sql))
+        if verbose:
+            print(f'  {sql[:160]}')
+            for detail in explain(sql):
+                print(f'    {detail}')
+        if scans:
+            problems.append(f'{name}: full scan {scans} in {sql[:200]}')
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fetch(client, url)
+        timings.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(timings)
+    if median > budget_ms:
+        problems.append(f'{name}: median {median:.1f} ms over budget {budget_ms} ms')
+
+    status = 'FAIL' if problems else 'ok'
+    print(f'{name:<32}{len(captured.captured_queries):>6} queries{median:>10.1f} ms{budget_ms:>8} ms  {status}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=1000, help='患者数')
+    parser.add_argument('--conversations', type=int, default=5, help='每位患者的对话数')
+    parser.add_argument('--messages', type=int, default=2_000_000, help='消息总数')
+    parser.add_argument('--assessments', type=int, default=1_000_000, help='评估总数')
+    parser.add_argument('--repeat', type=int, default=5, help='每个视图计时的请求次数')
+    parser.add_argument('--verbose', action='store_true', help='打印每条查询及其查询计划')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        from django.conf import settings
+        from django.db import connection
+        from django.test import Client
+        settings.ALLOWED_HOSTS.append('testserver')
+
+        start = time.perf_counter()
+        user, pairs = seed(args.patients, args.conversations, args.messages, args.assessments)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        print(f'seeded {args.patients} patients, {len(pairs)} conversations, {args.messages} messages, '
+              f'{args.assessments} assessments in {time.perf_counter() - start:.1f}s\n')
+
+        client = Client()
+        client.force_login(user)
+        # 选取中间的患者和他的一个已结束对话
+        patient_pk, conversation_pk = pairs[len(pairs) // 2]
+        from core.models import Patient
+        patient = Patient.objects.get(pk=patient_pk).patient_id
+
+        problems = []
+        for name, url, budget_ms in VIEW_CASES:
+            url = url.format(patient=patient, conversation=conversation_pk)
+            problems += check_view(client, name, url, budget_ms, args.repeat, args.verbose)
+
+    if problems:
+        print()
+        for problem in problems:
+            print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
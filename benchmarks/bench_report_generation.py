@@ -0,0 +1,81 @@
+"""
+批量报告生成测试：比较单进程与进程池生成报告的耗时、缓存命中时的耗时，
+以及 generate_reports 命令端到端的吞吐量；并行结果与单进程结果不一致时退出码为 1
+
+用法:
+    python benchmarks/bench_report_generation.py [--reports 200000] [--workers 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SEED  # noqa: E402
+from benchmarks.dbseed import DIMENSIONS, SEVERITIES, seed, setup_database  # noqa: E402
+
+
+def make_items(count):
+    rng = random.Random(SEED)
+    return [
+        (index, {'severity_category': rng.choice(SEVERITIES),
+                 'dimension_scores': {dimension: rng.random() for dimension in DIMENSIONS}})
+        for index in range(1, count + 1)
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=200000, help='报告条数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程池大小')
+    args = parser.parse_args()
+
+    from core.utils.predictor import DementiaPredictor
+    from core.utils.reports import ReportEngine
+
+    items = make_items(args.reports)
+    predictor = DementiaPredictor()
+    _, per_call = timed(lambda: [predictor.generate_report(results, variant=i) for i, results in items])
+
+    with ReportEngine(workers=1, cache_size=0) as engine:
+        serial, serial_time = timed(engine.render, items)
+    with ReportEngine(workers=args.workers, min_parallel=0, cache_size=len(items)) as engine:
+        engine.render(items[:1000])  # 启动子进程
+        engine.cache.clear()
+        parallel, parallel_time = timed(engine.render, items)
+        _, cached_time = timed(engine.render, items)
+
+    print(f'{"mode":<34}{"seconds":>10}{"reports/s":>12}')
+    for name, seconds in [('generate_report per call', per_call), ('engine, 1 process', serial_time),
+                          (f'engine, {args.workers} processes', parallel_time), ('engine, cached', cached_time)]:
+        print(f'{name:<34}{seconds:>10.3f}{args.reports / seconds:>12.0f}')
+    failed = parallel != serial
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        from django.core.management import call_command
+        seed(patients=1000, conversations=1, assessments=args.reports)
+        print(f'\n{"generate_reports":<34}{"seconds":>10}{"reports/s":>12}')
+        for workers in (1, args.workers):
+            output = os.path.join(tmp, f'reports-{workers}.jsonl')
+            _, seconds = timed(lambda: call_command('generate_reports', output=output, workers=workers,
+                                                    stdout=open(os.devnull, 'w')))
+            print(f'{f"--workers {workers}":<34}{seconds:>10.3f}{args.reports / seconds:>12.0f}')
+        with open(os.path.join(tmp, 'reports-1.jsonl'), 'rb') as a, \
+                open(os.path.join(tmp, f'reports-{args.workers}.jsonl'), 'rb') as b:
+            failed |= a.read() != b.read()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+离线重新评分测试：在临时数据库中生成历史消息和评估，测量 rescore_messages 命令的吞吐量，
+并模拟中途中断后从检查点继续；中断后重复或遗漏评分时退出码为 1
+
+用法:
+    python benchmarks/bench_rescoring.py [--messages 200000] [--workers 4] [--chunk-size 2000]
+"""
+import argparse
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dbseed import seed, setup_database  # noqa: E402
+
+
+class Interrupted(Exception):
+    pass
+
+
+def run(checkpoint, **options):
+    from django.core.management import call_command
+
+    out = io.StringIO()
+    start = time.perf_counter()
+    call_command('rescore_messages', checkpoint=checkpoint, stdout=out, **options)
+    return out.getvalue(), time.perf_counter() - start
+
+
+def stale_count(version):
+    from core.models import DementiaAssessment
+    return DementiaAssessment.objects.filter(message__isnull=False).exclude(predictor_version=version).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200000, help='患者消息数（另有同样数量的系统消息）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程池大小')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='每批消息数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        from django.apps import apps
+        from core.management.commands.rescore_messages import Command
+        from core.models import DementiaAssessment
+        from core.utils.rule_pack import get_rule_pack_source
+
+        seed(patients=1001, conversations=1, messages=args.messages * 2, assessments=args.messages)
+        # 原生 SQL 写入的评估未关联消息，用迁移中的函数配对
+        importlib.import_module('core.migrations.0007_assessment_message').link_messages(apps, None)
+        linked = DementiaAssessment.objects.filter(message__isnull=False).count()
+        version = get_rule_pack_source().current().version
+        checkpoint = os.path.join(tmp, 'checkpoint.json')
+
+        print(f'{linked} linked assessment(s)\n')
+        print(f'{"run":<28}{"seconds":>10}{"rows/s":>12}')
+        for workers in sorted({1, args.workers}):
+            DementiaAssessment.objects.update(predictor_version='')
+            _, seconds = run(checkpoint, workers=workers, chunk_size=args.chunk_size, restart=True)
+            print(f'{f"--workers {workers}":<28}{seconds:>10.3f}{linked / seconds:>12.0f}')
+        failed = stale_count(version) != 0
+
+        # 第 3 批写入后中断，再次执行应只处理剩余的消息
+        DementiaAssessment.objects.update(predictor_version='')
+        write = Command._write
+        calls = []
+
+        def interrupting_write(rows, results, version):
+            if len(calls) == 3:
+                raise Interrupted
+            calls.append(len(results[0]))
+            return write(rows, results, version)
+
+        Command._write = staticmethod(interrupting_write)
+        try:
+            run(checkpoint, workers=args.workers, chunk_size=args.chunk_size, restart=True)
+        except Interrupted:
+            pass
+        finally:
+            Command._write = staticmethod(write)
+        before = stale_count(version)
+        output, seconds = run(checkpoint, workers=args.workers, chunk_size=args.chunk_size)
+        after = stale_count(version)
+        print(f'{"resumed after interrupt":<28}{seconds:>10.3f}{before / seconds:>12.0f}')
+        print(f'\nstale before resume: {before}, after: {after} (expected {linked - sum(calls)}, 0)')
+        print(output.splitlines()[0])
+        failed |= before != linked - sum(calls) or after != 0
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
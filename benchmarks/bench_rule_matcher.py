@@ -0,0 +1,101 @@
+"""
+规则匹配基准测试：比较逐条规则子串匹配与 Aho-Corasick 单次扫描的耗时
+
+用法:
+    python benchmarks/bench_rule_matcher.py [--texts 200] [--length 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.predictor import DementiaPredictor  # noqa: E402
+from core.utils.rule_matcher import RuleMatcher  # noqa: E402
+
+SEED = 20250323
+PATTERN_COUNTS = [20, 2000, 20000]
+# 常用汉字范围内取字，保证合成规则与文本之间有一定命中率
+CHARSET = [chr(c) for c in range(0x4E00, 0x4E00 + 400)]
+
+
+def naive_extract(rules, text):
+    """原始实现：逐维度、逐规则地做子串匹配"""
+    features = {}
+    for dimension, rules_list in rules.items():
+        dimension_score = 0
+        hits = 0
+        for rule in rules_list:
+            if rule['pattern'].lower() in text.lower():
+                dimension_score += rule['score']
+                hits += 1
+        if hits > 0:
+            features[dimension] = dimension_score / hits
+        else:
+            features[dimension] = 0.1
+    return features
+
+
+def synthetic_rules(base_rules, total, rng):
+    """在内置规则基础上补充随机规则，直到规则总数达到 total"""
+    rules = {dimension: list(rules_list) for dimension, rules_list in base_rules.items()}
+    dimensions = list(rules.keys())
+    count = sum(len(v) for v in rules.values())
+    while count < total:
+        pattern = ''.join(rng.choice(CHARSET) for _ in range(rng.randint(2, 6)))
+        rules[dimensions[count % len(dimensions)]].append({
+            'pattern': pattern,
+            'score': round(rng.uniform(0.3, 0.9), 2),
+        })
+        count += 1
+    return rules
+
+
+def synthetic_texts(base_rules, count, length, rng):
+    """生成合成文本，并随机插入内置规则的模式"""
+    patterns = [rule['pattern'] for rules_list in base_rules.values() for rule in rules_list]
+    texts = []
+    for _ in range(count):
+        chars = [rng.choice(CHARSET) for _ in range(length)]
+        for _ in range(rng.randint(0, 3)):
+            chars.insert(rng.randrange(len(chars) + 1), rng.choice(patterns))
+        texts.append(''.join(chars))
+    return texts
+
+
+def run(text_count, text_length):
+    rng = random.Random(SEED)
+    base_rules = DementiaPredictor().rules
+    texts = synthetic_texts(base_rules, text_count, text_length, rng)
+
+    print(f"{'patterns':>10} {'naive (ms)':>12} {'matcher (ms)':>14} {'build (ms)':>12} {'speedup':>9}")
+    for total in PATTERN_COUNTS:
+        rules = synthetic_rules(base_rules, total, rng)
+
+        start = time.perf_counter()
+        matcher = RuleMatcher(rules)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [naive_extract(rules, text) for text in texts]
+        naive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = [matcher.score(text) for text in texts]
+        matcher_time = time.perf_counter() - start
+
+        if expected != actual:
+            raise AssertionError(f'matcher output differs from naive loop at {total} patterns')
+
+        print(f"{total:>10} {naive_time * 1000:>12.1f} {matcher_time * 1000:>14.1f} "
+              f"{build_time * 1000:>12.1f} {naive_time / matcher_time:>8.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--texts', type=int, default=200, help='合成文本数量')
+    parser.add_argument('--length', type=int, default=200, help='每条文本的字符数')
+    args = parser.parse_args()
+    run(args.texts, args.length)
@@ -0,0 +1,131 @@
+"""
+规则包测试：比较进程内字典自动机与内存映射规则包的匹配速度和每个工作进程的独占内存，
+并测量修改规则包文件后热替换的耗时；两种匹配结果不一致时退出码为 1
+
+用法:
+    python benchmarks/bench_rule_pack.py [--patterns 200000] [--processes 4] [--texts 2000]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_rule_matcher import SEED, synthetic_rules, synthetic_texts  # noqa: E402
+from core.utils.rule_matcher import RuleMatcher  # noqa: E402
+from core.utils.rule_pack import (  # noqa: E402
+    DEFAULT_RULE_PACK, RulePack, RulePackSource, compile_pack, load_source,
+)
+
+
+def private_memory():
+    """当前进程的独占内存（字节），取自 /proc/self/smaps_rollup"""
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def load_in_worker(kind, source_path, compiled_path, texts, ready, done):
+    """子进程：加载匹配器并扫描一遍文本，报告加载前后的独占内存增量"""
+    before = private_memory()
+    if kind == 'dict':
+        with open(source_path, encoding='utf-8') as f:
+            matcher = RuleMatcher(json.load(f)['rules'])
+    else:
+        matcher = RulePack(compiled_path).matcher
+    for text in texts:
+        matcher.find_rule_ids(text.lower())
+    ready.put(private_memory() - before)
+    done.wait()
+
+
+def worker_memory(kind, source_path, compiled_path, texts, processes):
+    """同时启动多个子进程，返回每个进程的平均独占内存增量"""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    done = context.Event()
+    workers = [context.Process(target=load_in_worker, args=(kind, source_path, compiled_path, texts, ready, done))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    sizes = [ready.get() for _ in workers]
+    done.set()
+    for worker in workers:
+        worker.join()
+    return sum(sizes) / len(sizes)
+
+
+def write_pack(path, base, rules, version):
+    pack = dict(base, version=version, rules=rules)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pack, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patterns', type=int, default=200000, help='规则数')
+    parser.add_argument('--processes', type=int, default=4, help='模拟的工作进程数')
+    parser.add_argument('--texts', type=int, default=2000, help='匹配速度测试的文本数')
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    with open(DEFAULT_RULE_PACK, encoding='utf-8') as f:
+        base = json.load(f)
+    texts = synthetic_texts(base['rules'], args.texts, 200, rng)
+    rules = synthetic_rules(base['rules'], args.patterns, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, 'rules.json')
+        compiled_dir = os.path.join(tmp, 'compiled')
+        write_pack(source_path, base, rules, 'bench')
+
+        start = time.perf_counter()
+        compiled_path = compile_pack(load_source(source_path), compiled_dir)
+        compile_time = time.perf_counter() - start
+        start = time.perf_counter()
+        pack = RulePack(compiled_path)
+        map_time = time.perf_counter() - start
+        start = time.perf_counter()
+        matcher = RuleMatcher(rules)
+        build_time = time.perf_counter() - start
+
+        timings = {}
+        hits = {}
+        for name, candidate in (('dict', matcher), ('mmap', pack.matcher)):
+            start = time.perf_counter()
+            hits[name] = [candidate.find_rule_ids(text.lower()) for text in texts]
+            timings[name] = time.perf_counter() - start
+        failed = hits['dict'] != hits['mmap']
+
+        print(f'{args.patterns} rules, compiled file {os.path.getsize(compiled_path) / 2 ** 20:.1f} MB '
+              f'(compile {compile_time:.2f}s, map {map_time * 1000:.1f} ms, in-process build {build_time:.2f}s)\n')
+        print(f'{"matcher":<10}{"texts/s":>12}{"private MB / process":>24}')
+        for name in ('dict', 'mmap'):
+            memory = worker_memory(name, source_path, compiled_path, texts[:200], args.processes)
+            print(f'{name:<10}{len(texts) / timings[name]:>12.0f}{memory / 2 ** 20:>24.1f}')
+
+        # 热替换：修改源文件后，下一次 current() 即返回新规则包
+        source = RulePackSource(source_path, compiled_dir, check_interval=0)
+        old_version = source.current().version
+        rules['memory'].append({'pattern': '新规则', 'score': 0.9})
+        write_pack(source_path, base, rules, 'bench-2')
+        start = time.perf_counter()
+        new_version = source.current().version
+        print(f'\nhot swap {old_version} -> {new_version}: {time.perf_counter() - start:.2f}s')
+        failed |= new_version == old_version
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+确定性的合成中文对话语料，供基准测试使用
+
+所有生成函数都接收随机种子，相同参数总是得到相同的语料。
+"""
+import random
+
+SEED = 20250323
+
+# 语句片段：包含规则引擎模式、填充词、语义指标词和普通内容
+SYMPTOM_PHRASES = [
+    '我忘记了', '记不起来', '想不起来了', '我不记得', '忘了带钥匙',
+    '不知道现在是几点', '不清楚今天日期', '不知道这是哪里', '有点迷失', '很迷惑',
+    '词不达意', '表达困难', '说不出来', '句子不完整',
+    '注意力不集中', '容易分心', '无法专注', '思绪混乱',
+    '逻辑混乱', '决策困难',
+]
+FILLER_PHRASES = ['嗯', '呃', '那个', '这个', '就是', '然后', '那个东西', '那个人']
+NEUTRAL_PHRASES = [
+    '我 今天 早上 吃了 粥', '女儿 昨天 来 看 我', '我们 去 公园 散步', '医院 的 护士 很 好',
+    '天气 很 好', '我 喜欢 听 音乐', '年轻 的 时候 我 是 老师', '下周 要 去 复诊',
+    '孙子 在 上 大学', '晚上 睡得 不太 好',
+]
+QUESTIONS = [
+    '您能告诉我今天是几月几号吗？',
+    '您现在住在哪里？可以描述一下您的住所吗？',
+    '您能回忆一下您今天早上做了什么吗？',
+    '请描述一下您现在的心情。',
+    '您平时有什么爱好或兴趣吗？',
+]
+
+
+def make_utterance(rng, sentences):
+    """生成一条包含 sentences 个句子的患者回答"""
+    parts = []
+    for _ in range(sentences):
+        roll = rng.random()
+        if roll < 0.3:
+            sentence = rng.choice(SYMPTOM_PHRASES)
+        elif roll < 0.45:
+            sentence = f'{rng.choice(FILLER_PHRASES)} {rng.choice(FILLER_PHRASES)} {rng.choice(NEUTRAL_PHRASES)}'
+        else:
+            sentence = rng.choice(NEUTRAL_PHRASES)
+        if rng.random() < 0.1:
+            sentence += '...'
+        parts.append(sentence + rng.choice(['。', '！', '？', '。']))
+    return ' '.join(parts)
+
+
+def make_corpus(count, sentences, seed=SEED):
+    """生成 count 条回答，每条 sentences 个句子"""
+    rng = random.Random(seed)
+    return [make_utterance(rng, sentences) for _ in range(count)]
+
+
+def make_history(count, sentences=3, seed=SEED):
+    """生成按时间排序的患者历史回答；越靠后症状片段越多，模拟病情进展"""
+    rng = random.Random(seed)
+    history = []
+    for index in range(count):
+        text = make_utterance(rng, sentences)
+        if rng.random() < index / max(1, count):
+            text += ' ' + rng.choice(SYMPTOM_PHRASES) + '。'
+        history.append(text)
+    return history
+
+
+def make_qa_pairs(count, sentences, seed=SEED):
+    """生成 (问题, 回答) 对"""
+    rng = random.Random(seed)
+    return [(rng.choice(QUESTIONS), make_utterance(rng, sentences)) for _ in range(count)]
@@ -0,0 +1,126 @@
+"""
+在临时 SQLite 数据库中批量生成患者、对话、消息和评估记录，供数据库相关的基准脚本使用
+
+大批量数据用原生 SQL executemany 写入，百万行级别只需几十秒。
+"""
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transmbd.settings')
+
+from benchmarks.corpus import SEED, make_utterance  # noqa: E402
+
+DIMENSIONS = ['memory', 'orientation', 'language', 'attention', 'problem_solving']
+SEVERITIES = ['normal', 'mild', 'moderate', 'severe']
+BASE_TIME = datetime(2024, 1, 1)
+
+
+def setup_database(path):
+    """把默认数据库指向临时文件并执行迁移"""
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = path
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def _insert(cursor, sql, rows, batch_size):
+    """分批执行 executemany，rows 可以是生成器"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def seed(patients=100, conversations=1, messages=0, assessments=0, batch_size=20000, seed=SEED):
+    """
+    生成测试数据
+
+    每位患者有 conversations 个对话，其中最后一个未结束；
+    消息和评估按轮转方式分配到所有对话，时间戳按分钟递增。
+
+    Args:
+        patients: 患者数
+        conversations: 每位患者的对话数
+        messages: 消息总数
+        assessments: 评估总数
+        batch_size: 每次 executemany 的行数
+        seed: 随机种子
+
+    Returns:
+        (照护人员用户, [(患者主键, 对话主键), ...])
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from core.models import Conversation, Patient
+
+    rng = random.Random(seed)
+    user = User.objects.create_user('bench', password='bench')
+    # bulk_create 不经过 Patient.save()，患者摘要在最后由 rebuild_summaries() 统一生成
+    with transaction.atomic():
+        patient_ids = [patient.id for patient in Patient.objects.bulk_create([
+            Patient(patient_id=f'B{i:05d}', name=f'患者{i}', age=70, gender='M', caregiver=user)
+            for i in range(patients)
+        ], batch_size=1000)]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _insert(cursor, (
+            'INSERT INTO core_conversation (patient_id, start_time, end_time, feature_state, archived_month) '
+            "VALUES (%s, %s, %s, %s, '')"
+        ), (
+            (patient_id, (BASE_TIME + timedelta(days=index)).isoformat(sep=' '),
+             None if index == conversations - 1 else (BASE_TIME + timedelta(days=index, hours=1)).isoformat(sep=' '),
+             '{}')
+            for patient_id in patient_ids
+            for index in range(conversations)
+        ), batch_size)
+    pairs = list(Conversation.objects.order_by('id').values_list('patient_id', 'id'))
+
+    def message_rows():
+        for i in range(messages):
+            _, conversation_id = pairs[i % len(pairs)]
+            yield (conversation_id, 'patient' if i % 2 == 0 else 'system',
+                   make_utterance(rng, 2), (BASE_TIME + timedelta(minutes=i)).isoformat(sep=' '))
+
+    def assessment_rows():
+        for i in range(assessments):
+            patient_id, conversation_id = pairs[i % len(pairs)]
+            scores = {dimension: round(rng.random(), 2) for dimension in DIMENSIONS}
+            results = {'severity_score': round(sum(scores.values()) / len(scores), 2),
+                       'dimension_scores': scores}
+            yield (patient_id, conversation_id, (BASE_TIME + timedelta(minutes=i)).isoformat(sep=' '),
+                   rng.choice(SEVERITIES), round(rng.uniform(0.5, 0.9), 2), json.dumps(results))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _insert(cursor, (
+            'INSERT INTO core_message (conversation_id, sender_type, content, timestamp) '
+            'VALUES (%s, %s, %s, %s)'
+        ), message_rows(), batch_size)
+        _insert(cursor, (
+            'INSERT INTO core_dementiaassessment '
+            '(patient_id, conversation_id, assessment_date, severity, confidence_score, detailed_results, predictor_version) '
+            "VALUES (%s, %s, %s, %s, %s, %s, '')"
+        ), assessment_rows(), batch_size)
+    rebuild_summaries()
+    return user, pairs
+
+
+def rebuild_summaries():
+    """原生 SQL 写入的评估不经过 save()，用迁移中的回填函数重建患者摘要和评估计数"""
+    import importlib
+    from django.apps import apps
+    from core.models import AssessmentCounter, PatientSummary
+
+    migration = importlib.import_module('core.migrations.0003_patient_summary')
+    PatientSummary.objects.all().delete()
+    AssessmentCounter.objects.all().delete()
+    migration.backfill_summaries(apps, None)
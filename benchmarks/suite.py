@@ -0,0 +1,227 @@
+"""
+预测与文本处理热点路径的微基准测试套件
+
+运行全部用例并保存结果:
+    python benchmarks/suite.py run --output bench_results.json
+
+只运行名称包含指定字符串的用例:
+    python benchmarks/suite.py run --filter predict_from_text
+
+比较两次运行，中位数变慢超过阈值的用例会被标记，且退出码为 1:
+    python benchmarks/suite.py compare base.json new.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import SEED, make_corpus, make_history, make_qa_pairs  # noqa: E402
+from core.utils.predictor import ConversationManager, DementiaPredictor  # noqa: E402
+from core.utils.text_processor import TextProcessor  # noqa: E402
+
+# 输入规模：每条文本的句子数
+TEXT_SIZES = {'short': 1, 'medium': 5, 'long': 50}
+# 历史样本数量
+HISTORY_SIZES = {'h10': 10, 'h100': 100, 'h1000': 1000}
+# 每个用例轮换使用的输入条数
+CORPUS_COUNT = 64
+
+
+def _cycle(items):
+    """无限循环地返回 items 中的元素"""
+    while True:
+        for item in items:
+            yield item
+
+
+def build_cases():
+    """
+    构建所有基准用例
+
+    Returns:
+        cases: (用例名, 无参可调用对象) 的列表；可调用对象每次调用执行一次被测操作
+    """
+    predictor = DementiaPredictor()
+    manager = ConversationManager(predictor=predictor)
+    processor = TextProcessor()
+    cases = []
+
+    for label, sentences in TEXT_SIZES.items():
+        texts = make_corpus(CORPUS_COUNT, sentences, seed=SEED + sentences)
+        predictions = [predictor.predict_from_text(text) for text in texts]
+        qa_pairs = make_qa_pairs(CORPUS_COUNT, sentences, seed=SEED + sentences)
+
+        text_iter = _cycle(texts)
+        cases.append((f'predictor._extract_features_from_text[{label}]',
+                      lambda it=text_iter: predictor._extract_features_from_text(next(it))))
+
+        text_iter = _cycle(texts)
+        cases.append((f'predictor.predict_from_text[{label}]',
+                      lambda it=text_iter: predictor.predict_from_text(next(it))))
+
+        prediction_iter = _cycle(predictions)
+        cases.append((f'predictor.generate_report[{label}]',
+                      lambda it=prediction_iter: predictor.generate_report(next(it))))
+
+        text_iter = _cycle(texts)
+        cases.append((f'conversation_manager.generate_response[{label}]',
+                      lambda it=text_iter: manager.generate_response(next(it))))
+
+        text_iter = _cycle(texts)
+        cases.append((f'text_processor.extract_features[{label}]',
+                      lambda it=text_iter: processor.extract_features(next(it))))
+
+        qa_iter = _cycle(qa_pairs)
+        cases.append((f'text_processor.analyze_response_coherence[{label}]',
+                      lambda it=qa_iter: processor.analyze_response_coherence(*next(it))))
+
+    for label, count in HISTORY_SIZES.items():
+        history = make_history(count, seed=SEED + count)
+        cases.append((f'text_processor.compute_language_decline_indicators[{label}]',
+                      lambda h=history: processor.compute_language_decline_indicators(h)))
+
+    return cases
+
+
+def time_case(func, min_time=0.2, repeat=5):
+    """
+    计时一个用例
+
+    先自动确定每轮调用次数，使每轮耗时不少于 min_time 秒，
+    再重复 repeat 轮，取每次调用的耗时统计（微秒）。
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min_us': round(min(samples), 3),
+        'median_us': round(statistics.median(samples), 3),
+        'mean_us': round(statistics.mean(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(output=None, name_filter=None, min_time=0.2, repeat=5):
+    """运行基准用例，打印结果并可选地写入 JSON 文件"""
+    results = {}
+    for name, func in build_cases():
+        if name_filter and name_filter not in name:
+            continue
+        # 固定随机种子，使置信度、模板选择等随机行为在每次运行中一致
+        random.seed(SEED)
+        np.random.seed(SEED)
+        results[name] = time_case(func, min_time=min_time, repeat=repeat)
+        print(f'{name:<64}{results[name]["median_us"]:>12.2f} us')
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': SEED,
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'results written to {output}')
+    return report
+
+
+def compare(base_path, new_path, threshold=0.10):
+    """
+    比较两次运行的中位数耗时
+
+    Returns:
+        regressions: 变慢超过阈值的用例名列表
+    """
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)['results']
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)['results']
+
+    regressions = []
+    print(f'{"case":<64}{"base (us)":>12}{"new (us)":>12}{"change":>10}')
+    for name in sorted(set(base) & set(new)):
+        before = base[name]['median_us']
+        after = new[name]['median_us']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  SLOWER'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f'{name:<64}{before:>12.2f}{after:>12.2f}{change:>+9.1%}{flag}')
+
+    for name in sorted(set(base) ^ set(new)):
+        print(f'{name:<64}  only in {"base" if name in base else "new"}')
+
+    if regressions:
+        print(f'\n{len(regressions)} case(s) slower than {threshold:.0%}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='运行基准测试')
+    run_parser.add_argument('--output', help='结果 JSON 文件路径')
+    run_parser.add_argument('--filter', dest='name_filter', help='只运行名称包含该字符串的用例')
+    run_parser.add_argument('--min-time', type=float, default=0.2, help='每轮最短耗时（秒）')
+    run_parser.add_argument('--repeat', type=int, default=5, help='重复轮数')
+
+    compare_parser = subparsers.add_parser('compare', help='比较两次运行结果')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='判定为变慢的相对阈值')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args.output, args.name_filter, args.min_time, args.repeat)
+    else:
+        sys.exit(1 if compare(args.base, args.new, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
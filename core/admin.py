@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Patient, Conversation, Message, DementiaAssessment
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import (Patient, Conversation, Message, DementiaAssessment, PatientSummary, AssessmentCounter,
+                     ProfileCapture)
 
 
 @admin.register(Patient)
@@ -67,3 +72,76 @@ class DementiaAssessmentAdmin(admin.ModelAdmin):
         if obj:  # 编辑时
             return ('patient', 'conversation', 'assessment_date', 'detailed_results')
         return ()
+
+
+@admin.register(PatientSummary)
+class PatientSummaryAdmin(admin.ModelAdmin):
+    """患者评估摘要管理界面（只读，由评估写入时自动维护）"""
+    list_display = ('patient', 'latest_severity', 'latest_assessment_date', 'assessment_count', 'updated_at')
+    list_filter = ('latest_severity',)
+    search_fields = ('patient__name', 'patient__patient_id')
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AssessmentCounter)
+class AssessmentCounterAdmin(admin.ModelAdmin):
+    """评估计数管理界面（只读）"""
+    list_display = ('patient', 'period', 'period_start', 'count')
+    list_filter = ('period', 'period_start')
+    search_fields = ('patient__name', 'patient__patient_id')
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    """性能分析记录管理界面（只读，由 ProfilingMiddleware 写入）"""
+    list_display = ('created_at', 'view_name', 'method', 'path', 'status_code', 'duration_ms',
+                    'sample_count', 'trigger', 'user', 'download_link')
+    list_filter = ('trigger', 'view_name', 'created_at')
+    search_fields = ('path', 'view_name')
+    date_hierarchy = 'created_at'
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        """分析文件通过管理后台下载，不经由公开的 MEDIA_URL"""
+        urls = [
+            path('<int:capture_id>/download/', self.admin_site.admin_view(self.download),
+                 name='core_profilecapture_download'),
+        ]
+        return urls + super().get_urls()
+
+    def download(self, request, capture_id):
+        """下载折叠栈文件"""
+        if not self.has_view_permission(request):
+            raise Http404
+        capture = get_object_or_404(ProfileCapture, pk=capture_id)
+        try:
+            handle = capture.file.open('rb')
+        except FileNotFoundError:
+            raise Http404('分析文件不存在')
+        return FileResponse(handle, as_attachment=True, filename=capture.file.name.rsplit('/', 1)[-1],
+                            content_type='text/plain; charset=utf-8')
+
+    def download_link(self, obj):
+        """折叠栈文件下载链接"""
+        url = reverse('admin:core_profilecapture_download', args=[obj.pk])
+        return format_html('<a href="{}">下载</a>', url)
+    download_link.short_description = "折叠栈文件"
@@ -9,6 +9,12 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         """应用就绪时执行的操作"""
-        # 导入信号处理器（如果有）
-        # import core.signals
-        pass
+        # 导入信号处理器
+        from . import signals  # noqa: F401
+
+        # 运行指标开关
+        from django.conf import settings
+        from .utils import metrics
+        metrics.set_enabled(getattr(settings, 'METRICS_ENABLED', True))
+
+        # 预测器的预热在 WSGI/ASGI 入口中执行（见 transmbd/wsgi.py），管理命令无需加载预测器
@@ -0,0 +1,112 @@
+"""
+归档已结束的旧对话
+
+用法:
+    python manage.py archive_conversations [--days 180] [--batch-size 200] [--dry-run] [--vacuum]
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Conversation, ConversationWord, DementiaAssessment, Message, PatientSummary
+from core.signals import invalidate_conversations
+from core.utils.archive import get_archive, serialize
+
+
+class Command(BaseCommand):
+    help = '把结束超过指定天数的对话的消息和评估移入按月压缩的归档分片'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ARCHIVE_AFTER_DAYS', 180),
+                            help='归档结束超过多少天的对话（默认 settings.ARCHIVE_AFTER_DAYS）')
+        parser.add_argument('--batch-size', type=int, default=200, help='每批归档的对话数')
+        parser.add_argument('--dry-run', action='store_true', help='只统计将被归档的对话，不做修改')
+        parser.add_argument('--vacuum', action='store_true', help='归档后执行 VACUUM 回收数据库文件空间')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        candidates = Conversation.objects.filter(
+            end_time__isnull=False, end_time__lt=cutoff, archived_month=''
+        ).order_by('id')
+
+        if options['dry_run']:
+            self.stdout.write(f'{candidates.count()} conversation(s) ended before {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        archive = get_archive()
+        conversations = messages = assessments = 0
+        last_id = 0
+        while True:
+            batch = list(candidates.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            counts = self._archive_batch(archive, batch)
+            conversations += len(batch)
+            messages += counts[0]
+            assessments += counts[1]
+            self.stdout.write(f'archived {conversations} conversation(s)')
+
+        if options['vacuum'] and conversations and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {conversations} conversation(s), {messages} message(s), '
+            f'{assessments} assessment(s) to {archive.root}'
+        ))
+
+    def _archive_batch(self, archive, batch):
+        """
+        归档一批对话，返回 (消息数, 评估数)
+
+        先把记录写入分片并落盘，再在一个事务中删除数据库中的行并标记对话；
+        中途失败时数据库不变，重新执行会覆盖分片中的重复记录。
+        """
+        by_month = {}
+        message_count = assessment_count = 0
+        for conversation in batch:
+            month = timezone.localtime(conversation.start_time).strftime('%Y-%m')
+            record = {
+                'conversation': conversation.id,
+                'patient': conversation.patient_id,
+                'messages': serialize(conversation.messages.order_by('timestamp', 'id')),
+                'assessments': serialize(conversation.assessments.order_by('assessment_date', 'id')),
+            }
+            message_count += len(record['messages'])
+            assessment_count += len(record['assessments'])
+            by_month.setdefault(month, []).append((conversation.id, record))
+
+        for month, items in by_month.items():
+            archive.append(month, [record for _, record in items])
+
+        with transaction.atomic():
+            for month, items in by_month.items():
+                ids = [conversation_id for conversation_id, _ in items]
+                Message.objects.filter(conversation_id__in=ids).delete()
+                # 归档的评估仍计入患者摘要和评估计数：以 SQL 直接删除，不经过 post_delete 接收者扣减计数
+                # （见 core.signals）；提交后重建摘要（已归档评估从分片读取，结果不变）并使页面失效
+                self._delete_assessments(ids)
+                # 已结束的对话不再累加特征，词汇表只需保留 feature_state 中的词数
+                ConversationWord.objects.filter(conversation_id__in=ids).delete()
+                Conversation.objects.filter(id__in=ids).update(archived_month=month)
+                PatientSummary.rebuild_on_commit({record['patient'] for _, record in items})
+                invalidate_conversations(ids)
+        return message_count, assessment_count
+
+    @staticmethod
+    def _delete_assessments(conversation_ids):
+        """删除一批对话的评估（不发送信号）"""
+        quote = connection.ops.quote_name
+        meta = DementiaAssessment._meta
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE {} IN ({})'.format(
+                quote(meta.db_table),
+                quote(meta.get_field('conversation').column),
+                ', '.join(['%s'] * len(conversation_ids)),
+            ), conversation_ids)
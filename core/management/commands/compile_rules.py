@@ -0,0 +1,30 @@
+"""
+校验并编译规则包，部署新规则前使用
+
+用法:
+    python manage.py compile_rules [rules/new-rules.json]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils.rule_pack import RulePack, RulePackError, compile_pack, get_rule_pack_source, load_source
+
+
+class Command(BaseCommand):
+    help = '校验规则包文件并编译到 RULE_PACK_COMPILED_DIR，输出其版本；工作进程加载同一规则包时直接映射编译结果'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='规则包源文件（默认 settings.RULE_PACK_PATH）')
+
+    def handle(self, *args, **options):
+        source = get_rule_pack_source()
+        path = options['path'] or source.path
+        try:
+            pack = RulePack(compile_pack(load_source(path), source.compiled_dir))
+        except (OSError, RulePackError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: {pack.version}, {len(pack.matcher)} rule(s) in {len(pack.rules)} dimension(s) -> {pack.path}'
+        ))
+        if path != source.path:
+            self.stdout.write(f'Copy it to {source.path} to activate; running workers reload it within '
+                              f'{source.check_interval:g}s')
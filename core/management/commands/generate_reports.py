@@ -0,0 +1,95 @@
+"""
+批量生成评估报告，以 JSON Lines 格式逐条写出
+
+用法:
+    python manage.py generate_reports [--output reports.jsonl] [--patient P001 ...]
+        [--since 2024-01-01] [--until 2024-01-08] [--batch-size 5000] [--workers 4]
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import CharField, F, TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.models import DementiaAssessment
+from core.utils.reports import ReportEngine
+
+
+class Command(BaseCommand):
+    help = '为一批评估生成描述性报告，按评估 id 顺序以 JSON Lines 格式写入文件（默认标准输出）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='输出文件路径，- 表示标准输出')
+        parser.add_argument('--patient', action='append', default=[], help='只包含这些患者（患者ID，可重复）')
+        parser.add_argument('--since', help='只包含该日期（含）之后的评估，格式 YYYY-MM-DD')
+        parser.add_argument('--until', help='只包含该日期（含）之前的评估，格式 YYYY-MM-DD')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批从数据库读取的评估数')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'REPORT_WORKERS', None),
+                            help='生成报告的进程数（默认 settings.REPORT_WORKERS 或 CPU 核数）')
+        parser.add_argument('--chunk-size', type=int, default=500, help='每个子进程任务的评估数')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0 or options['chunk_size'] <= 0:
+            raise CommandError('--batch-size and --chunk-size must be positive')
+        queryset = DementiaAssessment.objects.all()
+        if options['patient']:
+            queryset = queryset.filter(patient__patient_id__in=options['patient'])
+        if options['since']:
+            queryset = queryset.filter(assessment_date__gte=self._day_start(options['since']))
+        if options['until']:
+            queryset = queryset.filter(
+                assessment_date__lt=self._day_start(options['until']) + datetime.timedelta(days=1))
+
+        engine = ReportEngine(workers=options['workers'], chunk_size=options['chunk_size'], cache_size=0)
+        to_stdout = options['output'] == '-'
+        output = None if to_stdout else open(options['output'], 'w', encoding='utf-8')
+        write = (lambda text: self.stdout.write(text, ending='')) if to_stdout else output.write
+        progress = self.stderr if to_stdout else self.stdout
+        count = 0
+        try:
+            with engine:
+                batches = self._batches(queryset, options['batch_size'])
+                for text in engine.iter_jsonl(batches, timezone.get_current_timezone_name()):
+                    write(text)
+                    # 报告中的换行已转义，每条记录恰好占一行
+                    count += text.count('\n')
+        finally:
+            if output is not None:
+                output.close()
+        progress.write(self.style.SUCCESS(f'Generated {count} report(s)'))
+
+    @staticmethod
+    def _day_start(value):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'invalid date: {value}')
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+    @staticmethod
+    def _batches(queryset, batch_size):
+        """
+        按 id 分批读取评估原始行（键集分页，每批都走主键索引）
+
+        直接执行查询集编译出的 SQL，不为每一行构造 datetime 和解析 JSON，这些工作在子进程中完成。
+        """
+        connection = connections[queryset.db]
+        # SQLite 中时间以 UTC 文本读取；详细结果统一以 JSON 文本读取。
+        # 注解列在编译出的 SQL 中排在字段之后，values_list 需按同样顺序列出
+        date = Cast('assessment_date', CharField()) if connection.vendor == 'sqlite' else F('assessment_date')
+        rows = queryset.order_by('id').annotate(
+            date_value=date, results_text=Cast('detailed_results', TextField()),
+        ).values_list('id', 'patient__patient_id', 'severity', 'confidence_score', 'date_value', 'results_text')
+        last_id = 0
+        while True:
+            sql, params = rows.filter(id__gt=last_id)[:batch_size].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                batch = cursor.fetchall()
+            if not batch:
+                return
+            last_id = batch[-1][0]
+            yield batch
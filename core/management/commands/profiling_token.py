@@ -0,0 +1,20 @@
+"""
+生成按需采样分析使用的 X-Profile 请求头
+
+用法:
+    python manage.py profiling_token
+    curl -H "X-Profile: $(python manage.py profiling_token)" ...
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.middleware import make_profiling_token
+
+
+class Command(BaseCommand):
+    help = '生成 X-Profile 请求头的签名令牌，带此请求头的请求会被采样分析'
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            self.stderr.write('PROFILING_ENABLED is False; requests will not be profiled')
+        self.stdout.write(make_profiling_token())
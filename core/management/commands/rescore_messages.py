@@ -0,0 +1,206 @@
+"""
+规则更新后用当前预测器重新评估历史患者消息，更新对应的评估记录
+
+用法:
+    python manage.py rescore_messages [--chunk-size 2000] [--workers 4] [--checkpoint PATH] [--restart]
+
+按患者分批，每位患者的评估按时间顺序重放历史，与实时评分一样按此前的评估调整维度分数。
+中断后重新执行同一命令即从检查点继续；预测器版本变化后会从头开始。
+已归档对话的消息不在数据库中，不会重新评分，其评估仍按时间计入患者的历史。
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+
+from core.models import Conversation, DementiaAssessment, PatientSummary, archived_assessments
+from core.utils.page_cache import get_page_cache
+from core.utils.rule_pack import get_rule_pack_source
+from core.utils.rescoring import Checkpoint, init_worker, score_chunk
+
+# 重新评分时更新的评估字段
+RESCORED_FIELDS = ['severity', 'confidence_score', 'detailed_results', 'predictor_version']
+
+
+class Command(BaseCommand):
+    help = '用当前预测器版本重新评估所有患者消息，并批量更新对应的评估记录；可中断后继续'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='每批读取和评分的消息数')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='评分进程数（默认 CPU 核数），为 1 时在当前进程评分')
+        parser.add_argument('--checkpoint', default=getattr(settings, 'RESCORE_CHECKPOINT', 'rescore-checkpoint.json'),
+                            help='检查点文件路径（默认 settings.RESCORE_CHECKPOINT）')
+        parser.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0 or options['workers'] <= 0:
+            raise CommandError('--chunk-size and --workers must be positive')
+        source = get_rule_pack_source()
+        version = source.current().version
+        checkpoint = Checkpoint(options['checkpoint'])
+        state = None if options['restart'] else checkpoint.load()
+        if state is None or state.get('version') != version or 'last_patient_id' not in state:
+            state = {'version': version, 'last_patient_id': 0, 'messages': 0, 'assessments': 0, 'done': False}
+        elif state['done']:
+            self.stdout.write(f'All messages are already scored with {version}; use --restart to run again')
+            return
+        elif state['last_patient_id']:
+            self.stdout.write(f'Resuming after patient {state["last_patient_id"]} '
+                              f'({state["messages"]} message(s) already rescored)')
+
+        started = time.perf_counter()
+        resumed_messages = state['messages']
+        chunks = self._chunks(version, state['last_patient_id'], options['chunk_size'])
+        for rows, results in self._score(chunks, options['workers'], (source.path, source.compiled_dir)):
+            state['assessments'] += self._write(rows, results, version)
+            state['messages'] += len(results[0])
+            state['last_patient_id'] = rows[-1][0]
+            # 本批写入提交后才保存检查点，中断时最多重新评分一批
+            checkpoint.save(state)
+            rate = (state['messages'] - resumed_messages) / (time.perf_counter() - started)
+            self.stdout.write(f'rescored {state["messages"]} message(s), '
+                              f'updated {state["assessments"]} assessment(s), {rate:.0f} rows/s')
+
+        state['done'] = True
+        checkpoint.save(state)
+        elapsed = time.perf_counter() - started
+        count = state['messages'] - resumed_messages
+        self.stdout.write(self.style.SUCCESS(
+            f'Rescored {count} message(s) in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s) '
+            f'with {version}; {state["assessments"]} assessment(s) updated in total'
+        ))
+
+    @staticmethod
+    def _chunks(version, last_patient_id, chunk_size):
+        """
+        按患者 id 分批读取需要重新评分的患者的全部评估（键集分页）
+
+        只处理有评估的版本与当前版本不同的患者，重复执行时已是最新版本的患者直接跳过。
+        每批包含若干位患者的全部评估，按时间顺序重放历史时不依赖其他批次的结果；
+        待评分的消息累计达到 chunk_size 时结束一批，评估很多的患者单独成为较大的一批。
+        每行为 (患者 id, 消息 id, 消息内容, 维度分数)：已是当前版本或未关联患者消息的评估
+        消息 id 为 None，只计入历史；待评分的评估维度分数为 None。
+        """
+        stale = (DementiaAssessment.objects.filter(patient_id__gt=last_patient_id, message__sender_type='patient')
+                 .exclude(predictor_version=version))
+        counts = stale.values_list('patient_id').annotate(Count('id')).order_by('patient_id')
+        batch = []
+        size = 0
+        for patient_id, count in counts.iterator():
+            batch.append(patient_id)
+            size += count
+            if size >= chunk_size:
+                yield Command._chunk_rows(batch, version)
+                batch = []
+                size = 0
+        if batch:
+            yield Command._chunk_rows(batch, version)
+
+    @staticmethod
+    def _chunk_rows(patient_ids, version):
+        """读取一批患者的全部评估（含已归档对话中的评估，只计入历史），按患者和 (评估日期, id) 排序"""
+        archived = {}
+        for assessment in archived_assessments(Conversation.objects.filter(patient_id__in=patient_ids)):
+            archived.setdefault(assessment.patient_id, []).append(
+                (assessment.assessment_date, assessment.id, None, None, None, None, assessment.detailed_results))
+        assessments = (DementiaAssessment.objects.filter(patient_id__in=patient_ids)
+                       .order_by('patient_id', 'assessment_date', 'id')
+                       .values_list('patient_id', 'assessment_date', 'id', 'message_id', 'message__sender_type',
+                                    'message__content', 'predictor_version', 'detailed_results'))
+        key = itemgetter(0, 1)
+        rows = []
+        for patient_id, patient_rows in groupby(assessments.iterator(), key=itemgetter(0)):
+            history = merge((row[1:] for row in patient_rows), sorted(archived.pop(patient_id, []), key=key), key=key)
+            for _, _, message_id, sender_type, content, predictor_version, results in history:
+                if sender_type == 'patient' and predictor_version != version:
+                    rows.append((patient_id, message_id, content, None))
+                else:
+                    rows.append((patient_id, None, None, results.get('dimension_scores', {})))
+        return rows
+
+    @staticmethod
+    def _score(chunks, workers, rule_pack):
+        """
+        逐批评分，按读取顺序返回 (rows, results)
+
+        使用进程池时最多有 workers * 2 批同时在评分，读取和写入与评分并行进行。
+        """
+        if workers == 1:
+            init_worker(*rule_pack)
+            for rows in chunks:
+                yield rows, score_chunk(rows)
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=rule_pack) as pool:
+            pending = deque()
+            for rows in chunks:
+                pending.append((rows, pool.submit(score_chunk, rows)))
+                while len(pending) > workers * 2:
+                    rows, future = pending.popleft()
+                    yield rows, future.result()
+            while pending:
+                rows, future = pending.popleft()
+                yield rows, future.result()
+
+    @staticmethod
+    def _write(rows, results, version):
+        """
+        在一个事务中把评分结果写入关联的评估，并保存重放后的患者历史评估状态，返回更新的评估数
+
+        以 executemany 逐行按主键更新：bulk_update 为每一行构造 CASE WHEN 表达式，
+        一批两千行时编译表达式的开销是执行 SQL 的数十倍。
+        批量写入不经过 save()：患者摘要中的最新严重程度和历史评估状态在这里修正，页面缓存在这里失效。
+        """
+        scored, states = results
+        predictions = dict(scored)
+        assessments = list(DementiaAssessment.objects.filter(message_id__in=predictions).values_list(
+            'id', 'message_id', 'patient_id', 'assessment_date'))
+        connection = connections[DementiaAssessment.objects.db]
+        fields = [DementiaAssessment._meta.get_field(name) for name in RESCORED_FIELDS]
+        params = []
+        for assessment_id, message_id, _, _ in assessments:
+            prediction = predictions[message_id]
+            # 记录实际使用的规则包版本：运行期间规则包被替换时，之后的批次按新规则评分
+            values = [prediction['severity_category'], prediction['confidence'], prediction,
+                      prediction.get('rules_version', version)]
+            params.append([field.get_db_prep_save(value, connection) for field, value in zip(fields, values)]
+                          + [assessment_id])
+        history_field = PatientSummary._meta.get_field('history_state')
+        history_params = [[history_field.get_db_prep_save(state, connection), patient_id]
+                          for patient_id, state in states.items()]
+
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.executemany(Command._update_sql(connection, DementiaAssessment, fields), params)
+                # 本批包含这些患者的全部评估，重放后的状态即按新分数重建的历史评估状态
+                cursor.executemany(Command._update_sql(connection, PatientSummary, [history_field]), history_params)
+            # 只有患者的最新评估被重新评分时，摘要中的最新严重程度才会变化；
+            # 评估数量和日期不变，只需更新严重程度，不必 rebuild()
+            patient_ids = {patient_id for _, _, patient_id, _ in assessments}
+            latest = dict(PatientSummary.objects.filter(patient_id__in=patient_ids)
+                          .values_list('patient_id', 'latest_assessment_date'))
+            for _, message_id, patient_id, date in assessments:
+                if date == latest.get(patient_id):
+                    PatientSummary.objects.filter(patient_id=patient_id, latest_assessment_date=date).update(
+                        latest_severity=predictions[message_id]['severity_category'])
+            # 每批涉及上千个对话，整体清空页面缓存比逐个对话失效快得多
+            get_page_cache().clear_on_commit()
+        return len(assessments)
+
+    @staticmethod
+    def _update_sql(connection, model, fields):
+        """按主键更新 fields 的 UPDATE 语句，参数为各字段的值加主键"""
+        quote = connection.ops.quote_name
+        return 'UPDATE {} SET {} WHERE {} = %s'.format(
+            quote(model._meta.db_table),
+            ', '.join(f'{quote(field.column)} = %s' for field in fields),
+            quote(model._meta.pk.column),
+        )
@@ -0,0 +1,140 @@
+"""
+中间件
+"""
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .utils import metrics
+from .utils.profiler import SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+PROFILING_SALT = 'core.profiling'
+
+
+def view_label(request):
+    """请求对应的视图标签：URL 名称（含命名空间），未匹配到路由时为 'unresolved'"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name
+
+
+class _QueryTimer:
+    """connection.execute_wrapper 回调：统计请求内执行的 SQL 数量和耗时"""
+
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的耗时、SQL 查询数量和查询耗时，按视图分组（见 core.utils.metrics）
+
+    应放在 MIDDLEWARE 的最前面，使耗时包含其余中间件。
+    流式响应只统计到视图返回响应对象为止，迭代响应内容期间的查询不计入。
+    settings.METRICS_ENABLED = False 时不做任何记录。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics.is_enabled():
+            return self.get_response(request)
+
+        timer = _QueryTimer()
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = view_label(request)
+        metrics.REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(elapsed)
+        metrics.REQUEST_DB_QUERIES.labels(view).observe(timer.count)
+        metrics.REQUEST_DB_DURATION.labels(view).observe(timer.duration)
+        return response
+
+    def process_exception(self, request, exception):
+        if metrics.is_enabled():
+            metrics.REQUEST_EXCEPTIONS.labels(view_label(request), type(exception).__name__).inc()
+        return None
+
+
+def make_profiling_token():
+    """生成 X-Profile 请求头使用的签名令牌（有效期见 settings.PROFILING_TOKEN_MAX_AGE）"""
+    return signing.TimestampSigner(salt=PROFILING_SALT).sign('profile')
+
+
+class ProfilingMiddleware:
+    """
+    按需对单个请求做采样分析，结果保存为 ProfileCapture（可在管理后台查看和下载）
+
+    以下任一条件成立时分析该请求：
+    - 已登录的管理员访问时带有 ?profile=1
+    - 请求头 X-Profile 为 make_profiling_token() 生成的有效令牌（用于 process_message 等接口）
+    - 按 settings.PROFILING_SAMPLE_RATE 的比例随机抽样
+
+    settings.PROFILING_ENABLED = False 时中间件不会被加载，不产生任何开销。
+    需放在 AuthenticationMiddleware 之后。只采样处理请求的线程，
+    流式响应只分析到视图返回响应对象为止。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.interval = getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000
+        self.token_max_age = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+        self.keep = getattr(settings, 'PROFILING_MAX_CAPTURES', 200)
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        with SamplingProfiler(self.interval) as profiler:
+            response = self.get_response(request)
+
+        from .models import ProfileCapture
+        try:
+            ProfileCapture.record(request, response, profiler, trigger, view_label(request), keep=self.keep)
+        except Exception:
+            # 保存分析结果失败不应影响请求本身
+            logger.exception('failed to save profile capture for %s', request.path)
+        return response
+
+    def trigger(self, request):
+        """返回本次请求的触发方式，不需要分析时返回 None"""
+        token = request.META.get('HTTP_X_PROFILE')
+        if token:
+            try:
+                signing.TimestampSigner(salt=PROFILING_SALT).unsign(token, max_age=self.token_max_age)
+                return 'header'
+            except signing.BadSignature:
+                pass
+        if 'profile=' in request.META.get('QUERY_STRING', '') and request.GET.get('profile') == '1':
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return 'staff'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
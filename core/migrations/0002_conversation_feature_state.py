@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="feature_state",
+            field=models.JSONField(blank=True, default=dict, verbose_name="对话特征状态"),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:01
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import TruncDate
+
+
+def backfill_summaries(apps, schema_editor):
+    """根据已有评估记录生成患者摘要和日/周评估计数"""
+    Patient = apps.get_model("core", "Patient")
+    PatientSummary = apps.get_model("core", "PatientSummary")
+    AssessmentCounter = apps.get_model("core", "AssessmentCounter")
+    DementiaAssessment = apps.get_model("core", "DementiaAssessment")
+
+    latest = DementiaAssessment.objects.filter(patient=OuterRef("pk")).order_by("-assessment_date", "-id")
+    patients = Patient.objects.annotate(
+        total=Count("assessments"),
+        latest_severity=Subquery(latest.values("severity")[:1]),
+        latest_date=Subquery(latest.values("assessment_date")[:1]),
+    ).values_list("pk", "total", "latest_severity", "latest_date")
+    PatientSummary.objects.bulk_create(
+        [
+            PatientSummary(
+                patient_id=pk,
+                assessment_count=total,
+                latest_severity=severity or "",
+                latest_assessment_date=date,
+            )
+            for pk, total, severity, date in patients.iterator()
+        ],
+        batch_size=1000,
+    )
+
+    daily = (
+        DementiaAssessment.objects.annotate(day=TruncDate("assessment_date"))
+        .values_list("patient_id", "day")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    counters = {}
+    for patient_id, day, total in daily.iterator():
+        counters[(patient_id, "day", day)] = total
+        week = day - datetime.timedelta(days=day.weekday())
+        counters[(patient_id, "week", week)] = counters.get((patient_id, "week", week), 0) + total
+    AssessmentCounter.objects.bulk_create(
+        [
+            AssessmentCounter(patient_id=patient_id, period=period, period_start=start, count=total)
+            for (patient_id, period, start), total in counters.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_conversation_feature_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PatientSummary",
+            fields=[
+                ("patient", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="summary", serialize=False, to="core.patient", verbose_name="患者")),
+                ("latest_severity", models.CharField(blank=True, choices=[("normal", "正常"), ("mild", "轻度"), ("moderate", "中度"), ("severe", "重度")], max_length=10, verbose_name="最新严重程度")),
+                ("latest_assessment_date", models.DateTimeField(blank=True, null=True, verbose_name="最新评估日期")),
+                ("assessment_count", models.PositiveIntegerField(default=0, verbose_name="评估总数")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新时间")),
+            ],
+            options={
+                "verbose_name": "患者评估摘要",
+                "verbose_name_plural": "患者评估摘要",
+            },
+        ),
+        migrations.CreateModel(
+            name="AssessmentCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("period", models.CharField(choices=[("day", "日"), ("week", "周")], max_length=5, verbose_name="统计周期")),
+                ("period_start", models.DateField(verbose_name="周期开始日期")),
+                ("count", models.IntegerField(default=0, verbose_name="评估数量")),
+                ("patient", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="assessment_counters", to="core.patient", verbose_name="患者")),
+            ],
+            options={
+                "verbose_name": "评估计数",
+                "verbose_name_plural": "评估计数",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="assessmentcounter",
+            constraint=models.UniqueConstraint(fields=("patient", "period", "period_start"), name="unique_assessment_counter"),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_patient_summary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="assessmentcounter",
+            index=models.Index(fields=["period", "period_start"], name="assessment_counter_period_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="conversation",
+            index=models.Index(fields=["patient", "start_time"], name="conversation_patient_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="conversation",
+            index=models.Index(condition=models.Q(("end_time__isnull", True)), fields=["patient"], name="conversation_open_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="dementiaassessment",
+            index=models.Index(fields=["patient", "assessment_date"], name="assessment_patient_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="dementiaassessment",
+            index=models.Index(fields=["conversation", "assessment_date"], name="assessment_conv_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["conversation", "timestamp"], name="message_conversation_time_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="archived_month",
+            field=models.CharField(blank=True, default="", max_length=7, verbose_name="归档分片"),
+        ),
+    ]
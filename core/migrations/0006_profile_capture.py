@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("core", "0005_conversation_archived_month"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfileCapture",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="采集时间")),
+                ("view_name", models.CharField(max_length=200, verbose_name="视图")),
+                ("method", models.CharField(max_length=10, verbose_name="请求方法")),
+                ("path", models.CharField(max_length=500, verbose_name="请求路径")),
+                ("status_code", models.PositiveSmallIntegerField(verbose_name="状态码")),
+                ("duration_ms", models.FloatField(verbose_name="耗时（毫秒）")),
+                ("sample_count", models.PositiveIntegerField(verbose_name="采样次数")),
+                ("trigger", models.CharField(choices=[("staff", "管理员请求"), ("header", "签名请求头"), ("sample", "随机采样")], max_length=10, verbose_name="触发方式")),
+                ("file", models.FileField(upload_to="profiles/%Y/%m/", verbose_name="折叠栈文件")),
+                ("user", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name="用户")),
+            ],
+            options={
+                "verbose_name": "性能分析记录",
+                "verbose_name_plural": "性能分析记录",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_messages(apps, schema_editor):
+    """
+    把已有评估与其评估的患者消息配对
+
+    每轮对话在一个事务中保存一条患者消息和一条评估，因此同一对话内
+    按时间排列的第 k 条患者消息对应第 k 条评估；按对话 id 分段处理以限制内存。
+    """
+    Conversation = apps.get_model("core", "Conversation")
+    Message = apps.get_model("core", "Message")
+    DementiaAssessment = apps.get_model("core", "DementiaAssessment")
+
+    conversation_ids = list(Conversation.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(conversation_ids), 2000):
+        segment = conversation_ids[start:start + 2000]
+        messages = {}
+        for conversation_id, message_id in (
+            Message.objects.filter(conversation_id__in=segment, sender_type="patient")
+            .order_by("timestamp", "id").values_list("conversation_id", "id")
+        ):
+            messages.setdefault(conversation_id, []).append(message_id)
+        assessments = {}
+        for conversation_id, assessment_id in (
+            DementiaAssessment.objects.filter(conversation_id__in=segment)
+            .order_by("assessment_date", "id").values_list("conversation_id", "id")
+        ):
+            assessments.setdefault(conversation_id, []).append(assessment_id)
+        DementiaAssessment.objects.bulk_update(
+            [
+                DementiaAssessment(id=assessment_id, message_id=message_id)
+                for conversation_id, ids in assessments.items()
+                for assessment_id, message_id in zip(ids, messages.get(conversation_id, []))
+            ],
+            ["message"],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_profile_capture"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dementiaassessment",
+            name="message",
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name="+", to="core.message", verbose_name="评估的消息"),
+        ),
+        migrations.AddField(
+            model_name="dementiaassessment",
+            name="predictor_version",
+            field=models.CharField(blank=True, default="", max_length=64, verbose_name="预测器版本"),
+        ),
+        migrations.RunPython(link_messages, migrations.RunPython.noop),
+    ]
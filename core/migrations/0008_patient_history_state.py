@@ -0,0 +1,110 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:17
+
+import gzip
+import json
+import os
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def archived_records(Conversation):
+    """
+    逐个返回已归档对话的 (对话主键, 归档记录)
+
+    直接读取 settings.ARCHIVE_ROOT 下的分片，不依赖应用代码：每月一个 gzip 压缩的 JSON Lines 文件
+    （如 2024-01.jsonl.gz），每行一个对话的记录，同一对话重复写入时以最后一行为准。
+    """
+    root = getattr(settings, "ARCHIVE_ROOT", None)
+    if not root:
+        return
+    months = (
+        Conversation.objects.exclude(archived_month="").order_by("archived_month")
+        .values_list("archived_month", flat=True).distinct()
+    )
+    for month in list(months):
+        path = os.path.join(root, f"{month}.jsonl.gz")
+        if not os.path.exists(path):
+            continue
+        ids = set(Conversation.objects.filter(archived_month=month).values_list("id", flat=True))
+        records = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record["conversation"] in ids:
+                        records[record["conversation"]] = record
+        yield from records.items()
+
+
+def archived_history(Conversation):
+    """已归档对话中的评估：患者主键 -> [(评估日期, 评估主键, 详细评估结果), ...]"""
+    archived = {}
+    for _, record in archived_records(Conversation):
+        for item in record.get("assessments", []):
+            fields = item["fields"]
+            archived.setdefault(fields["patient"], []).append(
+                (parse_datetime(fields["assessment_date"]), item["pk"], fields["detailed_results"])
+            )
+    return archived
+
+
+def replay(rows):
+    """
+    按顺序累加评估的维度分数
+
+    格式与 PatientHistoryState.to_dict() 相同：维度 -> [条数, 加权和]，第 n 条分数的权重为 n。
+    """
+    state = {"assessment_count": 0, "dimensions": {}}
+    for _, _, results in rows:
+        state["assessment_count"] += 1
+        for dimension, score in (results or {}).get("dimension_scores", {}).items():
+            count, weighted_sum = state["dimensions"].get(dimension, (0, 0))
+            count += 1
+            state["dimensions"][dimension] = [count, weighted_sum + score * count]
+    return state
+
+
+def backfill_history_states(apps, schema_editor):
+    """按 (评估日期, id) 顺序重放已有评估（含已归档对话中的评估），生成各患者的历史评估状态"""
+    PatientSummary = apps.get_model("core", "PatientSummary")
+    DementiaAssessment = apps.get_model("core", "DementiaAssessment")
+    Conversation = apps.get_model("core", "Conversation")
+
+    key = itemgetter(0, 1)
+    archived = archived_history(Conversation)
+    rows = (
+        DementiaAssessment.objects.order_by("patient_id", "assessment_date", "id")
+        .values_list("patient_id", "assessment_date", "id", "detailed_results").iterator(chunk_size=5000)
+    )
+    states = {}
+    for patient_id, patient_rows in groupby(rows, key=itemgetter(0)):
+        hot = (row[1:] for row in patient_rows)
+        states[patient_id] = replay(merge(hot, sorted(archived.pop(patient_id, []), key=key), key=key))
+    for patient_id, patient_rows in archived.items():
+        states[patient_id] = replay(sorted(patient_rows, key=key))
+
+    summaries = list(PatientSummary.objects.filter(patient_id__in=states).only("patient_id"))
+    for summary in summaries:
+        summary.history_state = states[summary.patient_id]
+    PatientSummary.objects.bulk_update(summaries, ["history_state"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_assessment_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patientsummary",
+            name="history_state",
+            field=models.JSONField(blank=True, default=dict, verbose_name="历史评估状态"),
+        ),
+        migrations.RunPython(backfill_history_states, migrations.RunPython.noop),
+    ]
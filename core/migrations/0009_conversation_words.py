@@ -0,0 +1,112 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:50
+
+import gzip
+import json
+import os
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core.utils.text_processor import ConversationFeatureState, TextProcessor
+
+
+def archived_records(Conversation):
+    """
+    逐个返回已归档对话的 (对话主键, 归档记录)
+
+    直接读取 settings.ARCHIVE_ROOT 下的分片，不依赖应用代码：每月一个 gzip 压缩的 JSON Lines 文件
+    （如 2024-01.jsonl.gz），每行一个对话的记录，同一对话重复写入时以最后一行为准。
+    """
+    root = getattr(settings, "ARCHIVE_ROOT", None)
+    if not root:
+        return
+    months = (
+        Conversation.objects.exclude(archived_month="").order_by("archived_month")
+        .values_list("archived_month", flat=True).distinct()
+    )
+    for month in list(months):
+        path = os.path.join(root, f"{month}.jsonl.gz")
+        if not os.path.exists(path):
+            continue
+        ids = set(Conversation.objects.filter(archived_month=month).values_list("id", flat=True))
+        records = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record["conversation"] in ids:
+                        records[record["conversation"]] = record
+        yield from records.items()
+
+
+def backfill_feature_states(apps, schema_editor):
+    """
+    按时间顺序重放已有对话中的患者消息，重新生成对话特征状态和词汇表
+
+    0002 添加 feature_state 时没有回填，之前的对话为空字典；之后写入的状态在 JSON 中保存完整词汇表，
+    现改为只保存词数、词汇表写入 ConversationWord。已归档对话的消息从归档分片读取，
+    对话已结束，只生成特征状态，不写入词汇表。
+    """
+    Conversation = apps.get_model("core", "Conversation")
+    ConversationWord = apps.get_model("core", "ConversationWord")
+    Message = apps.get_model("core", "Message")
+
+    processor = TextProcessor()
+    states = {}
+    words = []
+    messages = (
+        Message.objects.filter(sender_type="patient").order_by("conversation_id", "timestamp", "id")
+        .values_list("conversation_id", "content").iterator(chunk_size=5000)
+    )
+    for conversation_id, rows in groupby(messages, key=itemgetter(0)):
+        state = ConversationFeatureState(processor)
+        for _, content in rows:
+            state.update(content)
+        states[conversation_id] = state.to_dict()
+        words += [ConversationWord(conversation_id=conversation_id, word=word) for word in state.vocabulary]
+        if len(words) >= 5000:
+            ConversationWord.objects.bulk_create(words, batch_size=1000)
+            words = []
+    ConversationWord.objects.bulk_create(words, batch_size=1000)
+
+    for conversation_id, record in archived_records(Conversation):
+        state = ConversationFeatureState(processor)
+        for item in sorted(record.get("messages", []), key=lambda item: (item["fields"]["timestamp"], item["pk"])):
+            if item["fields"]["sender_type"] == "patient":
+                state.update(item["fields"]["content"])
+        states[conversation_id] = state.to_dict()
+
+    conversations = list(Conversation.objects.only("id"))
+    for conversation in conversations:
+        conversation.feature_state = states.get(conversation.id, {})
+    Conversation.objects.bulk_update(conversations, ["feature_state"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_patient_history_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConversationWord",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("word", models.TextField(verbose_name="词")),
+                ("conversation", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="words", to="core.conversation", verbose_name="对话")),
+            ],
+            options={
+                "verbose_name": "对话词汇",
+                "verbose_name_plural": "对话词汇",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="conversationword",
+            constraint=models.UniqueConstraint(fields=("conversation", "word"), name="conversation_word_unique"),
+        ),
+        migrations.RunPython(backfill_feature_states, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,37 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import timedelta
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
 import json
+import threading
+
+from .utils.predictor import PatientHistoryState
+from .utils.text_processor import ConversationFeatureState
+from .utils.archive import deserialize, get_archive
+from .utils.reports import forget_report
+
+
+# PatientSummary.rebuild_on_commit() 登记的待重建患者（每个线程一个集合）
+_pending_rebuilds = threading.local()
+
+
+def archived_assessments(conversations):
+    """
+    读取一组对话中已归档的评估（未保存的模型实例，不保证顺序）
+
+    按月份依次读取分片，同一分片只解压一次。
+    """
+    assessments = []
+    archived = conversations.exclude(archived_month='').order_by('archived_month').values_list('id', 'archived_month')
+    for conversation_id, month in archived.iterator():
+        record = get_archive().get(month, conversation_id)
+        if record:
+            assessments.extend(deserialize(record['assessments']))
+    return assessments
 
 
 class Patient(models.Model):
@@ -26,6 +56,20 @@ class Patient(models.Model):
     def __str__(self):
         return f"{self.name} ({self.patient_id})"
     
+    def get_archived_assessments(self):
+        """已归档对话中的评估（按日期升序），读取对应月份的归档分片"""
+        assessments = archived_assessments(self.conversations.all())
+        assessments.sort(key=lambda assessment: (assessment.assessment_date, assessment.id))
+        return assessments
+    
+    def save(self, *args, **kwargs):
+        """保存患者；新建时同时创建空的评估摘要，仪表板无需再判断摘要是否存在"""
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                PatientSummary.objects.get_or_create(patient=self)
+    
     class Meta:
         verbose_name = "患者"
         verbose_name_plural = "患者"
@@ -38,6 +82,12 @@ class Conversation(models.Model):
     start_time = models.DateTimeField(auto_now_add=True, verbose_name="开始时间")
     end_time = models.DateTimeField(null=True, blank=True, verbose_name="结束时间")
     
+    # 对话级语言特征的增量累加状态（见 ConversationFeatureState）
+    feature_state = models.JSONField(default=dict, blank=True, verbose_name="对话特征状态")
+    
+    # 已归档对话所在的月份分片（如 2024-01）；为空表示消息和评估仍在数据库中
+    archived_month = models.CharField(max_length=7, blank=True, default='', verbose_name="归档分片")
+    
     def __str__(self):
         return f"与{self.patient.name}的对话 - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
     
@@ -46,9 +96,73 @@ class Conversation(models.Model):
         self.end_time = timezone.now()
         self.save()
     
+    def update_feature_state(self, text):
+        """
+        将一条患者消息累加到对话级语言特征中
+        
+        词汇表保存在 ConversationWord 中，只查询和写入本条消息的词；
+        feature_state 只保存计数，每条消息重写的 JSON 大小与对话长度无关。
+        """
+        def new_words(words):
+            known = set(ConversationWord.objects.filter(conversation=self, word__in=words)
+                        .values_list('word', flat=True))
+            added = ConversationWord.objects.bulk_create(
+                [ConversationWord(conversation=self, word=word) for word in words - known])
+            return len(added)
+        
+        state = ConversationFeatureState.from_dict(self.feature_state).update(text, new_words)
+        self.feature_state = state.to_dict()
+        self.save(update_fields=['feature_state'])
+        return state
+    
+    def get_language_features(self):
+        """获取对话级语言特征，无需重新扫描历史消息"""
+        return ConversationFeatureState.from_dict(self.feature_state).features()
+    
+    @property
+    def is_archived(self):
+        """消息和评估是否已移入归档分片"""
+        return bool(self.archived_month)
+    
+    def _archived_record(self):
+        return get_archive().get(self.archived_month, self.id) or {'messages': [], 'assessments': []}
+    
+    def get_messages(self):
+        """对话中的消息（按时间排序）；已归档时从归档分片读取"""
+        if self.is_archived:
+            return deserialize(self._archived_record()['messages'])
+        return self.messages.order_by('timestamp')
+    
+    def get_assessments(self):
+        """对话相关的评估（按日期排序）；已归档时从归档分片读取"""
+        if self.is_archived:
+            return deserialize(self._archived_record()['assessments'])
+        return self.assessments.order_by('assessment_date')
+    
     class Meta:
         verbose_name = "对话记录"
         verbose_name_plural = "对话记录"
+        indexes = [
+            # 患者详情页：按开始时间列出患者的对话
+            models.Index(fields=['patient', 'start_time'], name='conversation_patient_start_idx'),
+            # 对话界面：查找患者尚未结束的对话（只索引未结束的行）
+            models.Index(fields=['patient'], condition=models.Q(end_time__isnull=True),
+                         name='conversation_open_idx'),
+        ]
+
+
+class ConversationWord(models.Model):
+    """对话中出现过的词（对话级词汇表），由 Conversation.update_feature_state() 维护，用于计算词汇多样性"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE,
+                                     related_name="words", verbose_name="对话")
+    word = models.TextField(verbose_name="词")
+    
+    class Meta:
+        verbose_name = "对话词汇"
+        verbose_name_plural = "对话词汇"
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'word'], name='conversation_word_unique'),
+        ]
 
 
 class Message(models.Model):
@@ -71,6 +185,10 @@ class Message(models.Model):
         verbose_name = "消息"
         verbose_name_plural = "消息"
         ordering = ['timestamp']
+        indexes = [
+            # 对话详情页：按时间顺序读取对话中的消息
+            models.Index(fields=['conversation', 'timestamp'], name='message_conversation_time_idx'),
+        ]
 
 
 class DementiaAssessment(models.Model):
@@ -93,6 +211,12 @@ class DementiaAssessment(models.Model):
     # 存储详细评估结果的JSON字段
     detailed_results = models.JSONField(default=dict, verbose_name="详细评估结果")
     
+    # 被评估的患者消息和评估时的预测器版本，供规则更新后重新评分（见 rescore_messages 命令）。
+    # 不建立数据库外键约束，批量删除消息（如归档）时不需要逐条检查关联的评估
+    message = models.ForeignKey(Message, on_delete=models.DO_NOTHING, db_constraint=False,
+                                null=True, blank=True, related_name="+", verbose_name="评估的消息")
+    predictor_version = models.CharField(max_length=64, blank=True, default='', verbose_name="预测器版本")
+    
     def get_detailed_results(self):
         """获取详细评估结果"""
         return self.detailed_results
@@ -102,9 +226,265 @@ class DementiaAssessment(models.Model):
         self.detailed_results = results_dict
         self.save()
     
+    def save(self, *args, **kwargs):
+        """
+        保存评估；新建时在同一事务中增量更新患者摘要和评估计数，修改时丢弃缓存的报告
+        
+        修改和删除后的摘要和计数由 core.signals 中的接收者维护。
+        """
+        if not self._state.adding:
+            forget_report(self.pk)
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            PatientSummary.record_assessment(self)
+    
     def __str__(self):
         return f"{self.patient.name}的评估 - {self.assessment_date.strftime('%Y-%m-%d')}"
     
     class Meta:
         verbose_name = "失智症评估"
         verbose_name_plural = "失智症评估"
+        indexes = [
+            # 患者详情、进展图表和导出：按日期范围读取患者的评估
+            models.Index(fields=['patient', 'assessment_date'], name='assessment_patient_date_idx'),
+            # 对话详情页：按日期读取对话相关的评估
+            models.Index(fields=['conversation', 'assessment_date'], name='assessment_conv_date_idx'),
+        ]
+
+
+class PatientSummary(models.Model):
+    """
+    患者评估摘要（反规范化的读模型）
+    
+    新建评估时由 DementiaAssessment.save() 在同一事务中增量维护；修改和删除评估
+    （含 QuerySet.delete 和级联删除）后由 core.signals 在事务提交后调用 rebuild_on_commit() 重建。
+    仪表板只读取此表，无需为每位患者查询评估记录。
+    注意：bulk_create 和 QuerySet.update 不发送信号，之后需调用 rebuild()。
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True,
+                                   related_name="summary", verbose_name="患者")
+    latest_severity = models.CharField(max_length=10, choices=DementiaAssessment.SEVERITY_CHOICES,
+                                       blank=True, verbose_name="最新严重程度")
+    latest_assessment_date = models.DateTimeField(null=True, blank=True, verbose_name="最新评估日期")
+    assessment_count = models.PositiveIntegerField(default=0, verbose_name="评估总数")
+    # 各维度历史分数的线性加权累加状态（见 PatientHistoryState），预测时用于按历史调整
+    history_state = models.JSONField(default=dict, blank=True, verbose_name="历史评估状态")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    
+    def __str__(self):
+        return f"{self.patient_id}的评估摘要"
+    
+    @classmethod
+    def record_assessment(cls, assessment):
+        """累加一条新评估（需在事务中调用）"""
+        summary, _ = cls.objects.select_for_update().get_or_create(patient_id=assessment.patient_id)
+        summary.assessment_count += 1
+        if summary.latest_assessment_date is None or assessment.assessment_date >= summary.latest_assessment_date:
+            summary.latest_severity = assessment.severity
+            summary.latest_assessment_date = assessment.assessment_date
+        summary.history_state = PatientHistoryState.from_dict(summary.history_state).update(
+            assessment.detailed_results.get('dimension_scores', {})).to_dict()
+        summary.save()
+        AssessmentCounter.add(assessment.patient_id, assessment.assessment_date)
+        return summary
+    
+    @classmethod
+    def rebuild(cls, patient_id):
+        """根据评估记录（含已归档对话中的评估）重新计算某位患者的摘要"""
+        assessments = DementiaAssessment.objects.filter(patient_id=patient_id)
+        archived = [(a.assessment_date, a.id, a.severity, a.detailed_results)
+                    for a in archived_assessments(Conversation.objects.filter(patient_id=patient_id))]
+        latest = assessments.order_by('-assessment_date', '-id').values_list('assessment_date', 'id', 'severity').first()
+        latest = max([row[:3] for row in archived] + ([latest] if latest else []), default=None)
+        history = assessments.order_by('assessment_date', 'id').values_list(
+            'assessment_date', 'id', 'detailed_results')
+        summary, _ = cls.objects.update_or_create(patient_id=patient_id, defaults={
+            'latest_severity': latest[2] if latest else '',
+            'latest_assessment_date': latest[0] if latest else None,
+            'assessment_count': assessments.count() + len(archived),
+            'history_state': PatientHistoryState.from_history(
+                cls._merge_history(history.iterator(), [(date, pk, results) for date, pk, _, results in archived])
+            ).to_dict(),
+        })
+        return summary
+    
+    @classmethod
+    def rebuild_on_commit(cls, patient_ids):
+        """
+        在当前事务提交后重建这些患者的摘要（不在事务中时立即执行）
+        
+        批量删除时每一行评估都会登记一次；同一事务中登记的患者在提交后只重建一次，
+        已被删除的患者跳过。事务回滚时登记的患者留到本线程下一次提交时重建，结果不变。
+        """
+        pending = _pending_rebuilds.__dict__.setdefault('patient_ids', set())
+        pending.update(patient_ids)
+        transaction.on_commit(cls._rebuild_pending)
+    
+    @classmethod
+    def _rebuild_pending(cls):
+        patient_ids = getattr(_pending_rebuilds, 'patient_ids', None)
+        if not patient_ids:
+            return
+        _pending_rebuilds.patient_ids = set()
+        for patient_id in Patient.objects.filter(pk__in=patient_ids).values_list('pk', flat=True):
+            cls.rebuild(patient_id)
+    
+    @classmethod
+    def rebuild_history(cls, patient_ids=None):
+        """
+        按时间顺序重放评估（含已归档对话中的评估），重建患者的历史评估状态
+        （patient_ids 为 None 时重建全部患者）
+        
+        批量修改评估的维度分数后调用；只扫描一遍评估表和一遍归档分片。
+        """
+        assessments = DementiaAssessment.objects.order_by('patient_id', 'assessment_date', 'id')
+        conversations = Conversation.objects.all()
+        summaries = cls.objects.all()
+        if patient_ids is not None:
+            assessments = assessments.filter(patient_id__in=patient_ids)
+            conversations = conversations.filter(patient_id__in=patient_ids)
+            summaries = summaries.filter(patient_id__in=patient_ids)
+        archived = {}
+        for assessment in archived_assessments(conversations):
+            archived.setdefault(assessment.patient_id, []).append(
+                (assessment.assessment_date, assessment.id, assessment.detailed_results))
+        rows = assessments.values_list('patient_id', 'assessment_date', 'id', 'detailed_results').iterator(
+            chunk_size=5000)
+        states = {}
+        for patient_id, patient_rows in groupby(rows, key=itemgetter(0)):
+            history = cls._merge_history((row[1:] for row in patient_rows), archived.pop(patient_id, []))
+            states[patient_id] = PatientHistoryState.from_history(history)
+        for patient_id, patient_rows in archived.items():
+            states[patient_id] = PatientHistoryState.from_history(cls._merge_history((), patient_rows))
+        summaries = list(summaries.only('patient_id'))
+        for summary in summaries:
+            summary.history_state = states.get(summary.patient_id, PatientHistoryState()).to_dict()
+        cls.objects.bulk_update(summaries, ['history_state'], batch_size=500)
+        return len(summaries)
+    
+    @staticmethod
+    def _merge_history(rows, archived):
+        """
+        把数据库中的评估与已归档的评估按 (评估日期, id) 合并，依次返回详细评估结果
+        
+        rows 为已按 (评估日期, id) 排序的 (评估日期, id, 详细评估结果)，archived 格式相同、可以无序。
+        """
+        key = itemgetter(0, 1)
+        for _, _, results in merge(rows, sorted(archived, key=key), key=key):
+            yield results
+    
+    class Meta:
+        verbose_name = "患者评估摘要"
+        verbose_name_plural = "患者评估摘要"
+
+
+class AssessmentCounter(models.Model):
+    """按患者、按日/周预先累计的评估数量（日期按本地时区划分，周从周一开始）"""
+    PERIOD_CHOICES = [
+        ('day', '日'),
+        ('week', '周'),
+    ]
+    
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE,
+                                related_name="assessment_counters", verbose_name="患者")
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES, verbose_name="统计周期")
+    period_start = models.DateField(verbose_name="周期开始日期")
+    count = models.IntegerField(default=0, verbose_name="评估数量")
+    
+    def __str__(self):
+        return f"{self.patient_id} {self.get_period_display()} {self.period_start}: {self.count}"
+    
+    @staticmethod
+    def period_starts(moment):
+        """返回某一时刻所在的日、周的开始日期"""
+        day = timezone.localtime(moment).date() if timezone.is_aware(moment) else moment.date()
+        return {'day': day, 'week': day - timedelta(days=day.weekday())}
+    
+    @classmethod
+    def add(cls, patient_id, moment, delta=1):
+        """把 delta 累加到该时刻所在的日计数和周计数上（需在事务中调用）"""
+        for period, start in cls.period_starts(moment).items():
+            counter, _ = cls.objects.get_or_create(patient_id=patient_id, period=period, period_start=start)
+            cls.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+    
+    class Meta:
+        verbose_name = "评估计数"
+        verbose_name_plural = "评估计数"
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'period', 'period_start'],
+                                    name='unique_assessment_counter'),
+        ]
+        indexes = [
+            # 仪表板：汇总当日、当周所有患者的计数
+            models.Index(fields=['period', 'period_start'], name='assessment_counter_period_idx'),
+        ]
+
+
+class ProfileCapture(models.Model):
+    """单个请求的采样分析结果（见 core.middleware.ProfilingMiddleware），分析数据以折叠栈文件保存在 MEDIA_ROOT 下"""
+    TRIGGER_CHOICES = [
+        ('staff', '管理员请求'),
+        ('header', '签名请求头'),
+        ('sample', '随机采样'),
+    ]
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="采集时间")
+    view_name = models.CharField(max_length=200, verbose_name="视图")
+    method = models.CharField(max_length=10, verbose_name="请求方法")
+    path = models.CharField(max_length=500, verbose_name="请求路径")
+    status_code = models.PositiveSmallIntegerField(verbose_name="状态码")
+    duration_ms = models.FloatField(verbose_name="耗时（毫秒）")
+    sample_count = models.PositiveIntegerField(verbose_name="采样次数")
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES, verbose_name="触发方式")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="用户")
+    file = models.FileField(upload_to='profiles/%Y/%m/', verbose_name="折叠栈文件")
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+    
+    def delete(self, *args, **kwargs):
+        """删除记录时一并删除分析文件"""
+        storage, name = self.file.storage, self.file.name
+        result = super().delete(*args, **kwargs)
+        if name:
+            storage.delete(name)
+        return result
+    
+    @classmethod
+    def record(cls, request, response, profiler, trigger, view_name, keep=200):
+        """
+        保存一次采样分析结果，并只保留最近 keep 条
+        
+        Args:
+            request: 被分析的请求
+            response: 该请求的响应
+            profiler: 已停止的 SamplingProfiler
+            trigger: 触发方式（TRIGGER_CHOICES 之一）
+            view_name: 视图标签
+            keep: 最多保留的分析记录数
+        """
+        from django.core.files.base import ContentFile
+        
+        user = getattr(request, 'user', None)
+        capture = cls(
+            view_name=view_name,
+            method=request.method,
+            path=request.path[:500],
+            status_code=response.status_code,
+            duration_ms=profiler.duration * 1000,
+            sample_count=profiler.sample_count,
+            trigger=trigger,
+            user=user if user is not None and user.is_authenticated else None,
+        )
+        filename = f"{timezone.now():%Y%m%d-%H%M%S}-{view_name.replace(':', '-')}.folded"
+        capture.file.save(filename, ContentFile(profiler.folded().encode('utf-8')), save=True)
+        
+        for stale in cls.objects.order_by('-created_at', '-id')[keep:]:
+            stale.delete()
+        return capture
+    
+    class Meta:
+        verbose_name = "性能分析记录"
+        verbose_name_plural = "性能分析记录"
+        ordering = ['-created_at']
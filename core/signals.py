@@ -0,0 +1,150 @@
+"""
+信号处理器
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import AssessmentCounter, Conversation, DementiaAssessment, Message, Patient, PatientSummary
+from .utils.page_cache import get_page_cache
+from .utils.reports import forget_report
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    新建 SQLite 连接时执行 settings.SQLITE_PRAGMAS 中的 PRAGMA
+
+    journal_mode=WAL 使读操作不阻塞写操作，busy_timeout 使并发写入排队等待锁，
+    而不是立即返回 "database is locked"。
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# ---- 患者摘要和评估计数 ----
+#
+# 新建评估由 DementiaAssessment.save() 在同一事务中增量累加；修改和删除评估（包括
+# QuerySet.delete、管理后台的批量删除以及删除对话时的级联删除）由下面的接收者维护：
+# 日/周计数在同一事务中修正，摘要在事务提交后按患者重建一次。
+# 删除患者时摘要和计数随之级联删除，无需维护。
+# 这些接收者须在页面失效的接收者之前注册，使摘要先于页面失效重建。
+
+def _deleting_patient(origin):
+    """删除是否由删除患者引起（origin 为患者实例或患者 QuerySet）"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Patient
+
+
+@receiver(pre_save, sender=DementiaAssessment)
+def remember_assessment_position(sender, instance, raw=False, **kwargs):
+    """记录修改前的患者和评估日期，两者变化时需从原来的日/周计数中扣除"""
+    instance._previous_position = None
+    if not raw and not instance._state.adding:
+        instance._previous_position = DementiaAssessment.objects.filter(pk=instance.pk).values_list(
+            'patient_id', 'assessment_date').first()
+
+
+@receiver(post_save, sender=DementiaAssessment)
+def update_assessment_statistics(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    patient_ids = {instance.patient_id}
+    previous = getattr(instance, '_previous_position', None)
+    if previous and previous != (instance.patient_id, instance.assessment_date):
+        with transaction.atomic():
+            AssessmentCounter.add(*previous, delta=-1)
+            AssessmentCounter.add(instance.patient_id, instance.assessment_date)
+        patient_ids.add(previous[0])
+    PatientSummary.rebuild_on_commit(patient_ids)
+
+
+@receiver(post_delete, sender=DementiaAssessment)
+def remove_assessment_statistics(sender, instance, origin=None, **kwargs):
+    forget_report(instance.pk)
+    if _deleting_patient(origin):
+        return
+    AssessmentCounter.add(instance.patient_id, instance.assessment_date, delta=-1)
+    PatientSummary.rebuild_on_commit([instance.patient_id])
+
+
+# ---- 页面片段缓存失效（见 core.utils.page_cache） ----
+#
+# 数据变化时，在事务提交后递增受影响范围的版本号：
+#   patient / patient_code  患者信息          patient_data  患者的对话、消息和评估
+#   conversation            对话及其消息、评估  assessment    单条评估
+#   caregiver               照护人员仪表板（None 表示未分配照护人员的患者，所有仪表板都会显示）
+# bulk_create 和 QuerySet.update 不发送信号：_save_exchange 批量写入的消息
+# 由同一事务中对话和评估的保存覆盖，归档命令自行调用 invalidate_conversations()。
+# 消息不接收 post_delete：有接收者时 QuerySet.delete 会逐行读取并发送信号，批量删除会变慢；
+# 删除消息的途径（删除对话、归档）都已使对话页面失效。
+
+def _caregiver_of(patient_id):
+    return Patient.objects.filter(pk=patient_id).values_list('caregiver_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Patient)
+def remember_patient_identity(sender, instance, **kwargs):
+    """记录修改前的患者编号和照护人员，两者变化时旧值对应的页面也需失效"""
+    instance._previous_identity = None
+    if instance.pk is not None:
+        instance._previous_identity = Patient.objects.filter(pk=instance.pk).values_list(
+            'patient_id', 'caregiver_id').first()
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_patient_pages(sender, instance, **kwargs):
+    scopes = [('patient', instance.pk), ('patient_code', instance.patient_id),
+              ('patient_data', instance.pk), ('caregiver', instance.caregiver_id)]
+    previous = getattr(instance, '_previous_identity', None)
+    if previous:
+        scopes += [('patient_code', previous[0]), ('caregiver', previous[1])]
+    get_page_cache().bump_on_commit(scopes)
+
+
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+def invalidate_conversation_pages(sender, instance, created=False, **kwargs):
+    scopes = [('conversation', instance.pk), ('patient_data', instance.patient_id)]
+    if created or kwargs['signal'] is post_delete:
+        # 仪表板只显示对话数量，更新对话内容不影响仪表板
+        scopes.append(('caregiver', _caregiver_of(instance.patient_id)))
+    get_page_cache().bump_on_commit(scopes)
+
+
+@receiver(post_save, sender=Message)
+def invalidate_message_pages(sender, instance, **kwargs):
+    patient_id = Conversation.objects.filter(pk=instance.conversation_id).values_list(
+        'patient_id', flat=True).first()
+    get_page_cache().bump_on_commit([('conversation', instance.conversation_id), ('patient_data', patient_id)])
+
+
+@receiver(post_save, sender=DementiaAssessment)
+@receiver(post_delete, sender=DementiaAssessment)
+def invalidate_assessment_pages(sender, instance, **kwargs):
+    get_page_cache().bump_on_commit([
+        ('assessment', instance.pk),
+        ('conversation', instance.conversation_id),
+        ('patient_data', instance.patient_id),
+        ('caregiver', _caregiver_of(instance.patient_id)),
+    ])
+
+
+def invalidate_conversations(conversation_ids):
+    """使一批对话、其患者和照护人员仪表板的页面失效（用于不经过 save()/delete() 的批量修改）"""
+    rows = Conversation.objects.filter(pk__in=conversation_ids).values_list(
+        'pk', 'patient_id', 'patient__caregiver_id')
+    scopes = []
+    for conversation_id, patient_id, caregiver_id in rows:
+        scopes += [('conversation', conversation_id), ('patient_data', patient_id), ('caregiver', caregiver_id)]
+    get_page_cache().bump_on_commit(scopes)
@@ -0,0 +1,34 @@
+"""
+页面片段缓存标签（见 core.utils.page_cache）
+
+用法:
+    {% load page_fragments %}
+    {% fragment "content" %}...{% endfragment %}
+
+上下文中没有 page_fragments 变量时，标签内容照常渲染。
+"""
+from django import template
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, name, nodelist):
+        self.name = name
+        self.nodelist = nodelist
+
+    def render(self, context):
+        recorder = context.get('page_fragments')
+        if recorder is None:
+            return self.nodelist.render(context)
+        return recorder.render(self.name.resolve(context), self.nodelist, context)
+
+
+@register.tag
+def fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires exactly one argument (the fragment name)")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(parser.compile_filter(bits[1]), nodelist)
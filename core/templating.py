@@ -0,0 +1,42 @@
+"""
+模板引擎：在 Django 模板引擎的基础上记录每次渲染的耗时
+"""
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .middleware import view_label
+from .utils import metrics
+
+
+class TimedTemplate(Template):
+    """渲染耗时记入 metrics.TEMPLATE_RENDER，按视图和模板名分组"""
+
+    def render(self, context=None, request=None):
+        if not metrics.is_enabled():
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            view = view_label(request) if request is not None else ''
+            name = self.template.name or '<string>'
+            metrics.TEMPLATE_RENDER.labels(view, name).observe(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    与 django.template.backends.django.DjangoTemplates 相同，返回的模板会记录渲染耗时
+
+    只计时视图直接渲染的模板，{% extends %} 和 {% include %} 的耗时计入外层模板。
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,543 @@
+"""
+核心功能的回归测试
+
+运行:
+    python manage.py test core.tests
+"""
+import base64
+import csv
+import io
+import json
+import random
+import shutil
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import AssessmentCounter, Conversation, DementiaAssessment, Message, Patient, PatientSummary
+from .utils import archive
+from .utils.page_cache import get_page_cache, page_key
+from .utils.pagination import decode_cursor, encode_cursor, keyset_page
+from .utils.prediction_cache import CachedPredictor
+from .utils.predictor import DementiaPredictor, PatientHistoryState
+
+# 页面片段缓存改用进程内缓存，测试不写入 cache/pages/
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-pages'},
+}
+
+TEXTS = [
+    '我最近常常忘记吃药',
+    '今天天气很好，我和女儿去公园散步',
+    '我找不到回家的路，也不知道今天几号',
+    '嗯……那个……我想不起来那个词了',
+    '我最近常常忘记吃药',
+    '',
+    'I FORGOT where I put my keys',
+]
+
+
+def _without_timestamp(prediction):
+    return {key: value for key, value in prediction.items() if key != 'timestamp'}
+
+
+class PredictBatchTests(SimpleTestCase):
+    """predict_batch 与逐条调用 predict_from_text 的结果一致（时间戳除外）"""
+
+    def setUp(self):
+        self.predictor = DementiaPredictor()
+        self.histories = [
+            None,
+            [{'dimension_scores': {'memory': 0.8, 'orientation': 0.4}}],
+            [],
+            [{'dimension_scores': {'memory': 0.2}}, {'dimension_scores': {'language': 0.9, 'memory': 0.6}}],
+            [{'dimension_scores': {}}],
+            None,
+            [{'dimension_scores': {'attention': 0.5}}],
+        ]
+
+    def assertBatchMatches(self, batch_predictor, histories=None):
+        random.seed(7)
+        expected = [
+            _without_timestamp(self.predictor.predict_from_text(text, history))
+            for text, history in zip(TEXTS, histories or [None] * len(TEXTS))
+        ]
+        random.seed(7)
+        actual = [_without_timestamp(prediction) for prediction in batch_predictor.predict_batch(TEXTS, histories)]
+        self.assertEqual(actual, expected)
+
+    def test_matches_predict_from_text(self):
+        self.assertBatchMatches(self.predictor)
+
+    def test_matches_predict_from_text_with_histories(self):
+        self.assertBatchMatches(self.predictor, self.histories)
+
+    def test_cached_predictor_matches_on_miss_and_hit(self):
+        cached = CachedPredictor(DementiaPredictor(), maxsize=100)
+        self.assertBatchMatches(cached, self.histories)
+        # 第二次全部命中缓存，结果仍与逐条预测一致
+        self.assertBatchMatches(cached, self.histories)
+        self.assertGreater(cached.cache_stats()['hits'], 0)
+
+    def test_histories_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.predictor.predict_batch(TEXTS, self.histories[:2])
+
+
+class PatientHistoryStateTests(SimpleTestCase):
+    """按 PatientHistoryState 调整的结果与按完整历史列表调整的结果完全相同（容差为 0）"""
+
+    def setUp(self):
+        self.predictor = DementiaPredictor()
+        self.features = self.predictor._extract_features_from_text(TEXTS[2])
+        rng = random.Random(11)
+        dimensions = list(self.predictor.dimensions)
+        # 部分评估缺少个别维度
+        self.history = [
+            {'dimension_scores': {dimension: round(rng.uniform(0, 1), 2)
+                                  for dimension in dimensions if rng.random() > 0.1}}
+            for _ in range(500)
+        ]
+
+    def state_for(self, history):
+        state = PatientHistoryState()
+        for assessment in history:
+            state.update(assessment['dimension_scores'])
+        # 经 JSON 往返，与保存在 PatientSummary 中的状态相同
+        return PatientHistoryState.from_dict(json.loads(json.dumps(state.to_dict())))
+
+    def test_adjustment_is_identical(self):
+        for length in (1, 2, 10, 500):
+            with self.subTest(length=length):
+                history = self.history[:length]
+                expected = self.predictor._adjust_with_history(dict(self.features), history)
+                actual = self.predictor._adjust_with_history(dict(self.features), self.state_for(history))
+                self.assertEqual(actual, expected)
+
+    def test_prediction_is_identical(self):
+        state = self.state_for(self.history)
+        random.seed(3)
+        expected = _without_timestamp(self.predictor.predict_from_text(TEXTS[0], self.history))
+        random.seed(3)
+        actual = _without_timestamp(self.predictor.predict_from_text(TEXTS[0], state))
+        self.assertEqual(actual, expected)
+
+    def test_empty_state_is_no_history(self):
+        self.assertFalse(PatientHistoryState())
+        self.assertEqual(
+            self.predictor._adjust_with_history(dict(self.features), PatientHistoryState()),
+            self.predictor._adjust_with_history(dict(self.features), []),
+        )
+
+
+def make_assessment(conversation, rng, severity=None):
+    """为对话保存一条评估（经过 save()，与在线评估相同）"""
+    dimensions = ['memory', 'orientation', 'language', 'attention', 'problem_solving']
+    severity = severity or rng.choice(['normal', 'mild', 'moderate', 'severe'])
+    results = {
+        'severity_category': severity,
+        'dimension_scores': {dimension: round(rng.uniform(0, 1), 2) for dimension in dimensions if rng.random() > 0.2},
+    }
+    assessment = DementiaAssessment(patient_id=conversation.patient_id, conversation=conversation, severity=severity,
+                                    confidence_score=0.7, detailed_results=results)
+    assessment.save()
+    return assessment
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AssessmentStatisticsTests(TestCase):
+    """修改和删除评估后，患者摘要和评估计数与按评估记录重新计算的结果一致"""
+
+    def setUp(self):
+        rng = random.Random(5)
+        self.patients = [Patient.objects.create(patient_id=f'T{i}', name=f'患者{i}', age=70, gender='F')
+                         for i in range(3)]
+        self.conversations = [Conversation.objects.create(patient=patient)
+                              for patient in self.patients for _ in range(2)]
+        for conversation in self.conversations:
+            for _ in range(4):
+                make_assessment(conversation, rng)
+        self.assertInSync()
+
+    def assertInSync(self):
+        expected = Counter()
+        for patient_id, date in DementiaAssessment.objects.values_list('patient_id', 'assessment_date'):
+            for period, start in AssessmentCounter.period_starts(date).items():
+                expected[(patient_id, period, start)] += 1
+        counters = Counter({(counter.patient_id, counter.period, counter.period_start): counter.count
+                            for counter in AssessmentCounter.objects.exclude(count=0)})
+        self.assertEqual(counters, expected)
+
+        fields = ('assessment_count', 'latest_assessment_date', 'latest_severity', 'history_state')
+        for patient_id in Patient.objects.values_list('pk', flat=True):
+            stored = PatientSummary.objects.values_list(*fields).get(patient_id=patient_id)
+            rebuilt = PatientSummary.rebuild(patient_id)
+            self.assertEqual(stored, tuple(getattr(rebuilt, field) for field in fields))
+
+    def test_update_date_and_severity(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for days, assessment in enumerate(DementiaAssessment.objects.order_by('id')[:3], start=1):
+                assessment.assessment_date = timezone.now() - timedelta(days=days * 9)
+                assessment.severity = 'severe'
+                assessment.save()
+        self.assertInSync()
+
+    def test_move_to_other_patient(self):
+        assessment = DementiaAssessment.objects.filter(patient=self.patients[0]).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            assessment.patient = self.patients[1]
+            assessment.conversation = self.conversations[2]
+            assessment.save()
+        self.assertInSync()
+
+    def test_instance_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DementiaAssessment.objects.filter(patient=self.patients[0]).latest('assessment_date').delete()
+        self.assertInSync()
+
+    def test_queryset_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DementiaAssessment.objects.filter(patient__in=self.patients[:2], severity__in=['mild', 'severe']).delete()
+        self.assertInSync()
+
+    def test_admin_bulk_delete(self):
+        request = RequestFactory().post('/admin/core/dementiaassessment/')
+        request.user = User.objects.create_superuser('admin', password='admin')
+        model_admin = admin.site._registry[DementiaAssessment]
+        with self.captureOnCommitCallbacks(execute=True):
+            model_admin.delete_queryset(request, DementiaAssessment.objects.filter(patient=self.patients[1]))
+        self.assertInSync()
+        self.assertEqual(PatientSummary.objects.get(patient=self.patients[1]).assessment_count, 0)
+
+    def test_conversation_cascade(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversations[0].delete()
+        self.assertInSync()
+
+    def test_patient_delete(self):
+        patient_id = self.patients[2].pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patients[2].delete()
+            Patient.objects.filter(pk=self.patients[1].pk).delete()
+        self.assertInSync()
+        self.assertFalse(AssessmentCounter.objects.filter(patient_id__in=[patient_id, self.patients[1].pk]).exists())
+
+    def test_rolled_back_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    DementiaAssessment.objects.filter(patient=self.patients[0]).delete()
+                    raise RuntimeError
+        self.assertInSync()
+        self.assertEqual(PatientSummary.objects.get(patient=self.patients[0]).assessment_count, 8)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PageCacheInvalidationTests(TestCase):
+    """写入数据后，依赖这些数据的缓存页面失效，其他患者的页面仍命中缓存"""
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.user = User.objects.create_user('carer', password='carer')
+        self.client.force_login(self.user)
+        self.patient = Patient.objects.create(patient_id='PA', name='王小明', age=80, gender='M', caregiver=self.user)
+        self.other = Patient.objects.create(patient_id='PB', name='李小华', age=75, gender='F', caregiver=self.user)
+        self.conversation = Conversation.objects.create(patient=self.patient)
+        self.other_conversation = Conversation.objects.create(patient=self.other)
+        rng = random.Random(9)
+        for conversation in (self.conversation, self.other_conversation):
+            make_assessment(conversation, rng, severity='mild')
+
+    def render_all(self):
+        for url in ('/caregiver/', '/caregiver/patient/PA/', '/caregiver/patient/PB/',
+                    f'/caregiver/conversation/{self.conversation.pk}/',
+                    f'/caregiver/conversation/{self.other_conversation.pk}/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def cached(self, view_name, *parts):
+        return get_page_cache().get(page_key(view_name, *parts)) is not None
+
+    def assertOtherPatientCached(self):
+        self.assertTrue(self.cached('patient_detail', 'PB'))
+        self.assertTrue(self.cached('conversation_detail', self.other_conversation.pk))
+
+    def test_pages_are_cached(self):
+        self.render_all()
+        self.assertTrue(self.cached('patient_detail', 'PA'))
+        self.assertTrue(self.cached('conversation_detail', self.conversation.pk))
+        self.assertOtherPatientCached()
+
+    def test_patient_rename(self):
+        self.render_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.name = '王大明'
+            self.patient.save()
+        self.assertFalse(self.cached('patient_detail', 'PA'))
+        self.assertFalse(self.cached('conversation_detail', self.conversation.pk))
+        self.assertOtherPatientCached()
+        self.assertContains(self.client.get('/caregiver/'), '王大明')
+        self.assertContains(self.client.get('/caregiver/patient/PA/'), '王大明')
+
+    def test_patient_code_change(self):
+        self.render_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.patient_id = 'PA2'
+            self.patient.save()
+        # 旧编号的页面也需失效，否则旧链接仍显示已改名的患者
+        self.assertFalse(self.cached('patient_detail', 'PA'))
+        self.assertEqual(self.client.get('/caregiver/patient/PA/').status_code, 404)
+        self.assertOtherPatientCached()
+
+    def test_new_assessment(self):
+        self.render_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_assessment(self.conversation, random.Random(1), severity='severe')
+        self.assertFalse(self.cached('patient_detail', 'PA'))
+        self.assertFalse(self.cached('conversation_detail', self.conversation.pk))
+        self.assertOtherPatientCached()
+        self.assertEqual(self.client.get('/caregiver/').context['attention_needed'], 1)
+
+    def test_assessment_delete(self):
+        self.render_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            DementiaAssessment.objects.filter(patient=self.patient).delete()
+        self.assertFalse(self.cached('patient_detail', 'PA'))
+        self.assertFalse(self.cached('conversation_detail', self.conversation.pk))
+        self.assertOtherPatientCached()
+
+    def test_new_message(self):
+        self.render_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(conversation=self.conversation, sender_type='patient', content='我今天去买菜了')
+        self.assertFalse(self.cached('conversation_detail', self.conversation.pk))
+        self.assertContains(self.client.get(f'/caregiver/conversation/{self.conversation.pk}/'), '我今天去买菜了')
+        self.assertOtherPatientCached()
+
+    def test_conversation_delete(self):
+        self.render_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversation.delete()
+        self.assertFalse(self.cached('patient_detail', 'PA'))
+        self.assertOtherPatientCached()
+
+    def test_rolled_back_write_keeps_cache(self):
+        self.render_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.patient.name = '王大明'
+                    self.patient.save()
+                    raise RuntimeError
+        self.assertTrue(self.cached('patient_detail', 'PA'))
+
+
+class KeysetPaginationTests(TestCase):
+    """键集分页在各种页大小、同一时刻的多行和多个来源下都不重复、不遗漏"""
+
+    def setUp(self):
+        patient = Patient.objects.create(patient_id='PK', name='赵老师', age=82, gender='M')
+        self.conversation = Conversation.objects.create(patient=patient)
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender_type='patient', content=f'消息 {i}') for i in range(23)
+        ])
+        # 每 5 条消息共用一个时间戳，页边界会落在同一时刻的多行中间
+        base = timezone.now() - timedelta(hours=1)
+        for index, pk in enumerate(self.rows().order_by('pk').values_list('pk', flat=True)):
+            Message.objects.filter(pk=pk).update(timestamp=base + timedelta(minutes=index // 5))
+
+    def rows(self):
+        return Message.objects.filter(conversation=self.conversation)
+
+    def expected(self, descending):
+        return list(self.rows().order_by(*(('-timestamp', '-pk') if descending else ('timestamp', 'pk')))
+                    .values_list('pk', flat=True))
+
+    def read_all(self, source, limit, descending):
+        pks = []
+        cursor = None
+        while True:
+            items, cursor = keyset_page(source, 'timestamp', cursor, limit=limit, descending=descending)
+            self.assertTrue(items, 'keyset_page returned an empty page with a cursor')
+            pks += [item.pk for item in items]
+            if cursor is None:
+                return pks
+
+    def test_querysets_lists_and_merged_sources(self):
+        odd = self.rows().filter(pk__in=self.rows().values_list('pk', flat=True)[::2])
+        even = list(self.rows().exclude(pk__in=odd.values_list('pk', flat=True)))
+        sources = {'queryset': self.rows(), 'list': list(self.rows()), 'merged': (odd, even)}
+        for limit in (1, 2, 3, 5, 7, 22, 23, 24, 100):
+            for descending in (False, True):
+                for name, source in sources.items():
+                    with self.subTest(source=name, limit=limit, descending=descending):
+                        self.assertEqual(self.read_all(source, limit, descending), self.expected(descending))
+
+    def test_empty(self):
+        self.assertEqual(keyset_page(Message.objects.none(), 'timestamp'), ([], None))
+        self.assertEqual(keyset_page([], 'timestamp'), ([], None))
+        self.assertEqual(keyset_page((Message.objects.none(), []), 'timestamp'), ([], None))
+
+    def test_rows_inserted_while_paging(self):
+        first, cursor = keyset_page(self.rows(), 'timestamp', limit=10)
+        earliest = self.rows().order_by('timestamp').first().timestamp
+        # 游标之前插入的行不会出现，之后插入的行只出现一次
+        before = Message.objects.create(conversation=self.conversation, sender_type='patient', content='更早')
+        after = Message.objects.create(conversation=self.conversation, sender_type='patient', content='更晚')
+        Message.objects.filter(pk=before.pk).update(timestamp=earliest)
+        pks = [item.pk for item in first]
+        while cursor:
+            items, cursor = keyset_page(self.rows(), 'timestamp', cursor, limit=10)
+            pks += [item.pk for item in items]
+        self.assertEqual(len(pks), len(set(pks)))
+        self.assertNotIn(before.pk, pks)
+        self.assertIn(after.pk, pks)
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now().replace(microsecond=123456)
+        self.assertEqual(decode_cursor(encode_cursor(moment, 42)), (moment, 42))
+
+    def test_invalid_cursors(self):
+        def encoded(value):
+            return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+        for cursor in ('not a cursor', '!!!', encoded([1]), encoded(['yesterday', 1]), encoded(['2024-01-01', 'x']),
+                       encoded({'a': 1})):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor)
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_api_rejects_invalid_parameters(self):
+        self.client.force_login(User.objects.create_user('carer', password='carer'))
+        url = f'/caregiver/conversation/{self.conversation.pk}/messages/'
+        for params in ({'cursor': 'not a cursor'}, {'limit': 'ten'}, {'order': 'sideways'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+        response = self.client.get(url, {'limit': 10, 'order': 'asc'}).json()
+        self.assertEqual(len(response['results']), 10)
+        self.assertIsNotNone(response['next_cursor'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryPlanTests(TestCase):
+    """
+    各页面和接口的查询不对大表做全表扫描（SQLite EXPLAIN QUERY PLAN）
+
+    与 benchmarks/bench_query_plans.py 检查相同的页面，只是数据量较小、不计时。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from benchmarks.dbseed import seed
+        cls.user, pairs = seed(patients=40, conversations=3, messages=2000, assessments=1000)
+        patient_pk, cls.conversation_pk = pairs[len(pairs) // 2]
+        cls.patient_code = Patient.objects.get(pk=patient_pk).patient_id
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.client.force_login(self.user)
+
+    def test_views_use_indexes(self):
+        from benchmarks.bench_query_plans import VIEW_CASES, explain, fetch, full_scans
+
+        for name, url, _ in VIEW_CASES:
+            url = url.format(patient=self.patient_code, conversation=self.conversation_pk)
+            with self.subTest(view=name):
+                with CaptureQueriesContext(connection) as captured:
+                    fetch(self.client, url)
+                selects = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('SELECT')]
+                self.assertTrue(selects)
+                for sql in selects:
+                    self.assertEqual(full_scans(explain(sql)), [], sql)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExportTests(TestCase):
+    """流式 CSV 导出的内容、范围和顺序正确，并包含已归档对话中的评估"""
+
+    DIMENSIONS = ['memory', 'orientation', 'language', 'attention', 'problem_solving']
+
+    def setUp(self):
+        self.user = User.objects.create_user('carer', password='carer')
+        other_user = User.objects.create_user('other', password='other')
+        self.client.force_login(self.user)
+        # 姓名中的逗号和引号需由 csv.writer 转义
+        self.patients = [
+            Patient.objects.create(patient_id='PB', name='王,"小明"', age=80, gender='M', caregiver=self.user),
+            Patient.objects.create(patient_id='PA', name='李小华', age=75, gender='F'),
+            Patient.objects.create(patient_id='PC', name='张三', age=70, gender='M', caregiver=other_user),
+        ]
+        self.day0 = timezone.make_aware(datetime(2024, 3, 1, 12, 0))
+        rng = random.Random(4)
+        for patient in self.patients:
+            for c in range(2):
+                conversation = Conversation.objects.create(patient=patient)
+                for i in range(5):
+                    assessment = make_assessment(conversation, rng)
+                    DementiaAssessment.objects.filter(pk=assessment.pk).update(
+                        assessment_date=self.day0 + timedelta(days=c * 5 + i, minutes=rng.randrange(60)))
+
+    def export(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+
+    def expected_rows(self, patients, include_patient=False, start=None, end=None):
+        rows = []
+        assessments = DementiaAssessment.objects.filter(patient__in=patients).select_related('patient')
+        for a in sorted(assessments, key=lambda a: (a.patient.patient_id, a.assessment_date, a.id)):
+            if (start and a.assessment_date < start) or (end and a.assessment_date >= end):
+                continue
+            scores = a.detailed_results['dimension_scores']
+            row = [timezone.localtime(a.assessment_date).strftime('%Y-%m-%d %H:%M'), a.severity, str(a.confidence_score)]
+            row += [str(scores[dimension]) if dimension in scores else 'N/A' for dimension in self.DIMENSIONS]
+            rows.append([a.patient.patient_id, a.patient.name] + row if include_patient else row)
+        return rows
+
+    def test_patient_export(self):
+        rows = self.export('/caregiver/patient/PB/export/')
+        self.assertEqual(rows[0], ['日期', '严重程度', '置信度', '记忆', '方向感', '语言', '注意力', '问题解决'])
+        self.assertEqual(rows[1:], self.expected_rows(self.patients[:1]))
+        self.assertIn('N/A', sum(rows, []))
+
+    def test_bulk_export_scope_and_range(self):
+        rows = self.export('/caregiver/export/')
+        self.assertEqual(rows[0][:2], ['患者ID', '姓名'])
+        # 只包含本照护人员和未分配照护人员的患者，按患者ID、日期排序
+        self.assertEqual(rows[1:], self.expected_rows(self.patients[:2], include_patient=True))
+
+        rows = self.export('/caregiver/export/', {'start': '2024-03-03', 'end': '2024-03-07'})
+        start = timezone.make_aware(datetime(2024, 3, 3))
+        end = timezone.make_aware(datetime(2024, 3, 8))
+        expected = self.expected_rows(self.patients[:2], include_patient=True, start=start, end=end)
+        self.assertTrue(expected)
+        self.assertEqual(rows[1:], expected)
+
+    def test_invalid_range(self):
+        self.assertEqual(self.client.get('/caregiver/export/', {'start': 'March'}).status_code, 400)
+
+    def test_archived_assessments_are_exported(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        before = (self.export('/caregiver/patient/PB/export/'), self.export('/caregiver/export/'),
+                  self.export('/caregiver/export/', {'start': '2024-03-03', 'end': '2024-03-07'}))
+        with mock.patch.object(archive, '_archive', archive.ConversationArchive(root)):
+            Conversation.objects.filter(patient__in=self.patients[:2], pk__in=Conversation.objects.order_by('pk')
+                                        .values_list('pk', flat=True)[::2]).update(end_time=self.day0)
+            call_command('archive_conversations', days=1, stdout=io.StringIO())
+            self.assertTrue(Conversation.objects.exclude(archived_month='').exists())
+            after = (self.export('/caregiver/patient/PB/export/'), self.export('/caregiver/export/'),
+                     self.export('/caregiver/export/', {'start': '2024-03-03', 'end': '2024-03-07'}))
+        self.assertEqual(after, before)
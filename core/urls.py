@@ -9,10 +9,17 @@ urlpatterns = [
     path('patient/', views.patient_interface, name='patient_interface'),
     path('patient/<str:patient_id>/', views.patient_interface, name='patient_interface_with_id'),
     path('api/process-message/', views.process_message, name='process_message'),
+    path('api/process-message/stream/', views.process_message_stream, name='process_message_stream'),
     path('api/voice-to-text/', views.voice_to_text, name='voice_to_text'),
+    path('api/predictor-status/', views.predictor_status, name='predictor_status'),
+    
+    # 运行指标（Prometheus 文本格式）
+    path('metrics', views.metrics, name='metrics'),
     
     # 照护人员界面
     path('caregiver/', views.caregiver_dashboard, name='caregiver_dashboard'),
+    path('caregiver/export/', views.export_bulk_assessment_data, name='export_bulk_assessment_data'),
+    path('caregiver/cohort/decline/', views.cohort_decline_ranking, name='cohort_decline_ranking'),
     
     # 患者管理 - 先放具体路径
     path('caregiver/patient/add/', views.add_patient, name='add_patient'),
@@ -21,8 +28,13 @@ urlpatterns = [
     path('caregiver/patient/<str:patient_id>/', views.patient_detail, name='patient_detail'),
     path('caregiver/patient/<str:patient_id>/edit/', views.edit_patient, name='edit_patient'),
     path('caregiver/patient/<str:patient_id>/progress/', views.patient_progress, name='patient_progress'),
+    path('caregiver/patient/<str:patient_id>/progress/data/', views.patient_progress_data, name='patient_progress_data'),
     path('caregiver/patient/<str:patient_id>/export/', views.export_assessment_data, name='export_assessment_data'),
+    path('caregiver/patient/<str:patient_id>/assessments/', views.patient_assessments, name='patient_assessments'),
+    path('caregiver/patient/<str:patient_id>/conversations/', views.patient_conversations, name='patient_conversations'),
     
     path('caregiver/conversation/<int:conversation_id>/', views.conversation_detail, name='conversation_detail'),
+    path('caregiver/conversation/<int:conversation_id>/messages/', views.conversation_messages, name='conversation_messages'),
+    path('caregiver/conversation/<int:conversation_id>/assessments/', views.conversation_assessments, name='conversation_assessments'),
     path('caregiver/assessment/<int:assessment_id>/', views.assessment_report, name='assessment_report'),
 ]
@@ -0,0 +1,187 @@
+"""
+对话归档模块：把已结束的旧对话的消息和评估按月写入压缩分片，并提供只读访问
+"""
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class ConversationArchive:
+    """
+    按月分片的对话归档
+
+    每个月一个 gzip 压缩的 JSON Lines 文件（如 2024-01.jsonl.gz），每行是一个对话的记录：
+    {"conversation": 对话主键, "patient": 患者主键, "messages": [...], "assessments": [...]}。
+    消息和评估以 Django python 序列化格式保存，读取时还原为未保存的模型实例。
+
+    追加写入使用 gzip 多成员格式，已有分片无需重写；同一对话重复写入时以最后一行为准，
+    因此归档过程中断后重新执行是安全的。解压后的分片保存在 LRU 缓存中。
+
+    每个对话的记录单独压缩为一个 gzip 成员，并在同名的 .index 文件中记录其偏移和长度；
+    患者的对话及其所在月份保存在数据库中，因此读取一位患者的归档数据时只需解压该患者的记录，
+    耗时与归档总量无关。没有索引的分片（或索引中缺少的对话）读取整个分片。
+    """
+
+    def __init__(self, root, cache_size=4, index_cache_size=256):
+        """
+        Args:
+            root: 分片文件所在目录
+            cache_size: 最多缓存的已解压分片数
+            index_cache_size: 最多缓存的分片索引数（每个对话一项，远小于分片本身）
+        """
+        self.root = root
+        self.cache_size = cache_size
+        self.index_cache_size = index_cache_size
+        self._cache = OrderedDict()
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_path(self, month):
+        """分片文件路径，month 形如 '2024-01'"""
+        return os.path.join(self.root, f'{month}.jsonl.gz')
+
+    def index_path(self, month):
+        """分片索引文件路径，每行为一个对话的 [对话主键, 偏移, 长度]"""
+        return os.path.join(self.root, f'{month}.index')
+
+    def months(self):
+        """返回已有分片的月份列表（升序）"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[:-len('.jsonl.gz')] for name in os.listdir(self.root) if name.endswith('.jsonl.gz'))
+
+    def append(self, month, records):
+        """
+        把对话记录追加到某个月的分片，并在返回前写入磁盘
+
+        Args:
+            month: 月份
+            records: 对话记录列表
+        """
+        os.makedirs(self.root, exist_ok=True)
+        entries = []
+        with open(self.shard_path(month), 'ab') as raw:
+            raw.seek(0, os.SEEK_END)
+            for record in records:
+                member = gzip.compress(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                entries.append([record['conversation'], raw.tell(), len(member)])
+                raw.write(member)
+            raw.flush()
+            os.fsync(raw.fileno())
+        # 分片落盘后再写索引：中途失败时索引缺少的对话会退回读取整个分片
+        with open(self.index_path(month), 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._cache.pop(month, None)
+            self._indexes.pop(month, None)
+
+    def read_shard(self, month):
+        """读取某个月的分片，返回 {对话主键: 记录}；分片不存在时返回空字典"""
+        path = self.shard_path(month)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return {}
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._cache.get(month)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(month)
+                return cached[1]
+
+        records = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record['conversation']] = record
+
+        with self._lock:
+            self._cache[month] = (signature, records)
+            self._cache.move_to_end(month)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return records
+
+    def read_index(self, month):
+        """读取分片索引，返回 {对话主键: (偏移, 长度)}；没有索引文件时返回 None"""
+        path = self.index_path(month)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._indexes.get(month)
+            if cached is not None and cached[0] == signature:
+                self._indexes.move_to_end(month)
+                return cached[1]
+
+        index = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    conversation_id, offset, length = json.loads(line)
+                except (TypeError, ValueError):
+                    # 写入中断留下的不完整行
+                    continue
+                index[conversation_id] = (offset, length)
+
+        with self._lock:
+            self._indexes[month] = (signature, index)
+            self._indexes.move_to_end(month)
+            while len(self._indexes) > self.index_cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def get(self, month, conversation_id):
+        """
+        读取一个对话的归档记录，不存在时返回 None
+
+        索引中有该对话时只读取并解压它的 gzip 成员，否则读取整个分片。
+        """
+        entry = (self.read_index(month) or {}).get(conversation_id)
+        if entry is None:
+            return self.read_shard(month).get(conversation_id)
+        offset, length = entry
+        with open(self.shard_path(month), 'rb') as f:
+            f.seek(offset)
+            return json.loads(gzip.decompress(f.read(length)))
+
+
+def deserialize(serialized):
+    """把 Django python 序列化格式的对象列表还原为（未保存的）模型实例"""
+    from django.core import serializers
+    return [item.object for item in serializers.deserialize('python', serialized)]
+
+
+def serialize(queryset):
+    """把查询集序列化为可写入 JSON 的对象列表"""
+    from django.core import serializers
+    from django.core.serializers.json import DjangoJSONEncoder
+    return json.loads(json.dumps(serializers.serialize('python', queryset), cls=DjangoJSONEncoder))
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """获取进程级共享的归档实例（参数来自 settings.ARCHIVE_ROOT 和 ARCHIVE_CACHE_SHARDS）"""
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                from django.conf import settings
+                _archive = ConversationArchive(
+                    settings.ARCHIVE_ROOT,
+                    cache_size=getattr(settings, 'ARCHIVE_CACHE_SHARDS', 4),
+                )
+    return _archive
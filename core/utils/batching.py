@@ -0,0 +1,257 @@
+"""
+动态微批处理调度模块：将并发的预测请求合并为小批量后交给推理后端
+"""
+import hashlib
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from .predictor import ConversationManager
+
+PREDICT = 'predict'
+RESPOND = 'respond'
+
+
+class PredictorBackend:
+    """
+    基于 DementiaPredictor 的推理后端
+
+    后端需实现 predict_batch(texts, histories) 与 generate_response_batch(texts, histories) 两个方法，
+    分别返回预测结果列表和 (response, assessment) 列表；histories 为与 texts 等长的患者历史评估列表或 None。
+    未指定 predictor 时每批都从注册表取当前版本，以便跟随版本切换。
+    """
+
+    def __init__(self, predictor=None):
+        self._predictor = predictor
+
+    @property
+    def predictor(self):
+        if self._predictor is not None:
+            return self._predictor
+        from .registry import get_predictor
+        return get_predictor()
+
+    def predict_batch(self, texts, histories=None):
+        return self.predictor.predict_batch(texts, histories)
+
+    def generate_response_batch(self, texts, histories=None):
+        return ConversationManager(predictor=self.predictor).generate_responses(texts, histories)
+
+
+class SimulatedBackend:
+    """
+    确定性的 CPU 替身后端，用于在没有模型的情况下做负载测试
+
+    每批耗时 = 固定开销 + 每条耗时 × 批大小（以忙等待占用 CPU 模拟推理），
+    输出只取决于输入文本的哈希值，因此结果可复现。
+    """
+
+    def __init__(self, batch_overhead_ms=20.0, per_item_ms=1.0):
+        self.batch_overhead_ms = batch_overhead_ms
+        self.per_item_ms = per_item_ms
+
+    def _burn(self, batch_size):
+        deadline = time.perf_counter() + (self.batch_overhead_ms + self.per_item_ms * batch_size) / 1000
+        while time.perf_counter() < deadline:
+            pass
+
+    def _assessment(self, text):
+        digest = hashlib.sha1(text.encode('utf-8')).digest()
+        score = round(digest[0] / 255, 2)
+        if score < 0.2:
+            category = 'normal'
+        elif score < 0.5:
+            category = 'mild'
+        elif score < 0.75:
+            category = 'moderate'
+        else:
+            category = 'severe'
+        return {
+            'severity_score': score,
+            'severity_category': category,
+            'confidence': round(0.5 + digest[1] / 255 * 0.4, 2),
+            'dimension_scores': {},
+        }
+
+    def predict_batch(self, texts, histories=None):
+        self._burn(len(texts))
+        return [self._assessment(text) for text in texts]
+
+    def generate_response_batch(self, texts, histories=None):
+        self._burn(len(texts))
+        return [(f'simulated reply ({len(text)})', self._assessment(text)) for text in texts]
+
+
+class _Request:
+    __slots__ = ('kind', 'text', 'history', 'future', 'enqueued_at')
+
+    def __init__(self, kind, text, history=None):
+        self.kind = kind
+        self.text = text
+        self.history = history
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatchScheduler:
+    """
+    动态微批处理调度器
+
+    请求进入队列后由后台线程收集：从第一个请求到达起最多等待 max_wait_ms，
+    或凑满 max_batch_size 条即发出一批。同一批中的请求按类型
+    （predict_from_text / generate_response）分组后交给后端，
+    每个请求通过各自的 Future 取得结果。
+    """
+
+    def __init__(self, backend, max_batch_size=32, max_wait_ms=5.0, latency_window=10000):
+        """
+        Args:
+            backend: 推理后端（见 PredictorBackend）
+            max_batch_size: 每批最多请求数
+            max_wait_ms: 收集一批时的最长等待时间（毫秒）
+            latency_window: 用于计算延迟百分位的最近请求数量
+        """
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=latency_window)
+        self._batch_sizes = {}
+        self._stats_lock = threading.Lock()
+        self._completed = 0
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='micro-batch-scheduler', daemon=True)
+        self._worker.start()
+
+    def submit(self, kind, text, history=None):
+        """提交一个请求，返回 Future；history 为患者的历史评估（可选）"""
+        if self._stopped.is_set():
+            raise RuntimeError('scheduler has been shut down')
+        request = _Request(kind, text, history)
+        self._queue.put(request)
+        return request.future
+
+    def predict_from_text(self, text, timeout=None, patient_history=None):
+        """同步等待一条预测结果"""
+        return self.submit(PREDICT, text, patient_history).result(timeout)
+
+    def generate_response(self, patient_input, timeout=None, patient_history=None):
+        """同步等待一条系统回应，返回 (response, assessment)"""
+        return self.submit(RESPOND, patient_input, patient_history).result(timeout)
+
+    def _collect(self):
+        """阻塞直到取得一批请求"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # 收到停止信号：处理完当前批次后退出
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.kind, []).append(request)
+            for kind, requests in groups.items():
+                self._dispatch(kind, requests)
+
+    def _dispatch(self, kind, requests):
+        # 跳过调用方已取消的请求
+        requests = [request for request in requests if request.future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        texts = [request.text for request in requests]
+        histories = [request.history for request in requests]
+        if not any(histories):
+            histories = None
+        try:
+            if kind == PREDICT:
+                results = self.backend.predict_batch(texts, histories)
+            else:
+                results = self.backend.generate_response_batch(texts, histories)
+            results = list(results)
+            if len(results) != len(requests):
+                # 结果与请求无法一一对应，任一请求都不能拿到结果，否则其余请求会永远等待
+                raise ValueError(f'Backend returned {len(results)} results for {len(requests)} requests')
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        finished_at = time.perf_counter()
+        for request, result in zip(requests, results):
+            request.future.set_result(result)
+        with self._stats_lock:
+            self._batch_sizes[len(requests)] = self._batch_sizes.get(len(requests), 0) + 1
+            self._completed += len(requests)
+            self._latencies.extend(finished_at - request.enqueued_at for request in requests)
+
+    def stats(self):
+        """
+        返回调度器运行指标
+
+        Returns:
+            stats: 包含队列深度、批大小直方图和延迟百分位（毫秒）的字典
+        """
+        with self._stats_lock:
+            latencies = np.array(self._latencies, dtype=np.float64) * 1000
+            histogram = dict(sorted(self._batch_sizes.items()))
+            completed = self._completed
+        percentiles = {}
+        if len(latencies):
+            for p in (50, 90, 95, 99):
+                percentiles[f'p{p}'] = round(float(np.percentile(latencies, p)), 3)
+        return {
+            'queue_depth': self._queue.qsize(),
+            'completed': completed,
+            'batch_size_histogram': histogram,
+            'latency_ms': percentiles,
+        }
+
+    def shutdown(self, wait=True):
+        """停止调度器；已入队的请求会先处理完"""
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._queue.put(None)
+        if wait:
+            self._worker.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """获取进程级调度器，后端为注册表中的共享预测器"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                from django.conf import settings
+                _scheduler = MicroBatchScheduler(
+                    PredictorBackend(),
+                    max_batch_size=getattr(settings, 'PREDICTOR_BATCH_MAX_SIZE', 32),
+                    max_wait_ms=getattr(settings, 'PREDICTOR_BATCH_MAX_WAIT_MS', 5.0),
+                )
+    return _scheduler
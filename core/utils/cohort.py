@@ -0,0 +1,374 @@
+"""
+群体分析模块：把所有患者的评估时间序列载入数组，向量化计算每位患者的病情变化趋势并排序
+"""
+import threading
+import time
+from datetime import timezone
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+
+
+class CohortDeclineIndex:
+    """
+    全体患者的严重程度趋势索引
+
+    每位患者只保存最小二乘所需的累计量（n, Σx, Σy, Σxy, Σx²，x 为天数、y 为 severity_score）
+    和最近 recent_count 次评估的分数，因此：
+    - load() 用 np.bincount 一次性按患者汇总全部评估，无需逐个患者处理
+    - add() 每收到一条新评估只更新该患者的几个数值，耗时为 O(1)
+    - ranking() 对所有患者同时计算斜率、近期变化和百分位，再按斜率排序
+
+    斜率单位为每天，正值表示严重程度分数上升（病情加重）。
+    评估集中在很短时间内（如几分钟）的患者，时间差作分母会把斜率放大到每天数十甚至上千，
+    因此只有评估跨度不少于 min_span_days 天的患者参与排序。
+    近期变化为最近 recent_count 次评估中最后一次与第一次的分数差。
+    同一患者的评估应按时间顺序 add()；乱序到达时斜率仍然准确，近期变化按到达顺序计算。
+    """
+
+    def __init__(self, recent_count=5, min_assessments=3, min_span_days=7.0):
+        """
+        Args:
+            recent_count: 计算近期变化使用的最近评估次数
+            min_assessments: 参与排序的最少评估次数
+            min_span_days: 参与排序的最短评估跨度（最早与最近一次评估相隔的天数）
+        """
+        self.recent_count = recent_count
+        self.min_assessments = min_assessments
+        self.min_span_days = min_span_days
+        self.load(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+
+    def _allocate(self, capacity):
+        self.patient_ids = np.zeros(capacity, dtype=np.int64)
+        self.n = np.zeros(capacity)
+        self.sum_x = np.zeros(capacity)
+        self.sum_y = np.zeros(capacity)
+        self.sum_xy = np.zeros(capacity)
+        self.sum_xx = np.zeros(capacity)
+        self.earliest_day = np.full(capacity, np.nan)
+        self.latest_day = np.full(capacity, np.nan)
+        self.latest_score = np.full(capacity, np.nan)
+        # 每行按时间从旧到新保存最近的分数，不足时左侧为 NaN
+        self.recent = np.full((capacity, self.recent_count), np.nan)
+
+    def _grow(self):
+        """容量翻倍（新增患者时使用）"""
+        old = {name: getattr(self, name) for name in (
+            'patient_ids', 'n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'earliest_day', 'latest_day', 'latest_score',
+            'recent',
+        )}
+        self._allocate(max(16, 2 * len(old['n'])))
+        for name, values in old.items():
+            getattr(self, name)[:len(values)] = values
+
+    def load(self, assessment_ids, patient_ids, days, scores):
+        """
+        用全部评估重建索引
+
+        Args:
+            assessment_ids: 评估主键数组（用于记录已载入的最大主键）
+            patient_ids: 患者主键数组
+            days: 评估时间（自 1970-01-01 起的天数）
+            scores: severity_score 数组，NaN 的行会被忽略
+        """
+        assessment_ids = np.asarray(assessment_ids, dtype=np.int64)
+        patient_ids = np.asarray(patient_ids, dtype=np.int64)
+        days = np.asarray(days, dtype=np.float64)
+        scores = np.asarray(scores, dtype=np.float64)
+        self.max_assessment_id = int(assessment_ids.max()) if len(assessment_ids) else 0
+
+        valid = ~np.isnan(scores)
+        patient_ids, days, scores = patient_ids[valid], days[valid], scores[valid]
+        # 以载入时最早的评估为原点，减小累计量的数值范围
+        self.origin = float(days.min()) if len(days) else 0.0
+        x = days - self.origin
+
+        unique_ids, index = np.unique(patient_ids, return_inverse=True)
+        count = len(unique_ids)
+        self._allocate(max(16, count))
+        self.size = count
+        self.patient_ids[:count] = unique_ids
+        self.positions = dict(zip(unique_ids.tolist(), range(count)))
+
+        self.n[:count] = np.bincount(index, minlength=count)
+        self.sum_x[:count] = np.bincount(index, weights=x, minlength=count)
+        self.sum_y[:count] = np.bincount(index, weights=scores, minlength=count)
+        self.sum_xy[:count] = np.bincount(index, weights=x * scores, minlength=count)
+        self.sum_xx[:count] = np.bincount(index, weights=x * x, minlength=count)
+
+        if len(index) == 0:
+            return
+        # 按 (患者, 时间) 排序后，每位患者的最后 recent_count 行即为最近的评估
+        order = np.lexsort((x, index))
+        index, x, scores = index[order], x[order], scores[order]
+        group_end = np.searchsorted(index, np.arange(count), side='right')
+        from_end = group_end[index] - np.arange(len(index))  # 最后一行为 1
+        keep = from_end <= self.recent_count
+        self.recent[index[keep], self.recent_count - from_end[keep]] = scores[keep]
+        last_rows = group_end - 1
+        self.earliest_day[:count] = x[np.searchsorted(index, np.arange(count), side='left')] + self.origin
+        self.latest_day[:count] = x[last_rows] + self.origin
+        self.latest_score[:count] = scores[last_rows]
+
+    def add(self, assessment_id, patient_id, day, score):
+        """累加一条新评估；score 为 None 或 NaN 时只记录主键"""
+        self.max_assessment_id = max(self.max_assessment_id, assessment_id)
+        if score is None or score != score:
+            return
+        position = self.positions.get(patient_id)
+        if position is None:
+            if self.size == len(self.n):
+                self._grow()
+            position = self.size
+            self.size += 1
+            self.positions[patient_id] = position
+            self.patient_ids[position] = patient_id
+
+        x = day - self.origin
+        self.n[position] += 1
+        self.sum_x[position] += x
+        self.sum_y[position] += score
+        self.sum_xy[position] += x * score
+        self.sum_xx[position] += x * x
+        row = self.recent[position]
+        row[:-1] = row[1:]
+        row[-1] = score
+        if not day > self.earliest_day[position]:
+            self.earliest_day[position] = day
+        if not day < self.latest_day[position]:
+            self.latest_day[position] = day
+            self.latest_score[position] = score
+
+    def compute(self):
+        """
+        计算所有患者的统计量
+
+        Returns:
+            字典，各值为长度等于患者数的数组：patient_ids、count、slope（每天）、
+            recent_delta、latest_score、latest_day、span_days（评估跨度）、percentile（斜率在参与排序的
+            患者中的百分位，不参与排序的患者为 NaN）以及 eligible（是否参与排序）
+        """
+        size = self.size
+        n = self.n[:size]
+        sum_x = self.sum_x[:size]
+        denominator = n * self.sum_xx[:size] - sum_x * sum_x
+        numerator = n * self.sum_xy[:size] - sum_x * self.sum_y[:size]
+        # 所有评估在同一时刻时分母为 0，斜率记为 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(denominator > 1e-12, numerator / denominator, 0.0)
+
+        recent = self.recent[:size]
+        filled = ~np.isnan(recent)
+        first_column = np.argmax(filled, axis=1)
+        first_recent = recent[np.arange(size), first_column]
+        recent_delta = np.where(filled.sum(axis=1) >= 2, recent[:, -1] - first_recent, 0.0)
+
+        span_days = self.latest_day[:size] - self.earliest_day[:size]
+        eligible = (n >= self.min_assessments) & (span_days >= self.min_span_days)
+        percentile = np.full(size, np.nan)
+        eligible_slopes = slope[eligible]
+        if len(eligible_slopes):
+            ranks = np.argsort(np.argsort(eligible_slopes, kind='stable'), kind='stable')
+            percentile[eligible] = ranks * 100.0 / max(1, len(eligible_slopes) - 1)
+
+        return {
+            'patient_ids': self.patient_ids[:size],
+            'count': n.astype(np.int64),
+            'slope': slope,
+            'recent_delta': recent_delta,
+            'latest_score': self.latest_score[:size],
+            'latest_day': self.latest_day[:size],
+            'span_days': span_days,
+            'percentile': percentile,
+            'eligible': eligible,
+        }
+
+    def ranking(self, patient_ids=None, descending=True, offset=0, limit=50):
+        """
+        按斜率排序的患者列表
+
+        Args:
+            patient_ids: 只返回这些患者（可选）；百分位仍以全体患者计算
+            descending: True 表示加重最快的患者在前
+            offset: 跳过的条数
+            limit: 返回的条数
+
+        Returns:
+            (rows, total, summary)：rows 为字典列表，total 为符合条件的患者数，
+            summary 为全体参与排序患者的斜率分位数
+        """
+        stats = self.compute()
+        mask = stats['eligible']
+        if patient_ids is not None:
+            mask = mask & np.isin(stats['patient_ids'], np.asarray(list(patient_ids), dtype=np.int64))
+        candidates = np.flatnonzero(mask)
+        slopes = stats['slope'][candidates]
+        order = np.argsort(-slopes if descending else slopes, kind='stable')
+        selected = candidates[order[offset:offset + limit]]
+
+        rows = [
+            {
+                'patient_pk': int(stats['patient_ids'][i]),
+                'assessment_count': int(stats['count'][i]),
+                'slope_per_day': float(stats['slope'][i]),
+                'recent_delta': float(stats['recent_delta'][i]),
+                'latest_score': float(stats['latest_score'][i]),
+                'latest_timestamp': float(stats['latest_day'][i]) * SECONDS_PER_DAY,
+                'percentile': float(stats['percentile'][i]),
+            }
+            for i in selected
+        ]
+        eligible_slopes = stats['slope'][stats['eligible']]
+        summary = {'patients': int(len(eligible_slopes))}
+        if len(eligible_slopes):
+            quantiles = np.percentile(eligible_slopes, [10, 25, 50, 75, 90])
+            summary.update({f'p{q}': float(v) for q, v in zip((10, 25, 50, 75, 90), quantiles)})
+        return rows, int(len(candidates)), summary
+
+
+def _to_days(values):
+    """评估时间（UTC）转换为天数；文本整列以 numpy 解析，datetime 逐个转换"""
+    if values and isinstance(values[0], str):
+        return np.array(values, dtype='datetime64[us]').astype(np.int64) / (SECONDS_PER_DAY * 1e6)
+    return np.array([
+        (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp() for value in values
+    ], dtype=np.float64) / SECONDS_PER_DAY
+
+
+def _assessment_rows(queryset, chunk_size=20000):
+    """
+    从评估查询集读取 (主键, 患者主键, 天数, severity_score) 四个数组
+
+    直接执行查询集编译出的 SQL 并按列转换，避免为每一行构造模型或 datetime 对象；
+    SQLite 中时间以 UTC 文本保存，转为文本读取后整列解析。
+    """
+    from django.db import connections
+    from django.db.models import CharField, F, FloatField
+    from django.db.models.fields.json import KT
+    from django.db.models.functions import Cast
+
+    connection = connections[queryset.db]
+    date = Cast('assessment_date', CharField()) if connection.vendor == 'sqlite' else F('assessment_date')
+    rows = queryset.annotate(
+        date_value=date,
+        score=Cast(KT('detailed_results__severity_score'), FloatField()),
+    ).values_list('id', 'patient_id', 'date_value', 'score')
+    sql, params = rows.query.sql_with_params()
+    columns = ([], [], [], [])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            ids, patients, dates, scores = zip(*chunk)
+            columns[0].append(np.array(ids, dtype=np.int64))
+            columns[1].append(np.array(patients, dtype=np.int64))
+            columns[2].append(_to_days(dates))
+            columns[3].append(np.array([np.nan if score is None else score for score in scores], dtype=np.float64))
+    if not columns[0]:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+    return tuple(np.concatenate(column) for column in columns)
+
+
+def _archived_rows():
+    """
+    从归档分片读取已归档评估的 (主键, 患者主键, 天数, severity_score) 四个数组
+
+    逐个分片读取序列化的字段，不还原为模型实例；归档时的时间为 UTC（以 Z 结尾）的 ISO 文本。
+    """
+    from core.models import Conversation
+    from .archive import get_archive
+
+    by_month = {}
+    archived = Conversation.objects.exclude(archived_month='').values_list('id', 'archived_month')
+    for conversation_id, month in archived.iterator():
+        by_month.setdefault(month, set()).add(conversation_id)
+
+    ids, patients, dates, scores = [], [], [], []
+    for month, conversation_ids in sorted(by_month.items()):
+        for conversation_id, record in get_archive().read_shard(month).items():
+            if conversation_id not in conversation_ids:
+                continue
+            for item in record['assessments']:
+                fields = item['fields']
+                score = (fields['detailed_results'] or {}).get('severity_score')
+                try:
+                    score = np.nan if score is None else float(score)
+                except (TypeError, ValueError):
+                    score = np.nan
+                ids.append(item['pk'])
+                patients.append(fields['patient'])
+                dates.append(fields['assessment_date'].removesuffix('Z'))
+                scores.append(score)
+    return (np.array(ids, dtype=np.int64), np.array(patients, dtype=np.int64),
+            _to_days(dates) if dates else np.zeros(0), np.array(scores, dtype=np.float64))
+
+
+_index = None
+_loaded_at = 0.0
+_index_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+
+def _build_index():
+    """从数据库和归档分片全量载入一个新的索引"""
+    from django.conf import settings
+    from core.models import DementiaAssessment
+
+    index = CohortDeclineIndex(
+        recent_count=getattr(settings, 'COHORT_RECENT_COUNT', 5),
+        min_assessments=getattr(settings, 'COHORT_MIN_ASSESSMENTS', 3),
+        min_span_days=getattr(settings, 'COHORT_MIN_SPAN_DAYS', 7.0),
+    )
+    columns = zip(_assessment_rows(DementiaAssessment.objects.order_by()), _archived_rows())
+    index.load(*(np.concatenate(column) for column in columns))
+    return index
+
+
+def _rebuild_if_stale():
+    """
+    首次使用或距上次全量载入超过 settings.COHORT_REBUILD_SECONDS 时重新载入（以反映删除和归档）
+
+    载入期间不持有 _index_lock：已有索引时其他请求继续使用旧索引，只有一个线程执行载入。
+    """
+    global _index, _loaded_at
+    from django.conf import settings
+
+    rebuild_seconds = getattr(settings, 'COHORT_REBUILD_SECONDS', 600)
+    if _index is not None and time.monotonic() - _loaded_at <= rebuild_seconds:
+        return
+    if not _rebuild_lock.acquire(blocking=_index is None):
+        return
+    try:
+        if _index is None or time.monotonic() - _loaded_at > rebuild_seconds:
+            index = _build_index()
+            with _index_lock:
+                _index, _loaded_at = index, time.monotonic()
+    finally:
+        _rebuild_lock.release()
+
+
+def cohort_ranking(patient_ids=None, descending=True, offset=0, limit=50):
+    """
+    与数据库同步后返回 CohortDeclineIndex.ranking() 的结果，参数含义相同
+
+    每次调用只读取主键大于已载入最大主键的新评估并逐条 add()，定期全量重新载入。
+    索引保存在当前进程内，各进程分别载入；全量载入时一并读取归档分片中的评估。
+    """
+    from core.models import DementiaAssessment
+
+    _rebuild_if_stale()
+    with _index_lock:
+        new_rows = DementiaAssessment.objects.filter(id__gt=_index.max_assessment_id).order_by('id')
+        for assessment_id, patient_id, day, score in zip(*_assessment_rows(new_rows)):
+            _index.add(int(assessment_id), int(patient_id), float(day), float(score))
+        return _index.ranking(patient_ids, descending, offset, limit)
+
+
+def reset_cohort_index():
+    """丢弃进程内的索引，下次调用 cohort_ranking() 时全量载入（供基准和调试脚本使用）"""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,284 @@
+"""
+运行指标模块：进程内的直方图与计数器，按 Prometheus 文本格式导出
+
+不依赖 prometheus_client。每次记录只做一次二分查找和几次加法，
+可以在生产环境中常开；settings.METRICS_ENABLED = False 时计时装饰器直接调用原函数。
+指标保存在当前进程内，多进程部署（gunicorn 多个 worker）时每次抓取只看到处理该请求的进程。
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# 延迟类指标的默认分桶（秒）
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# 每个请求 SQL 查询数的分桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_enabled = True
+
+
+def set_enabled(enabled):
+    """开启或关闭计时（已记录的数据保留）"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _HistogramChild:
+    """一组标签值对应的直方图数据，counts 按桶分别计数（导出时再累加）"""
+
+    __slots__ = ('upper_bounds', 'counts', 'sum', 'lock')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """计时上下文管理器"""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class _CounterChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """
+        取得一组标签值对应的子指标（首次使用时创建）
+
+        热点路径上应在模块加载或装饰时取得子指标并保存，避免每次记录都查找字典。
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self, key, child):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {_escape(self.documentation)}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._samples(key, child))
+        return lines
+
+
+class Histogram(_Metric):
+    """带标签的直方图，导出 _bucket / _sum / _count 三组样本"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(float(bound) for bound in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value, **labels):
+        self.labels(**labels).observe(value)
+
+    def _samples(self, key, child):
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float('inf'),), counts):
+            cumulative += count
+            le = 'le="' + _format_number(bound) + '"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_number(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Counter(_Metric):
+    """带标签的单调递增计数器，名称按惯例以 _total 结尾"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1, **labels):
+        self.labels(**labels).inc(amount)
+
+    def _samples(self, key, child):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(child.value)}']
+
+
+class _Timer:
+    """记录 with 代码块耗时的上下文管理器"""
+
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if _enabled:
+            self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+def timed(histogram, **labels):
+    """
+    函数计时装饰器，耗时记入 histogram 的指定标签（异常退出也会记录）
+
+    用法:
+        @timed(PREDICTOR_LATENCY, operation='predict_from_text')
+        def predict_from_text(self, text): ...
+    """
+    child = histogram.labels(**labels)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class MetricsRegistry:
+    """指标注册表，负责生成 /metrics 的输出"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'metric {metric.name} already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def render(self):
+        """按 Prometheus 文本格式（0.0.4）输出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# 请求级指标（见 core.middleware.MetricsMiddleware），view 标签为 URL 名称
+REQUEST_LATENCY = REGISTRY.histogram(
+    'transmbd_request_duration_seconds', 'Request latency by view',
+    ('view', 'method', 'status'),
+)
+REQUEST_DB_QUERIES = REGISTRY.histogram(
+    'transmbd_request_db_queries', 'ORM queries executed per request by view',
+    ('view',), buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = REGISTRY.histogram(
+    'transmbd_request_db_duration_seconds', 'Time spent in ORM queries per request by view',
+    ('view',),
+)
+REQUEST_EXCEPTIONS = REGISTRY.counter(
+    'transmbd_request_exceptions_total', 'Unhandled exceptions raised by views',
+    ('view', 'exception'),
+)
+TEMPLATE_RENDER = REGISTRY.histogram(
+    'transmbd_template_render_seconds', 'Template render time by view and template',
+    ('view', 'template'),
+)
+
+# 推理与文本处理热点路径
+PREDICTOR_LATENCY = REGISTRY.histogram(
+    'transmbd_predictor_duration_seconds', 'DementiaPredictor / ConversationManager call latency',
+    ('operation',),
+)
+TEXT_PROCESSING = REGISTRY.histogram(
+    'transmbd_text_processing_duration_seconds', 'TextProcessor stage latency',
+    ('stage',),
+)
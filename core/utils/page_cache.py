@@ -0,0 +1,132 @@
+"""
+页面片段缓存：缓存照护人员页面渲染好的模板片段，按患者/对话等范围的版本号失效
+
+每个缓存条目记录渲染时所依赖范围（如 ('patient', 12)）的版本号；
+数据变化时只递增受影响范围的版本号（见 core/signals.py），
+读取条目时版本号不一致即视为未命中，无需逐个查找和删除缓存键。
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.encoding import iri_to_uri
+
+VERSION_PREFIX = 'v'
+ENTRY_PREFIX = 'page'
+
+
+def _scope_key(scope):
+    name, value = scope
+    return f'{VERSION_PREFIX}:{name}:{value}'
+
+
+class PageCache:
+    """
+    基于 Django 缓存后端的页面片段缓存
+
+    版本号在首次使用或被缓存淘汰后以当前时间（纳秒）为初值，之后每次失效加一，
+    因此被淘汰后重新生成的版本号不会与旧条目中记录的相同。
+    版本号先于页面数据读取，渲染期间发生的写入会使新条目立即过期，不会缓存旧数据。
+    """
+
+    def __init__(self, alias='pages', timeout=300):
+        """
+        Args:
+            alias: settings.CACHES 中的缓存别名；多进程部署时应使用进程间共享的后端（如 FileBasedCache）
+            timeout: 条目有效期（秒），限制页面上相对时间（如“进行中 5 分钟”）的陈旧程度
+        """
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def versions(self, scopes):
+        """返回 {范围: 版本号}，尚无版本号的范围在此初始化"""
+        keys = {_scope_key(scope): scope for scope in scopes}
+        found = self.cache.get_many(list(keys))
+        result = {}
+        for key, scope in keys.items():
+            version = found.get(key)
+            if version is None:
+                self.cache.add(key, time.time_ns(), timeout=None)
+                version = self.cache.get(key)
+            result[scope] = version
+        return result
+
+    def bump(self, scopes):
+        """使依赖这些范围的条目失效"""
+        for scope in set(scopes):
+            key = _scope_key(scope)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                # 版本号不存在（尚未使用或已被淘汰）：以当前时间为初值重新开始
+                self.cache.set(key, time.time_ns(), timeout=None)
+
+    def bump_on_commit(self, scopes):
+        """在当前事务提交后使这些范围失效（不在事务中时立即执行）"""
+        scopes = list(scopes)
+        transaction.on_commit(lambda: self.bump(scopes))
+
+    def clear_on_commit(self):
+        """
+        在当前事务提交后使所有条目失效
+
+        批量修改涉及大量对话时使用：逐个递增版本号时文件缓存每次写入都要扫描缓存目录。
+        """
+        transaction.on_commit(self.cache.clear)
+
+    def get(self, key):
+        """返回有效条目的片段字典，未命中或依赖的版本号已变化时返回 None"""
+        entry = self.cache.get(f'{ENTRY_PREFIX}:{key}')
+        if entry is None:
+            return None
+        versions, fragments = entry
+        if self.versions(versions) != versions:
+            return None
+        return fragments
+
+    def set(self, key, versions, fragments):
+        """保存片段；versions 为渲染前通过 versions() 读取的版本号"""
+        self.cache.set(f'{ENTRY_PREFIX}:{key}', (versions, fragments), timeout=self.timeout)
+
+
+class FragmentRecorder:
+    """
+    传给模板的 page_fragments 变量，由 {% fragment %} 标签使用
+
+    命中时直接输出已缓存的片段；未命中时渲染标签内容并记录下来，供视图写入缓存。
+    """
+
+    def __init__(self, cached=None):
+        self.cached = cached
+        self.rendered = {}
+
+    def render(self, name, nodelist, context):
+        if self.cached is not None and name in self.cached:
+            return self.cached[name]
+        html = nodelist.render(context)
+        self.rendered[name] = html
+        return html
+
+
+def page_key(view_name, *parts):
+    """由视图名称和 URL 参数组成条目键"""
+    return iri_to_uri(':'.join([view_name, *map(str, parts)]))
+
+
+_page_cache = None
+
+
+def get_page_cache():
+    """获取进程内共享的页面片段缓存实例"""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache(
+            alias=getattr(settings, 'PAGE_CACHE_ALIAS', 'pages'),
+            timeout=getattr(settings, 'PAGE_CACHE_TIMEOUT', 300),
+        )
+    return _page_cache
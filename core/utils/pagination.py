@@ -0,0 +1,101 @@
+"""
+键集分页（游标分页）：按 (排序字段, id) 定位上一页的最后一行，从该位置之后继续读取
+
+与 OFFSET 分页不同，读取任一页都只需沿索引定位后读取 limit + 1 行，
+耗时与翻到第几页无关；翻页期间插入新行也不会造成重复或遗漏。
+游标对客户端不透明，为 (排序字段值, id) 的 URL 安全 base64 编码。
+"""
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(value, pk):
+    """把一行的排序字段值和 id 编码为游标"""
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解码游标，返回 (排序字段值, id)
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        return datetime.datetime.fromisoformat(value), int(pk)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+
+def keyset_page(rows, field, cursor=None, limit=20, descending=False):
+    """
+    读取游标之后的一页
+
+    Args:
+        rows: QuerySet，或对象列表（如归档分片中的记录，在内存中排序和筛选），
+            或由它们组成的元组（如数据库和归档分片中的评估）：各来源分别读取一页后合并
+        field: 排序的日期时间字段名；相同值按 id 排序，保证顺序唯一
+        cursor: 上一页返回的游标，None 表示第一页
+        limit: 每页条数
+        descending: 是否按时间倒序
+
+    Returns:
+        (本页对象列表, 下一页游标)；已是最后一页时游标为 None
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    if isinstance(rows, tuple):
+        return _merged_page(rows, field, cursor, limit, descending)
+    after = decode_cursor(cursor) if cursor else None
+    if isinstance(rows, list):
+        items = sorted(rows, key=lambda row: (getattr(row, field), row.pk), reverse=descending)
+        if after is not None:
+            if descending:
+                items = [row for row in items if (getattr(row, field), row.pk) < after]
+            else:
+                items = [row for row in items if (getattr(row, field), row.pk) > after]
+        items = items[:limit + 1]
+    else:
+        if after is not None:
+            value, pk = after
+            # 先以单列范围条件沿 (…, field) 索引定位，再排除与游标同一时刻且已读过的行
+            if descending:
+                rows = rows.filter(Q(**{f'{field}__lt': value}) | Q(pk__lt=pk), **{f'{field}__lte': value})
+            else:
+                rows = rows.filter(Q(**{f'{field}__gt': value}) | Q(pk__gt=pk), **{f'{field}__gte': value})
+        order = (f'-{field}', '-pk') if descending else (field, 'pk')
+        items = list(rows.order_by(*order)[:limit + 1])
+
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(getattr(items[-1], field), items[-1].pk)
+
+
+def _merged_page(sources, field, cursor, limit, descending):
+    """
+    多个来源的键集分页：每个来源读取游标之后的至多 limit 行，合并排序后取前 limit 行
+
+    各来源使用同一游标，合并后的任一前缀必然包含在各来源的前 limit 行中；
+    本页之后是否还有数据取决于合并后的行数和各来源是否还有下一页。
+    """
+    items = []
+    more = False
+    for rows in sources:
+        page, next_cursor = keyset_page(rows, field, cursor, limit=limit, descending=descending)
+        items += page
+        more |= next_cursor is not None
+    items.sort(key=lambda row: (getattr(row, field), row.pk), reverse=descending)
+    if len(items) <= limit and not more:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(getattr(items[-1], field), items[-1].pk)
@@ -0,0 +1,195 @@
+"""
+预测结果缓存模块：对评分时相同的输入复用预测结果
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .metrics import PREDICTOR_LATENCY, timed
+
+
+class PredictionCache:
+    """
+    带容量上限和过期时间的 LRU 缓存（线程安全）
+
+    缓存键由模型/规则集版本和输入文本的哈希组成；
+    版本变化时整个缓存自动清空。
+    """
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        """
+        Args:
+            maxsize: 最多缓存的条目数
+            ttl: 条目有效期（秒），为 None 时不过期
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """返回缓存值，未命中或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """删除一个条目（不存在时忽略）"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def ensure_version(self, version):
+        """版本与缓存内容不一致时清空缓存"""
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    if self._entries:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self.version = version
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回缓存命中情况"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+class CachedPredictor:
+    """
+    在 DementiaPredictor 前加一层结果缓存
+
+    - 缓存键为 text.lower()（规则匹配实际扫描的字符串）的哈希加上预测器版本，
+      因此只有大小写不同的输入视为同一输入；空白和符号会影响规则命中，不能忽略
+    - 只缓存文本的规则特征（按历史调整之前的各维度得分）；按患者历史调整、
+      严重程度、置信度和时间戳在每次预测时计算，结果与未缓存时相同，带历史的预测也能命中缓存
+    - predict_from_text / predict_batch 的耗时记入与被包装预测器相同的 PREDICTOR_LATENCY 指标
+    - 其他属性和方法透明地转发给被包装的预测器
+    """
+
+    def __init__(self, predictor, maxsize=10000, ttl=3600, model_version=''):
+        """
+        Args:
+            predictor: 被包装的预测器
+            maxsize: 缓存容量
+            ttl: 缓存有效期（秒）
+            model_version: 额外的模型版本标签，会与预测器自身的规则集版本组合
+        """
+        self.predictor = predictor
+        self.model_version = model_version
+        self.cache = PredictionCache(maxsize=maxsize, ttl=ttl)
+
+    def __getattr__(self, name):
+        if name == 'predictor':
+            raise AttributeError(name)
+        return getattr(self.predictor, name)
+
+    @property
+    def version(self):
+        """当前的模型/规则集版本，规则重新编译后随之变化"""
+        return f"{self.model_version}:{getattr(self.predictor, 'version', '')}"
+
+    def _key(self, text, version):
+        # 必须与 RuleMatcher.score 扫描的字符串一致，否则评分不同的文本会共用同一条目
+        return f"{version}:{hashlib.sha1(text.lower().encode('utf-8')).hexdigest()}"
+
+    def _version(self, pack):
+        return f"{self.model_version}:{pack.version}"
+
+    @timed(PREDICTOR_LATENCY, operation='predict_from_text')
+    def predict_from_text(self, text, patient_history=None):
+        """
+        带缓存的 predict_from_text：缓存规则特征，按历史调整和计算严重程度在每次预测时进行
+
+        不经过被包装预测器的 predict_from_text，耗时在此记入同一指标（含缓存命中）。
+        """
+        pack = self.predictor.rule_pack
+        version = self._version(pack)
+        self.cache.ensure_version(version)
+        key = self._key(text, version)
+        dimensions = pack.matcher.dimensions
+        cached = self.cache.get(key)
+        if cached is None:
+            features = self.predictor._extract_features_from_text(text, pack)
+            self.cache.set(key, tuple(features[dimension] for dimension in dimensions))
+        else:
+            features = dict(zip(dimensions, cached))
+        return self.predictor.predict_from_features(features, patient_history, pack)
+
+    @timed(PREDICTOR_LATENCY, operation='predict_batch')
+    def predict_batch(self, texts, histories=None):
+        """带缓存的 predict_batch：只有未命中的文本交给底层批量提取特征（耗时同样记入 predict_batch 指标）"""
+        texts = list(texts)
+        pack = self.predictor.rule_pack
+        version = self._version(pack)
+        self.cache.ensure_version(version)
+        rows = [None] * len(texts)
+        missing = {}
+        for index, text in enumerate(texts):
+            key = self._key(text, version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                rows[index] = cached
+            else:
+                missing.setdefault(key, []).append(index)
+
+        if missing:
+            first_indexes = [indexes[0] for indexes in missing.values()]
+            computed = self.predictor.batch_features([texts[i] for i in first_indexes], pack)
+            for (key, indexes), row in zip(missing.items(), computed.tolist()):
+                row = tuple(row)
+                self.cache.set(key, row)
+                for index in indexes:
+                    rows[index] = row
+        features = np.array(rows, dtype=np.float64).reshape(len(texts), len(pack.matcher.dimensions))
+        return self.predictor.predict_batch_from_features(features, histories, pack)
+
+    def cache_stats(self):
+        """返回缓存命中情况"""
+        return self.cache.stats()
@@ -4,9 +4,13 @@
 import numpy as np
 import json
 import os
+import hashlib
 from datetime import datetime
 import random
 
+from .metrics import PREDICTOR_LATENCY, timed
+from .rule_pack import get_rule_pack_source
+
 
 class DementiaPredictor:
     """
@@ -14,92 +18,56 @@ class DementiaPredictor:
     在实际应用中，这将通过Mistral 7B语言模型实现
     """
     
-    def __init__(self):
-        """初始化预测器"""
-        # 定义失智症评估维度及其权重
-        self.dimensions = {
-            'memory': 0.30,
-            'orientation': 0.25,
-            'language': 0.20,
-            'attention': 0.15,
-            'problem_solving': 0.10
-        }
-        
-        # 失智症严重程度阈值
-        self.severity_thresholds = {
-            'normal': (0.0, 0.2),
-            'mild': (0.2, 0.5),
-            'moderate': (0.5, 0.75),
-            'severe': (0.75, 1.0)
-        }
-        
-        # 创建一个简单的规则引擎来模拟LLM的判断
-        self.rules = self._initialize_rules()
-        
-    def _initialize_rules(self):
-        """初始化规则引擎"""
+    def __init__(self, rule_source=None):
+        """
+        初始化预测器
+
+        Args:
+            rule_source: 规则包来源（RulePackSource），默认使用进程内共享的来源（settings.RULE_PACK_PATH）
+        """
+        # 评估维度及其权重、严重程度阈值和规则均来自外部规则包，规则包文件变化时自动热替换；
         # 在实际应用中，这些规则将由经过微调的LLM模型取代
-        rules = {
-            'memory': [
-                {'pattern': '忘记', 'score': 0.6},
-                {'pattern': '记不起来', 'score': 0.7},
-                {'pattern': '想不起来', 'score': 0.65},
-                {'pattern': '不记得', 'score': 0.55},
-                {'pattern': '忘了', 'score': 0.5},
-            ],
-            'orientation': [
-                {'pattern': '不知道现在是几点', 'score': 0.5},
-                {'pattern': '不清楚今天日期', 'score': 0.6},
-                {'pattern': '不知道这是哪里', 'score': 0.75},
-                {'pattern': '迷失', 'score': 0.8},
-                {'pattern': '迷惑', 'score': 0.7},
-            ],
-            'language': [
-                {'pattern': '词不达意', 'score': 0.4},
-                {'pattern': '表达困难', 'score': 0.5},
-                {'pattern': '说不出来', 'score': 0.6},
-                {'pattern': '词汇重复', 'score': 0.45},
-                {'pattern': '句子不完整', 'score': 0.55},
-            ],
-            'attention': [
-                {'pattern': '注意力不集中', 'score': 0.5},
-                {'pattern': '容易分心', 'score': 0.4},
-                {'pattern': '无法专注', 'score': 0.65},
-                {'pattern': '思绪混乱', 'score': 0.7},
-            ],
-            'problem_solving': [
-                {'pattern': '解决问题困难', 'score': 0.55},
-                {'pattern': '逻辑混乱', 'score': 0.6},
-                {'pattern': '无法理解简单问题', 'score': 0.8},
-                {'pattern': '决策困难', 'score': 0.5},
-            ]
-        }
-        return rules
-    
-    def _extract_features_from_text(self, text):
+        self.rule_source = rule_source or get_rule_pack_source()
+        self.rule_source.current()
+
+    @property
+    def rule_pack(self):
+        """当前生效的规则包；一次预测中只读取一次，保证整次预测使用同一规则包"""
+        return self.rule_source.current()
+
+    @property
+    def version(self):
+        """规则包版本，用于缓存失效和记录评估使用的规则"""
+        return self.rule_pack.version
+
+    @property
+    def dimensions(self):
+        """失智症评估维度及其权重"""
+        return self.rule_pack.dimensions
+
+    @property
+    def severity_thresholds(self):
+        """失智症严重程度阈值"""
+        return self.rule_pack.severity_thresholds
+
+    @property
+    def rules(self):
+        """各维度的规则表"""
+        return self.rule_pack.rules
+
+    @property
+    def rule_matcher(self):
+        """规则包编译出的多模式匹配自动机，一次扫描即可为所有维度评分"""
+        return self.rule_pack.matcher
+
+    def _extract_features_from_text(self, text, pack=None):
         """从文本中提取特征（简化版）"""
         # 在实际应用中，这将使用更复杂的NLP技术
-        features = {}
-        
-        # 为每个维度计算一个基础分数
-        for dimension, rules_list in self.rules.items():
-            dimension_score = 0
-            hits = 0
-            
-            for rule in rules_list:
-                if rule['pattern'].lower() in text.lower():
-                    dimension_score += rule['score']
-                    hits += 1
-            
-            # 如果有匹配的规则，计算平均分
-            if hits > 0:
-                features[dimension] = dimension_score / hits
-            else:
-                # 基础噪声值，模拟模型的不确定性
-                features[dimension] = 0.1
-        
-        return features
+        # 所有维度的规则在一次文本扫描中完成匹配；
+        # 有命中的维度取命中规则的平均分，否则取基础噪声值以模拟模型的不确定性
+        return (pack or self.rule_pack).matcher.score(text)
     
+    @timed(PREDICTOR_LATENCY, operation='predict_from_text')
     def predict_from_text(self, text, patient_history=None):
         """
         根据文本内容预测失智症严重程度
@@ -111,21 +79,33 @@ class DementiaPredictor:
         Returns:
             prediction: 包含预测结果的字典
         """
+        pack = self.rule_pack
+
         # 提取特征
-        features = self._extract_features_from_text(text)
-        
+        features = self._extract_features_from_text(text, pack)
+        return self.predict_from_features(features, patient_history, pack)
+
+    def predict_from_features(self, features, patient_history=None, pack=None):
+        """
+        由文本的规则特征（各维度得分，尚未按历史调整）完成预测
+
+        与 predict_from_text 的后半部分相同；CachedPredictor 缓存规则特征后，
+        每次预测仍在此按患者历史调整，带历史的预测也能使用缓存。
+        """
+        pack = pack or self.rule_pack
+
         # 根据历史数据调整预测（如果有）
         if patient_history and len(patient_history) > 0:
-            features = self._adjust_with_history(features, patient_history)
+            features = self._adjust_with_history(features, patient_history, pack)
         
         # 计算加权严重程度分数
         severity_score = 0
-        for dimension, weight in self.dimensions.items():
+        for dimension, weight in pack.dimensions.items():
             severity_score += features.get(dimension, 0.1) * weight
         
         # 确定严重程度类别
         severity_category = 'normal'
-        for category, (lower, upper) in self.severity_thresholds.items():
+        for category, (lower, upper) in pack.severity_thresholds.items():
             if lower <= severity_score < upper:
                 severity_category = category
                 break
@@ -140,12 +120,138 @@ class DementiaPredictor:
             'confidence': round(confidence, 2),
             'dimension_scores': {k: round(v, 2) for k, v in features.items()},
             'timestamp': datetime.now().isoformat(),
+            'rules_version': pack.version,
         }
         
         return prediction
-    
-    def _adjust_with_history(self, current_features, history):
-        """根据历史数据调整当前预测"""
+
+    @timed(PREDICTOR_LATENCY, operation='predict_batch')
+    def predict_batch(self, texts, histories=None):
+        """
+        批量预测多条文本的失智症严重程度
+
+        命中矩阵以坐标形式（文本序号, 规则序号）保存，避免稠密的
+        文本数 × 规则数矩阵占用过多内存；维度平均分、加权严重程度分数
+        和严重程度类别均以 NumPy 数组运算完成。在相同随机种子下，
+        结果与逐条调用 predict_from_text 完全一致（时间戳除外，整批共用一个）。
+
+        Args:
+            texts: 患者输入文本的列表
+            histories: 与 texts 等长的历史评估列表（可选），元素可为 None
+
+        Returns:
+            predictions: 与 texts 顺序对应的预测结果字典列表
+        """
+        pack = self.rule_pack
+        return self.predict_batch_from_features(self.batch_features(texts, pack), histories, pack)
+
+    def batch_features(self, texts, pack=None):
+        """
+        批量提取规则特征
+
+        Returns:
+            形状为 (文本数, 维度数) 的数组，列顺序为 pack.matcher.dimensions
+        """
+        texts = list(texts)
+        n_texts = len(texts)
+        matcher = (pack or self.rule_pack).matcher
+        n_dims = len(matcher.dimensions)
+        rule_dimension = np.asarray(matcher.rule_dimension, dtype=np.intp)
+        rule_score = np.asarray(matcher.rule_score, dtype=np.float64)
+
+        # 构建命中矩阵：每条不同的文本只扫描一次，规则序号升序排列
+        rows = []
+        cols = []
+        hits_by_text = {}
+        for row, text in enumerate(texts):
+            hit_ids = hits_by_text.get(text)
+            if hit_ids is None:
+                hit_ids = sorted(matcher.find_rule_ids(text.lower()))
+                hits_by_text[text] = hit_ids
+            rows.extend([row] * len(hit_ids))
+            cols.extend(hit_ids)
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.asarray(cols, dtype=np.intp)
+
+        # 按 (文本, 规则) 顺序逐项累加，保证浮点求和顺序与逐条匹配一致
+        sums = np.zeros((n_texts, n_dims), dtype=np.float64)
+        counts = np.zeros((n_texts, n_dims), dtype=np.int64)
+        hit_dims = rule_dimension[cols]
+        np.add.at(sums, (rows, hit_dims), rule_score[cols])
+        np.add.at(counts, (rows, hit_dims), 1)
+
+        features = np.full((n_texts, n_dims), matcher.default_score, dtype=np.float64)
+        np.divide(sums, counts, out=features, where=counts > 0)
+        return features
+
+    def predict_batch_from_features(self, features, histories=None, pack=None):
+        """
+        由 batch_features 的结果完成批量预测（按历史调整、计算严重程度并构建结果）
+
+        Args:
+            features: batch_features 返回的数组（会被原地修改）
+            histories: 与行数相同的历史评估列表（可选），元素可为 None
+            pack: 提取特征时使用的规则包
+        """
+        pack = pack or self.rule_pack
+        feature_dims = pack.matcher.dimensions
+        n_texts = len(features)
+        if histories is not None and len(histories) != n_texts:
+            raise ValueError('histories must have the same length as texts')
+
+        # 根据历史数据调整预测（如果有）
+        if histories is not None:
+            for row, history in enumerate(histories):
+                if history and len(history) > 0:
+                    adjusted = self._adjust_with_history(
+                        dict(zip(feature_dims, features[row].tolist())), history, pack
+                    )
+                    features[row] = [adjusted[dimension] for dimension in feature_dims]
+
+        # 计算加权严重程度分数（按维度顺序累加，与逐条计算一致）
+        severity_scores = np.zeros(n_texts, dtype=np.float64)
+        for dimension, weight in pack.dimensions.items():
+            if dimension in feature_dims:
+                severity_scores += features[:, feature_dims.index(dimension)] * weight
+            else:
+                severity_scores += 0.1 * weight
+
+        # 确定严重程度类别：在按下限排序的阈值上二分查找
+        categories = sorted(pack.severity_thresholds.items(), key=lambda item: item[1][0])
+        category_names = [category for category, _ in categories] + ['normal']
+        lowers = np.array([lower for _, (lower, _) in categories], dtype=np.float64)
+        uppers = np.array([upper for _, (_, upper) in categories], dtype=np.float64)
+        category_index = np.searchsorted(lowers, severity_scores, side='right') - 1
+        in_range = (category_index >= 0) & (
+            severity_scores < uppers[np.clip(category_index, 0, len(uppers) - 1)]
+        )
+        category_index = np.where(in_range, category_index, len(categories))
+
+        # 构建结果（置信度按文本顺序依次抽取，与逐条调用时的随机序列一致）
+        timestamp = datetime.now().isoformat()
+        predictions = []
+        for score, cat_index, dims in zip(
+            severity_scores.tolist(), category_index.tolist(), features.tolist()
+        ):
+            confidence = 0.5 + random.uniform(0, 0.4)
+            predictions.append({
+                'severity_score': round(score, 2),
+                'severity_category': category_names[cat_index],
+                'confidence': round(confidence, 2),
+                'dimension_scores': {k: round(v, 2) for k, v in zip(feature_dims, dims)},
+                'timestamp': timestamp,
+                'rules_version': pack.version,
+            })
+
+        return predictions
+
+    def _adjust_with_history(self, current_features, history, pack=None):
+        """
+        根据历史数据调整当前预测
+
+        history 可以是按时间排列的历史评估列表，也可以是患者的 PatientHistoryState；
+        两者对同样的历史给出逐位相同的结果，使用后者时耗时与历史长度无关。
+        """
         # 获取最近的历史评估
         if not history:
             return current_features
@@ -156,93 +262,172 @@ class DementiaPredictor:
         
         # 简单加权平均，偏向最近的评估
         adjusted_features = current_features.copy()
-        for dimension in self.dimensions:
+        for dimension in (pack or self.rule_pack).dimensions:
             if dimension in current_features:
-                # 历史评估中该维度的平均值（如果存在）
-                history_values = [h.get('dimension_scores', {}).get(dimension) 
-                                 for h in history if dimension in h.get('dimension_scores', {})]
+                if isinstance(history, PatientHistoryState):
+                    weighted_avg = history.weighted_average(dimension)
+                else:
+                    # 历史评估中该维度的平均值（如果存在）
+                    history_values = [h.get('dimension_scores', {}).get(dimension) 
+                                     for h in history if dimension in h.get('dimension_scores', {})]
+                    weighted_avg = None
+                    if history_values:
+                        # 计算加权平均值，最新的历史数据权重更大
+                        weights = [i+1 for i in range(len(history_values))]
+                        weighted_avg = sum(v * w for v, w in zip(history_values, weights)) / sum(weights)
                 
-                if history_values:
-                    # 计算加权平均值，最新的历史数据权重更大
-                    weights = [i+1 for i in range(len(history_values))]
-                    weighted_avg = sum(v * w for v, w in zip(history_values, weights)) / sum(weights)
-                    
+                if weighted_avg is not None:
                     # 当前评估和历史趋势的混合
                     adjusted_features[dimension] = 0.7 * current_features[dimension] + 0.3 * weighted_avg
         
         return adjusted_features
     
-    def generate_report(self, prediction, patient_info=None):
+    def generate_report(self, prediction, patient_info=None, variant=None):
         """
         根据预测结果生成描述性报告
         
         Args:
             prediction: 预测结果字典
             patient_info: 患者基本信息字典（可选）
+            variant: 开头段落的模板序号（按模板数取模）；为 None 时随机选择
             
         Returns:
             report: 描述性报告字符串
         """
-        severity = prediction['severity_category']
-        score = prediction['severity_score']
-        
-        # 报告模板
-        report_templates = {
-            'normal': [
-                "患者当前认知功能处于正常范围，未发现明显失智症状。",
-                "患者思维清晰，记忆、语言及问题解决能力正常。",
-                "评估显示患者认知功能良好，无需特别干预。"
-            ],
-            'mild': [
-                "患者表现出轻度认知障碍，可能处于失智症早期阶段。",
-                "患者在记忆和方向感方面有轻微困难，但日常功能基本正常。",
-                "评估显示患者有轻度认知功能衰退，建议定期监测。"
-            ],
-            'moderate': [
-                "患者表现出中度失智症状，认知功能明显下降。",
-                "患者在记忆、语言表达和日常决策方面存在显著困难。",
-                "评估显示患者认知能力中度受损，需要适当照护支持。"
-            ],
-            'severe': [
-                "患者表现出严重失智症状，认知功能严重受损。",
-                "患者在大多数认知领域表现出显著困难，需要全面照护。",
-                "评估显示患者处于失智症晚期阶段，需要专业护理支持。"
-            ]
-        }
-        
-        # 随机选择一个模板
-        base_report = random.choice(report_templates[severity])
-        
-        # 添加维度特定的观察
-        dimension_observations = []
-        for dimension, score in prediction['dimension_scores'].items():
-            if dimension == 'memory' and score > 0.5:
-                dimension_observations.append(f"患者记忆力受损明显，表现为短期记忆困难。")
-            elif dimension == 'orientation' and score > 0.5:
-                dimension_observations.append(f"患者在时间和空间定向方面表现出困难。")
-            elif dimension == 'language' and score > 0.5:
-                dimension_observations.append(f"患者语言表达能力下降，词汇查找和句子构建困难。")
-            elif dimension == 'attention' and score > 0.5:
-                dimension_observations.append(f"患者注意力难以集中，容易分心。")
-            elif dimension == 'problem_solving' and score > 0.5:
-                dimension_observations.append(f"患者解决问题的能力下降，思维逻辑受损。")
-        
-        # 拼接报告
-        full_report = base_report
-        if dimension_observations:
-            full_report += "\n\n具体观察：\n" + "\n".join(dimension_observations)
-        
-        # 添加建议
-        if severity == 'normal':
-            full_report += "\n\n建议：保持健康生活方式，定期认知功能检查。"
-        elif severity == 'mild':
-            full_report += "\n\n建议：增加认知刺激活动，考虑专业医疗评估，定期监测认知变化。"
-        elif severity == 'moderate':
-            full_report += "\n\n建议：寻求专业医疗干预，制定照护计划，确保安全环境。"
-        else:  # severe
-            full_report += "\n\n建议：需要专业全天候照护，制定详细照护方案，关注生活质量。"
-        
-        return full_report
+        if variant is None:
+            variant = random.randrange(len(REPORT_TEMPLATES[prediction['severity_category']]))
+        return render_report(prediction, variant)
+
+
+# 报告模板：开头段落（每种严重程度若干个可选模板）
+REPORT_TEMPLATES = {
+    'normal': (
+        "患者当前认知功能处于正常范围，未发现明显失智症状。",
+        "患者思维清晰，记忆、语言及问题解决能力正常。",
+        "评估显示患者认知功能良好，无需特别干预。"
+    ),
+    'mild': (
+        "患者表现出轻度认知障碍，可能处于失智症早期阶段。",
+        "患者在记忆和方向感方面有轻微困难，但日常功能基本正常。",
+        "评估显示患者有轻度认知功能衰退，建议定期监测。"
+    ),
+    'moderate': (
+        "患者表现出中度失智症状，认知功能明显下降。",
+        "患者在记忆、语言表达和日常决策方面存在显著困难。",
+        "评估显示患者认知能力中度受损，需要适当照护支持。"
+    ),
+    'severe': (
+        "患者表现出严重失智症状，认知功能严重受损。",
+        "患者在大多数认知领域表现出显著困难，需要全面照护。",
+        "评估显示患者处于失智症晚期阶段，需要专业护理支持。"
+    ),
+}
+
+# 维度得分超过 REPORT_OBSERVATION_THRESHOLD 时加入的观察
+REPORT_OBSERVATION_THRESHOLD = 0.5
+REPORT_OBSERVATIONS = {
+    'memory': "患者记忆力受损明显，表现为短期记忆困难。",
+    'orientation': "患者在时间和空间定向方面表现出困难。",
+    'language': "患者语言表达能力下降，词汇查找和句子构建困难。",
+    'attention': "患者注意力难以集中，容易分心。",
+    'problem_solving': "患者解决问题的能力下降，思维逻辑受损。",
+}
+
+REPORT_RECOMMENDATIONS = {
+    'normal': "\n\n建议：保持健康生活方式，定期认知功能检查。",
+    'mild': "\n\n建议：增加认知刺激活动，考虑专业医疗评估，定期监测认知变化。",
+    'moderate': "\n\n建议：寻求专业医疗干预，制定照护计划，确保安全环境。",
+    'severe': "\n\n建议：需要专业全天候照护，制定详细照护方案，关注生活质量。",
+}
+
+# 报告模板版本：由模板内容生成，模板修改后已缓存的报告自动失效
+REPORT_TEMPLATE_VERSION = 'report-' + hashlib.sha1(json.dumps(
+    [REPORT_TEMPLATES, REPORT_OBSERVATION_THRESHOLD, REPORT_OBSERVATIONS, REPORT_RECOMMENDATIONS],
+    sort_keys=True, ensure_ascii=False,
+).encode('utf-8')).hexdigest()[:12]
+
+
+def render_report(prediction, variant=0):
+    """
+    用预先定义的模板生成报告，variant 为开头段落的模板序号（按模板数取模）
+    
+    与 DementiaPredictor.generate_report 输出相同，但不需要预测器实例，
+    可在批量生成报告的子进程中直接调用。
+    """
+    severity = prediction['severity_category']
+    templates = REPORT_TEMPLATES[severity]
+    parts = [templates[variant % len(templates)]]
+    
+    observations = [
+        REPORT_OBSERVATIONS[dimension]
+        for dimension, score in prediction['dimension_scores'].items()
+        if dimension in REPORT_OBSERVATIONS and score > REPORT_OBSERVATION_THRESHOLD
+    ]
+    if observations:
+        parts.append("\n\n具体观察：\n" + "\n".join(observations))
+    
+    parts.append(REPORT_RECOMMENDATIONS[severity])
+    return ''.join(parts)
+
+
+class PatientHistoryState:
+    """
+    患者历史评估的增量累加状态
+
+    _adjust_with_history 对某一维度的第 i 条历史分数赋予权重 i（越新权重越大），
+    按列表计算时每次预测都要遍历全部历史。线性加权和可以递推：第 n 条分数 v 到来时
+    加权和增加 n × v，权重和为 n(n+1)/2，因此每个维度只需保存（条数, 加权和），
+    每条新评估的更新耗时为 O(维度数)，与历史长度无关。
+    加权和的累加顺序和每一步的浮点运算都与按列表计算时相同，加权平均逐位一致（误差为 0）；
+    只有按时间顺序累加时才成立，补录更早日期的评估后需用 from_history() 重建。
+    状态可通过 to_dict()/from_dict() 序列化为 JSON，保存在 PatientSummary.history_state 中。
+    """
+
+    def __init__(self):
+        """初始化空的累加状态"""
+        self.assessment_count = 0
+        # 维度 -> [条数, 加权和]
+        self.dimensions = {}
+
+    def __len__(self):
+        return self.assessment_count
+
+    def update(self, dimension_scores):
+        """累加一条新评估的维度分数（评估结果中的 dimension_scores）"""
+        self.assessment_count += 1
+        for dimension, score in dimension_scores.items():
+            count, weighted_sum = self.dimensions.get(dimension, (0, 0))
+            count += 1
+            self.dimensions[dimension] = [count, weighted_sum + score * count]
+        return self
+
+    def weighted_average(self, dimension):
+        """维度的线性加权平均分，没有该维度的历史时返回 None"""
+        count, weighted_sum = self.dimensions.get(dimension, (0, 0))
+        if not count:
+            return None
+        return weighted_sum / (count * (count + 1) // 2)
+
+    @classmethod
+    def from_history(cls, history):
+        """由按时间排列的历史评估列表构建状态"""
+        state = cls()
+        for assessment in history:
+            state.update(assessment.get('dimension_scores', {}))
+        return state
+
+    def to_dict(self):
+        """序列化为可存入 JSONField 的字典"""
+        return {'assessment_count': self.assessment_count, 'dimensions': self.dimensions}
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 to_dict() 的结果恢复状态，data 为空时返回空状态"""
+        state = cls()
+        if data:
+            state.assessment_count = data['assessment_count']
+            state.dimensions = {dimension: list(value) for dimension, value in data['dimensions'].items()}
+        return state
 
 
 class ConversationManager:
@@ -294,21 +479,42 @@ class ConversationManager:
         # 在实际应用中，这将基于对话历史和患者状态更智能地选择
         return random.choice(self.question_templates)
     
-    def generate_response(self, patient_input, conversation_history=None):
+    @timed(PREDICTOR_LATENCY, operation='generate_response')
+    def generate_response(self, patient_input, conversation_history=None, patient_history=None):
         """
         根据患者输入生成回应
         
         Args:
             patient_input: 患者的输入文本
             conversation_history: 对话历史列表
+            patient_history: 患者的历史评估（列表或 PatientHistoryState，可选）
             
         Returns:
             response: 系统回应
             assessment: 基于患者输入的评估结果
         """
         # 预测患者状态
-        assessment = self.predictor.predict_from_text(patient_input)
+        assessment = self.predictor.predict_from_text(patient_input, patient_history)
+        
+        return self._compose_response(assessment), assessment
+    
+    @timed(PREDICTOR_LATENCY, operation='generate_responses')
+    def generate_responses(self, patient_inputs, patient_histories=None):
+        """
+        批量生成回应，评估部分通过 predictor.predict_batch 一次完成
         
+        Args:
+            patient_inputs: 患者输入文本列表
+            patient_histories: 与输入等长的患者历史评估列表（可选），元素可为 None
+            
+        Returns:
+            results: 与输入顺序对应的 (response, assessment) 列表
+        """
+        assessments = self.predictor.predict_batch(patient_inputs, patient_histories)
+        return [(self._compose_response(assessment), assessment) for assessment in assessments]
+    
+    def _compose_response(self, assessment):
+        """根据评估结果组合系统回应"""
         # 构建回应
         acknowledgment = random.choice(self.response_templates['acknowledgment'])
         
@@ -336,6 +542,4 @@ class ConversationManager:
             next_question = self.generate_question()
         
         # 组合回应
-        response = f"{acknowledgment} {encouragement}\n\n{next_question}"
-        
-        return response, assessment
+        return f"{acknowledgment} {encouragement}\n\n{next_question}"
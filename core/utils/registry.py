@@ -0,0 +1,182 @@
+"""
+预测器注册表模块：每个工作进程只构建一次预测器后端，并在各请求间共享
+"""
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from .predictor import DementiaPredictor
+from .prediction_cache import CachedPredictor
+
+
+class PredictorEntry:
+    """已加载的预测器实例及其加载信息"""
+
+    def __init__(self, name, version, instance, load_time, memory_bytes):
+        self.name = name
+        self.version = version
+        self.instance = instance
+        self.load_time = load_time
+        self.memory_bytes = memory_bytes
+        self.loaded_at = datetime.now()
+
+    def as_dict(self):
+        """以字典形式返回加载信息"""
+        return {
+            'name': self.name,
+            'version': self.version,
+            'load_time': round(self.load_time, 4),
+            'memory_bytes': self.memory_bytes,
+            'loaded_at': self.loaded_at.isoformat(),
+        }
+
+
+class PredictorRegistry:
+    """
+    进程级预测器注册表
+
+    - 每个后端在进程内只构建一次，之后所有线程共享同一实例
+    - 构建过程加锁，避免并发请求重复加载大模型
+    - swap() 在锁外构建新版本，再原子地替换引用；
+      正在处理中的请求仍持有旧实例，不会被中断
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, version='1'):
+        """
+        注册一个预测器后端
+
+        Args:
+            name: 后端名称
+            factory: 无参可调用对象，返回预测器实例
+            version: 版本标签
+        """
+        with self._lock:
+            self._factories[name] = (factory, version)
+
+    def get(self, name='rules'):
+        """获取共享的预测器实例，首次调用时构建"""
+        entry = self._entries.get(name)
+        if entry is None:
+            entry = self._load(name)
+        return entry.instance
+
+    def version(self, name='rules'):
+        """获取当前激活的版本标签"""
+        entry = self._entries.get(name)
+        if entry is None:
+            entry = self._load(name)
+        return entry.version
+
+    def _load(self, name):
+        """在锁内构建尚未加载的后端（双重检查）"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                if name not in self._factories:
+                    raise KeyError(f'Unknown predictor backend: {name}')
+                factory, version = self._factories[name]
+                entry = self._build(name, factory, version)
+                self._entries[name] = entry
+            return entry
+
+    def _build(self, name, factory, version):
+        """构建实例并记录加载耗时和内存占用"""
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            instance = factory()
+        finally:
+            load_time = time.perf_counter() - start
+            after, _ = tracemalloc.get_traced_memory()
+            if tracing:
+                tracemalloc.stop()
+        return PredictorEntry(name, version, instance, load_time, max(0, after - before))
+
+    def swap(self, name, factory, version):
+        """
+        以新版本替换后端
+
+        新实例在锁外构建，期间旧实例继续服务请求；构建完成后原子地替换引用。
+
+        Returns:
+            previous_version: 被替换的版本标签（若之前未加载则为 None）
+        """
+        entry = self._build(name, factory, version)
+        with self._lock:
+            previous = self._entries.get(name)
+            self._factories[name] = (factory, version)
+            self._entries[name] = entry
+        return previous.version if previous else None
+
+    def warm_up(self, names=None, sample_text='我今天感觉有点迷糊，想不起来刚才做了什么。'):
+        """
+        预先加载后端并执行一次预测，使首个请求无需承担加载开销
+
+        Args:
+            names: 需要预热的后端名称列表，默认全部
+            sample_text: 用于预热的示例文本
+        """
+        with self._lock:
+            names = list(names) if names is not None else list(self._factories)
+        for name in names:
+            instance = self.get(name)
+            if hasattr(instance, 'predict_from_text'):
+                instance.predict_from_text(sample_text)
+
+    def stats(self):
+        """返回所有已加载后端的加载信息（带缓存的后端附带缓存命中情况）"""
+        with self._lock:
+            entries = dict(self._entries)
+        stats = {}
+        for name, entry in entries.items():
+            stats[name] = entry.as_dict()
+            if hasattr(entry.instance, 'cache_stats'):
+                stats[name]['cache'] = entry.instance.cache_stats()
+        return stats
+
+
+def build_rules_predictor():
+    """构建规则引擎预测器，并按设置在其前面加上结果缓存"""
+    from django.conf import settings
+    predictor = DementiaPredictor()
+    cache_size = getattr(settings, 'PREDICTION_CACHE_SIZE', 0)
+    if not cache_size:
+        return predictor
+    return CachedPredictor(
+        predictor,
+        maxsize=cache_size,
+        ttl=getattr(settings, 'PREDICTION_CACHE_TTL', None),
+    )
+
+
+# 进程级默认注册表
+registry = PredictorRegistry()
+registry.register('rules', build_rules_predictor, version='rules-1')
+
+
+def warm_up_from_settings():
+    """
+    settings.PREDICTOR_WARMUP 为 True 时预热 settings.PREDICTOR_BACKEND
+
+    由 WSGI/ASGI 入口在服务进程启动时调用；管理命令不经过入口，不会加载预测器。
+    """
+    from django.conf import settings
+    if getattr(settings, 'PREDICTOR_WARMUP', False):
+        registry.warm_up([getattr(settings, 'PREDICTOR_BACKEND', 'rules')])
+
+
+def get_predictor(name=None):
+    """获取共享的预测器实例，未指定名称时使用 settings.PREDICTOR_BACKEND"""
+    if name is None:
+        from django.conf import settings
+        name = getattr(settings, 'PREDICTOR_BACKEND', 'rules')
+    return registry.get(name)
@@ -0,0 +1,234 @@
+"""
+批量报告生成模块：为大量评估生成描述性报告，可在进程池中并行，结果按评估和版本缓存
+"""
+import datetime
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from zoneinfo import ZoneInfo
+
+from .metrics import PREDICTOR_LATENCY, timed
+from .prediction_cache import PredictionCache
+from .predictor import REPORT_TEMPLATE_VERSION, render_report
+
+
+def _render_chunk(items):
+    """在子进程中生成一组报告；items 为 [(评估 id, 详细评估结果), ...]"""
+    return [render_report(results, assessment_id) for assessment_id, results in items]
+
+
+def report_input(severity, results):
+    """
+    由评估记录构造 render_report 的输入
+
+    详细结果中缺少严重程度或维度得分时（如后台手工录入的评估），使用评估记录上的严重程度、不列出观察。
+    """
+    return {'severity_category': severity, 'dimension_scores': {}, **(results or {})}
+
+
+def _fingerprint(results):
+    """
+    render_report 实际使用的输入（严重程度和按顺序排列的维度得分）
+
+    评估被重新评分或修改后与缓存中记录的不同，旧报告不再使用；
+    比对整个详细结果的哈希比生成报告本身还慢，因此只取这两项。
+    """
+    return results['severity_category'], tuple(results['dimension_scores'].items())
+
+
+def _local_isoformat(value, tz):
+    """数据库原始时间值（SQLite 中为 UTC 文本）转为本地时区的 ISO 格式"""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(tz).isoformat()
+
+
+def _jsonl_chunk(rows, tz_name):
+    """
+    在子进程中把一组评估格式化为 JSON Lines 文本
+
+    rows 为数据库原始行 (评估 id, 患者ID, 严重程度, 置信度, 评估日期, 详细结果 JSON 文本)；
+    解析 JSON、生成报告和序列化都在子进程中完成，主进程只负责读取和写出。
+    """
+    tz = ZoneInfo(tz_name)
+    lines = []
+    for assessment_id, patient_id, severity, confidence, date, results in rows:
+        if isinstance(results, str):
+            results = json.loads(results)
+        lines.append(json.dumps({
+            'assessment_id': assessment_id,
+            'patient_id': patient_id,
+            'assessment_date': _local_isoformat(date, tz),
+            'severity': severity,
+            'confidence': confidence,
+            'report': render_report(report_input(severity, results), assessment_id),
+        }, ensure_ascii=False) + '\n')
+    return ''.join(lines)
+
+
+class ReportEngine:
+    """
+    批量报告生成器
+
+    报告开头段落的模板按评估 id 选择（此前 generate_report 每次随机选择，同一评估刷新页面时开头会变化），
+    同一评估在同一版本下的报告固定不变，因此可以缓存。
+    缓存版本由规则集版本和报告模板版本组成，任一变化时整个缓存自动清空；
+    每条缓存还记录生成报告时的输入，评估被重新评分或修改后（包括在其他进程中）不会命中旧报告。
+
+    一批中未命中缓存的评估达到 min_parallel 条时，按 chunk_size 分组交给进程池并行生成；
+    数量较少时直接在当前进程生成，避免进程间传输的开销超过生成本身。
+
+    用法:
+        with ReportEngine(workers=4, rules_version=predictor.version) as engine:
+            for batch in batches:
+                reports = engine.render(batch)
+    """
+
+    def __init__(self, workers=None, chunk_size=500, min_parallel=5000, rules_version='',
+                 cache_size=100000, cache_ttl=None):
+        """
+        Args:
+            workers: 进程数，默认 CPU 核数；为 1 时不使用进程池
+            chunk_size: 每个子任务的评估条数
+            min_parallel: 一批中至少有多少条未命中时才使用进程池
+            rules_version: 规则集版本（如 DementiaPredictor.version）
+            cache_size: 缓存的报告条数，0 表示不缓存
+            cache_ttl: 缓存有效期（秒），为 None 时不过期
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.min_parallel = min_parallel
+        self.rules_version = rules_version
+        self.cache = PredictionCache(maxsize=cache_size, ttl=cache_ttl) if cache_size else None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return f'{self.rules_version}:{REPORT_TEMPLATE_VERSION}'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """关闭进程池"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def report(self, assessment_id, results):
+        """生成单个评估的报告"""
+        return self.render([(assessment_id, results)])[0]
+
+    @timed(PREDICTOR_LATENCY, operation='render_reports')
+    def render(self, items):
+        """
+        生成一批报告（Web 请求中的报告页面也经由此处生成，耗时记入 render_reports 指标）
+
+        Args:
+            items: [(评估 id, 详细评估结果), ...]
+
+        Returns:
+            与 items 顺序一致的报告列表
+        """
+        items = list(items)
+        reports = [None] * len(items)
+        missing = []
+        if self.cache is not None:
+            self.cache.ensure_version(self.version)
+            for index, (assessment_id, results) in enumerate(items):
+                cached = self.cache.get(assessment_id)
+                if cached is not None and cached[0] == _fingerprint(results):
+                    reports[index] = cached[1]
+                else:
+                    missing.append(index)
+        else:
+            missing = list(range(len(items)))
+        if not missing:
+            return reports
+
+        pending = [items[index] for index in missing]
+        if self.workers > 1 and len(pending) >= self.min_parallel:
+            chunks = [pending[start:start + self.chunk_size] for start in range(0, len(pending), self.chunk_size)]
+            rendered = [report for chunk in self._pool().map(_render_chunk, chunks) for report in chunk]
+        else:
+            rendered = _render_chunk(pending)
+
+        for index, report in zip(missing, rendered):
+            reports[index] = report
+            if self.cache is not None:
+                assessment_id, results = items[index]
+                self.cache.set(assessment_id, (_fingerprint(results), report))
+        return reports
+
+    def forget(self, assessment_id):
+        """丢弃某个评估的缓存报告"""
+        if self.cache is not None:
+            self.cache.delete(assessment_id)
+
+    def iter_jsonl(self, batches, tz_name):
+        """
+        把逐批读取的评估原始行格式化为 JSON Lines，按输入顺序逐段返回文本
+
+        每批按 chunk_size 分组提交给进程池，同时最多有 workers * 2 组在处理，
+        因此读取下一批与生成报告并行进行，内存占用与评估总数无关。workers 为 1 时在当前进程执行。
+
+        Args:
+            batches: 可迭代对象，每个元素为一批原始行（格式见 _jsonl_chunk）
+            tz_name: 输出日期使用的时区名称
+        """
+        if self.workers == 1:
+            for batch in batches:
+                yield _jsonl_chunk(batch, tz_name)
+            return
+        pool = self._pool()
+        pending = deque()
+        for batch in batches:
+            for start in range(0, len(batch), self.chunk_size):
+                pending.append(pool.submit(_jsonl_chunk, batch[start:start + self.chunk_size], tz_name))
+                while len(pending) > self.workers * 2:
+                    yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_report_engine():
+    """
+    获取进程内共享的报告生成器，规则集版本取当前预测器的版本
+
+    Web 进程中只生成单个报告，不使用进程池；结果在请求之间复用。
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from django.conf import settings
+                _engine = ReportEngine(workers=1, cache_size=getattr(settings, 'REPORT_CACHE_SIZE', 10000))
+    from .registry import get_predictor
+    _engine.rules_version = getattr(get_predictor(), 'version', '')
+    return _engine
+
+
+def forget_report(assessment_id):
+    """评估修改或删除后丢弃本进程中缓存的报告（报告生成器尚未创建时无需处理）"""
+    if _engine is not None:
+        _engine.forget(assessment_id)
@@ -0,0 +1,92 @@
+"""
+离线重新评分模块：规则更新后在进程池中用当前预测器重新评估历史患者消息
+"""
+import json
+import os
+import tempfile
+
+from .predictor import DementiaPredictor, PatientHistoryState
+from .rule_pack import RulePackSource, get_rule_pack_source
+
+_predictor = None
+
+
+def init_worker(rule_pack_path=None, compiled_dir=None):
+    """
+    进程池初始化函数：每个子进程只构建一次预测器
+
+    子进程以 spawn 方式启动时不继承 Django 设置，由主进程传入规则包路径，保证使用同一规则包。
+    """
+    global _predictor
+    source = RulePackSource(rule_pack_path, compiled_dir) if rule_pack_path else get_rule_pack_source()
+    _predictor = DementiaPredictor(source)
+
+
+def score_chunk(rows):
+    """
+    为一组患者的消息评分，按时间顺序重放每位患者的历史评估
+
+    与实时评分相同，每条消息按该患者此前全部评估的维度分数调整（见 PatientHistoryState），
+    此前的评估若也在本次重新评分，使用其新的维度分数。
+
+    Args:
+        rows: 按患者、评估时间排列的 [(患者 id, 消息 id, 消息内容, 维度分数), ...]，
+            包含这些患者的全部评估；消息 id 为 None 的评估无需重新评分，只以其维度分数计入历史
+
+    Returns:
+        ([(消息 id, 预测结果), ...], {患者 id: 重放后的历史评估状态字典})
+    """
+    if _predictor is None:
+        init_worker()
+    pack = _predictor.rule_pack
+    dimensions = pack.matcher.dimensions
+    # 规则特征与历史无关，整批提取；按历史调整必须逐条依次进行
+    features = iter(_predictor.batch_features(
+        [content for _, message_id, content, _ in rows if message_id is not None], pack).tolist())
+    predictions = []
+    states = {}
+    for patient_id, message_id, _, dimension_scores in rows:
+        state = states.setdefault(patient_id, PatientHistoryState())
+        if message_id is not None:
+            prediction = _predictor.predict_from_features(dict(zip(dimensions, next(features))), state, pack)
+            predictions.append((message_id, prediction))
+            dimension_scores = prediction['dimension_scores']
+        state.update(dimension_scores)
+    return predictions, {patient_id: state.to_dict() for patient_id, state in states.items()}
+
+
+class Checkpoint:
+    """
+    保存在 JSON 文件中的进度检查点
+
+    写入时先写临时文件再原子替换，进程在任何时刻中断都不会留下不完整的检查点。
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """返回保存的状态，文件不存在或无法解析时返回 None"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, state):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
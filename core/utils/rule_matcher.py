@@ -0,0 +1,215 @@
+"""
+规则匹配模块：将规则表编译为 Aho-Corasick 自动机，一次扫描文本即可为所有维度评分
+"""
+from array import array
+from bisect import bisect_left
+
+
+class RuleMatcher:
+    """
+    多模式规则匹配器
+
+    将 {维度: [{'pattern': ..., 'score': ...}, ...]} 形式的规则表编译为一个
+    Aho-Corasick 自动机。匹配时只需对小写化后的文本扫描一遍，
+    耗时与文本长度和命中规则数相关，而与规则总数无关。
+    """
+
+    def __init__(self, rules, default_score=0.1):
+        """
+        Args:
+            rules: 维度到规则列表的字典
+            default_score: 维度无任何命中时的基础分数
+        """
+        self.default_score = default_score
+        self.dimensions = list(rules.keys())
+
+        # 规则按 (维度顺序, 规则顺序) 编号，保证求和顺序与逐条匹配一致
+        self.rule_dimension = []
+        self.rule_score = []
+
+        # 自动机：goto[node] 为字符到子节点的字典，fail[node] 为失败指针，
+        # output[node] 为在该节点结束的所有规则编号（已合并失败链上的输出）
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for dim_index, dimension in enumerate(self.dimensions):
+            for rule in rules[dimension]:
+                rule_id = len(self.rule_score)
+                self.rule_dimension.append(dim_index)
+                self.rule_score.append(rule['score'])
+                self._insert(rule['pattern'].lower(), rule_id)
+
+        self._build_failure_links()
+        self.output = [tuple(out) for out in self.output]
+
+    def __len__(self):
+        return len(self.rule_score)
+
+    def _insert(self, pattern, rule_id):
+        """将一个模式插入字典树"""
+        node = 0
+        for ch in pattern:
+            next_node = self.goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][ch] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = next_node
+        self.output[node].append(rule_id)
+
+    def _build_failure_links(self):
+        """按广度优先顺序构建失败指针并合并输出"""
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                self.output[child].extend(self.output[self.fail[child]])
+
+    def to_arrays(self):
+        """
+        把自动机展开为扁平的整数/浮点数组，供 PackedRuleMatcher 使用
+
+        每个节点的转移按字符码位升序存放在 edge_char/edge_target 的
+        [edge_start[node], edge_start[node + 1]) 区间，输出同理。
+        """
+        arrays = {name: array('i') for name in ('edge_start', 'edge_target', 'fail', 'out_start', 'out_rules')}
+        arrays['edge_char'] = array('I')
+        for node, edges in enumerate(self.goto):
+            arrays['edge_start'].append(len(arrays['edge_char']))
+            arrays['out_start'].append(len(arrays['out_rules']))
+            for ch in sorted(edges):
+                arrays['edge_char'].append(ord(ch))
+                arrays['edge_target'].append(edges[ch])
+            arrays['out_rules'].extend(self.output[node])
+        arrays['edge_start'].append(len(arrays['edge_char']))
+        arrays['out_start'].append(len(arrays['out_rules']))
+        arrays['fail'].extend(self.fail)
+        arrays['rule_dimension'] = array('i', self.rule_dimension)
+        arrays['rule_score'] = array('d', self.rule_score)
+        return arrays
+
+    def find_rule_ids(self, text):
+        """
+        扫描文本，返回所有命中规则的编号集合
+
+        Args:
+            text: 已小写化的文本
+
+        Returns:
+            hits: 命中规则编号的集合
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+
+        # 空模式在任何文本中都成立
+        hits = set(output[0])
+        visited = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if node and node not in visited:
+                # 同一节点的输出只需收集一次
+                visited.add(node)
+                hits.update(output[node])
+        return hits
+
+    def score(self, text):
+        """
+        为文本计算各维度的平均命中分数
+
+        Args:
+            text: 原始文本
+
+        Returns:
+            features: 维度到分数的字典，结果与逐条规则匹配完全一致
+        """
+        sums = [0] * len(self.dimensions)
+        counts = [0] * len(self.dimensions)
+
+        for rule_id in sorted(self.find_rule_ids(text.lower())):
+            dim_index = self.rule_dimension[rule_id]
+            sums[dim_index] += self.rule_score[rule_id]
+            counts[dim_index] += 1
+
+        features = {}
+        for dim_index, dimension in enumerate(self.dimensions):
+            if counts[dim_index] > 0:
+                features[dimension] = sums[dim_index] / counts[dim_index]
+            else:
+                features[dimension] = self.default_score
+        return features
+
+
+class PackedRuleMatcher(RuleMatcher):
+    """
+    基于扁平数组的规则匹配器
+
+    数组可以是直接映射到文件的 memoryview（见 core.utils.rule_pack），
+    多个进程映射同一个文件时共享同一份物理内存。匹配结果与 RuleMatcher 完全一致；
+    每次转移需在节点的转移区间内二分查找，比字典查找略慢。
+    """
+
+    def __init__(self, arrays, dimensions, default_score=0.1):
+        """
+        Args:
+            arrays: RuleMatcher.to_arrays() 返回的数组（或同样布局的 memoryview）
+            dimensions: 维度名称列表，顺序与编译时一致
+            default_score: 维度无任何命中时的基础分数
+        """
+        self.default_score = default_score
+        self.dimensions = list(dimensions)
+        self.edge_start = arrays['edge_start']
+        self.edge_char = arrays['edge_char']
+        self.edge_target = arrays['edge_target']
+        self.fail = arrays['fail']
+        self.out_start = arrays['out_start']
+        self.out_rules = arrays['out_rules']
+        self.rule_dimension = arrays['rule_dimension']
+        self.rule_score = arrays['rule_score']
+        # 大部分字符都从根节点出发转移，根节点的转移表在进程内展开为字典（只有首字符数量个条目）
+        start, end = self.edge_start[0], self.edge_start[1]
+        self.root = dict(zip(self.edge_char[start:end].tolist(), self.edge_target[start:end].tolist()))
+
+    def find_rule_ids(self, text):
+        """扫描已小写化的文本，返回所有命中规则的编号集合"""
+        edge_start = self.edge_start
+        edge_char = self.edge_char
+        edge_target = self.edge_target
+        fail = self.fail
+        out_start = self.out_start
+        out_rules = self.out_rules
+        root = self.root
+
+        hits = set(out_rules[out_start[0]:out_start[1]])
+        visited = set()
+        node = 0
+        for ch in text:
+            code = ord(ch)
+            while node:
+                lo = edge_start[node]
+                hi = edge_start[node + 1]
+                index = bisect_left(edge_char, code, lo, hi)
+                if index < hi and edge_char[index] == code:
+                    node = edge_target[index]
+                    break
+                node = fail[node]
+            else:
+                node = root.get(code, 0)
+            if node and node not in visited:
+                visited.add(node)
+                hits.update(out_rules[out_start[node]:out_start[node + 1]])
+        return hits
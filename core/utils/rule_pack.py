@@ -0,0 +1,253 @@
+"""
+规则包模块：从外部 JSON 文件加载带版本的评估规则，编译为可内存映射的二进制文件，并在文件变化时热替换
+
+规则包源文件（默认 rules/rules.json）格式:
+    {
+        "version": "1.0",
+        "dimensions": {"memory": 0.3, ...},              # 维度及其权重，顺序即求和顺序
+        "severity_thresholds": {"normal": [0.0, 0.2], ...},
+        "default_score": 0.1,                            # 维度无任何命中时的基础分数
+        "rules": {"memory": [{"pattern": "忘记", "score": 0.6}, ...], ...}
+    }
+
+编译结果按内容哈希命名保存在 RULE_PACK_COMPILED_DIR 中，同一台机器上的多个工作进程
+映射同一个文件，自动机只占一份物理内存；先编译完成的进程写入文件，其余进程直接映射。
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from .rule_matcher import PackedRuleMatcher, RuleMatcher
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_RULE_PACK = os.path.join(_BASE_DIR, 'rules', 'rules.json')
+DEFAULT_COMPILED_DIR = os.path.join(_BASE_DIR, 'cache', 'rules')
+
+MAGIC = b'TRPK0001'
+# 文件头：魔数 + 元数据 JSON 的字节数；其后依次是元数据和按 8 字节对齐的各数组
+HEADER = struct.Struct('<8sQ')
+# 数组名称及其 array/memoryview 类型码
+ARRAY_TYPES = {
+    'edge_start': 'i', 'edge_char': 'I', 'edge_target': 'i', 'fail': 'i',
+    'out_start': 'i', 'out_rules': 'i', 'rule_dimension': 'i', 'rule_score': 'd',
+}
+
+
+class RulePackError(ValueError):
+    """规则包格式错误"""
+
+
+def _fingerprint(source):
+    """规则内容的哈希，与缩进、说明文字等无关"""
+    content = [source['rules'], source['dimensions'], source['severity_thresholds'], source['default_score']]
+    return hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def load_source(path):
+    """
+    读取并校验规则包源文件
+
+    Returns:
+        规则包字典，附加 'fingerprint'（内容哈希）
+
+    Raises:
+        RulePackError: 文件无法解析或缺少必需的字段
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            source = json.load(f)
+    except ValueError as e:
+        raise RulePackError(f'{path}: invalid JSON: {e}') from e
+    if not isinstance(source, dict):
+        raise RulePackError(f'{path}: rule pack must be a JSON object')
+
+    version = source.get('version')
+    if not isinstance(version, str) or not version or len(version) > 32:
+        raise RulePackError(f'{path}: "version" must be a non-empty string of at most 32 characters')
+    dimensions = source.get('dimensions')
+    if not isinstance(dimensions, dict) or not dimensions:
+        raise RulePackError(f'{path}: "dimensions" must map dimension names to weights')
+    thresholds = source.get('severity_thresholds')
+    if not isinstance(thresholds, dict) or not all(
+            isinstance(bounds, list) and len(bounds) == 2 for bounds in thresholds.values()):
+        raise RulePackError(f'{path}: "severity_thresholds" must map categories to [lower, upper]')
+    rules = source.get('rules')
+    if not isinstance(rules, dict):
+        raise RulePackError(f'{path}: "rules" must map dimension names to rule lists')
+    for dimension, dimension_rules in rules.items():
+        if not isinstance(dimension_rules, list) or not all(
+                isinstance(rule, dict) and isinstance(rule.get('pattern'), str)
+                and isinstance(rule.get('score'), (int, float)) for rule in dimension_rules):
+            raise RulePackError(f'{path}: rules for "{dimension}" must be a list of {{"pattern", "score"}} objects')
+    source.setdefault('default_score', 0.1)
+    source['fingerprint'] = _fingerprint(source)
+    return source
+
+
+def compile_pack(source, directory):
+    """
+    把规则包编译为二进制文件，返回文件路径；同样内容的编译结果已存在时直接返回
+
+    先写临时文件再原子替换，多个进程同时编译同一规则包也不会读到不完整的文件。
+    """
+    path = os.path.join(directory, f'{source["fingerprint"]}.rpk')
+    if os.path.exists(path):
+        return path
+
+    arrays = RuleMatcher(source['rules'], default_score=source['default_score']).to_arrays()
+    layout = {}
+    offset = 0
+    for name in ARRAY_TYPES:
+        layout[name] = [offset, len(arrays[name])]
+        offset += -(-len(arrays[name]) * arrays[name].itemsize // 8) * 8
+    meta = {
+        'version': source['version'],
+        'fingerprint': source['fingerprint'],
+        'dimensions': source['dimensions'],
+        'severity_thresholds': source['severity_thresholds'],
+        'default_score': source['default_score'],
+        'rules': source['rules'],
+        'arrays': layout,
+    }
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    meta_bytes += b' ' * (-(HEADER.size + len(meta_bytes)) % 8)
+
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rulepack-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(meta_bytes)))
+            f.write(meta_bytes)
+            for name in ARRAY_TYPES:
+                data = arrays[name].tobytes()
+                f.write(data + b'\0' * (-len(data) % 8))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+class RulePack:
+    """
+    已编译的规则包
+
+    自动机数组是只读映射文件的 memoryview，不复制到进程内存中。
+    实例不可变，替换规则包时创建新实例，正在使用旧实例的请求不受影响。
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise RulePackError(f'{path}: not a compiled rule pack')
+        meta = json.loads(self._mmap[HEADER.size:HEADER.size + meta_size].decode('utf-8'))
+        buffer = memoryview(self._mmap)[HEADER.size + meta_size:]
+        arrays = {}
+        for name, typecode in ARRAY_TYPES.items():
+            offset, count = meta['arrays'][name]
+            itemsize = struct.calcsize(typecode)
+            arrays[name] = buffer[offset:offset + count * itemsize].cast(typecode)
+
+        self.path = path
+        self.fingerprint = meta['fingerprint']
+        # 规则包声明的版本加内容哈希：修改规则但忘记改版本号时，缓存和评估记录仍能区分
+        self.version = f'rules-{meta["version"]}+{self.fingerprint[:8]}'
+        self.dimensions = meta['dimensions']
+        self.severity_thresholds = {
+            category: tuple(bounds) for category, bounds in meta['severity_thresholds'].items()
+        }
+        self.default_score = meta['default_score']
+        self.rules = meta['rules']
+        self.matcher = PackedRuleMatcher(arrays, list(self.rules), default_score=self.default_score)
+
+
+class RulePackSource:
+    """
+    当前生效的规则包
+
+    current() 至多每 check_interval 秒检查一次源文件的修改时间和大小，
+    变化时重新加载并编译，然后原子地替换引用；新规则包有错误时记录日志并继续使用旧规则包。
+    """
+
+    def __init__(self, path=DEFAULT_RULE_PACK, compiled_dir=DEFAULT_COMPILED_DIR, check_interval=5.0):
+        """
+        Args:
+            path: 规则包源文件路径
+            compiled_dir: 编译结果目录
+            check_interval: 检查源文件变化的最短间隔（秒），0 表示每次都检查
+        """
+        self.path = str(path)
+        self.compiled_dir = str(compiled_dir)
+        self.check_interval = check_interval
+        self.pack = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """返回当前规则包，必要时先重新加载"""
+        if self.pack is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self._refresh()
+        return self.pack
+
+    def _refresh(self):
+        # 已有规则包时，其他线程正在重新加载就直接使用当前规则包，不排队等待编译
+        if not self._lock.acquire(blocking=self.pack is None):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            signature = None
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if self.pack is not None and signature == self._signature:
+                    return
+                source = load_source(self.path)
+                pack = self.pack
+                if pack is None or pack.fingerprint != source['fingerprint']:
+                    pack = RulePack(compile_pack(source, self.compiled_dir))
+            except (OSError, RulePackError) as e:
+                if self.pack is None:
+                    raise
+                logger.error('failed to reload rule pack, keeping %s: %s', self.pack.version, e)
+            else:
+                if self.pack is not None and pack is not self.pack:
+                    logger.info('rule pack %s: %s -> %s', self.path, self.pack.version, pack.version)
+                self.pack = pack
+            # 加载失败时也记录签名，文件再次变化前不重复尝试
+            self._signature = signature
+        finally:
+            self._lock.release()
+
+
+_source = None
+_source_lock = threading.Lock()
+
+
+def get_rule_pack_source():
+    """获取进程内共享的规则包来源（settings.RULE_PACK_PATH 等；未配置 Django 时使用默认规则包）"""
+    global _source
+    if _source is None:
+        with _source_lock:
+            if _source is None:
+                from django.conf import settings
+                options = {}
+                if settings.configured:
+                    options = {
+                        'path': getattr(settings, 'RULE_PACK_PATH', DEFAULT_RULE_PACK),
+                        'compiled_dir': getattr(settings, 'RULE_PACK_COMPILED_DIR', DEFAULT_COMPILED_DIR),
+                        'check_interval': getattr(settings, 'RULE_PACK_CHECK_INTERVAL', 5.0),
+                    }
+                _source = RulePackSource(**options)
+    return _source
@@ -4,6 +4,29 @@
 import re
 import numpy as np
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from .metrics import TEXT_PROCESSING, timed
+from .trends import linear_trends, rolling_trends, to_day_offsets
+
+# 预处理与分句使用的正则表达式（模块级预编译）
+WHITESPACE_RE = re.compile(r'\s+')
+SPECIAL_CHAR_RE = re.compile(r'[^\w\s,.!?;:，。！？；：]')
+SENTENCE_SPLIT_RE = re.compile(r'[.!?。！？]')
+
+
+def _preprocess(text):
+    """转为小写、合并空白并移除特殊字符（保留标点符号）"""
+    # 转为小写
+    text = text.lower()
+    
+    # 移除多余空格
+    text = WHITESPACE_RE.sub(' ', text).strip()
+    
+    # 移除特殊字符（保留标点符号）
+    text = SPECIAL_CHAR_RE.sub('', text)
+    
+    return text
 
 
 class TextProcessor:
@@ -24,60 +47,108 @@ class TextProcessor:
             'place_disorientation': ['这里', '那里', '在哪里', '这是哪里', '回家', '医院'],
             'memory_issue': ['忘了', '记不起来', '想不起来', '不记得', '记得', '前几天'],
         }
+        
+        # 代词列表，用于计算代词使用比例
+        self.pronouns = ['我', '你', '他', '她', '它', '我們', '你們', '他們', '她們', '它們',
+                         '这个', '那个', '这些', '那些']
+        
+        self.compile()
+    
+    def compile(self):
+        """
+        预编译特征流水线：正则表达式、代词集合以及特征矩阵的列定义
+        修改 patterns、semantic_indicators 或 pronouns 后需重新调用
+        """
+        self.compiled_patterns = [
+            (name, re.compile(pattern)) for name, pattern in self.patterns.items()
+        ]
+        self.pronoun_set = frozenset(self.pronouns)
+        self.feature_columns = (
+            ['word_count', 'char_count', 'sentence_count', 'avg_words_per_sentence']
+            + [f'{name}_count' for name in self.patterns]
+            + [f'{category}_score' for category in self.semantic_indicators]
+            + ['lexical_diversity', 'pronoun_ratio']
+        )
     
+    @timed(TEXT_PROCESSING, stage='preprocess_text')
     def preprocess_text(self, text):
         """预处理文本"""
-        # 转为小写
-        text = text.lower()
-        
-        # 移除多余空格
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        # 移除特殊字符（保留标点符号）
-        text = re.sub(r'[^\w\s,.!?;:，。！？；：]', '', text)
-        
-        return text
+        return _preprocess(text)
     
-    def extract_features(self, text):
-        """从文本中提取潜在的失智症语言特征"""
-        preprocessed_text = self.preprocess_text(text)
-        features = {}
-        
-        # 文本基本统计特征
-        features['word_count'] = len(preprocessed_text.split())
-        features['char_count'] = len(preprocessed_text)
-        features['sentence_count'] = len(re.split(r'[.!?。！？]', preprocessed_text)) - 1
+    def _feature_vector(self, text):
+        """
+        编译模式下的特征提取：每条文本只预处理和分词一次
         
-        if features['sentence_count'] <= 0:
-            features['sentence_count'] = 1
+        Returns:
+            values: 与 self.feature_columns 顺序一致的特征值列表
+        """
+        # 逐条特征提取的内层循环不单独计时，耗时计入外层阶段
+        preprocessed_text = _preprocess(text)
+        words = preprocessed_text.split()
+        word_count = len(words)
         
-        features['avg_words_per_sentence'] = features['word_count'] / features['sentence_count']
+        # 文本基本统计特征
+        sentence_count = len(SENTENCE_SPLIT_RE.split(preprocessed_text)) - 1
+        if sentence_count <= 0:
+            sentence_count = 1
+        values = [word_count, len(preprocessed_text), sentence_count, word_count / sentence_count]
         
         # 分析语言错误模式
-        for pattern_name, pattern in self.patterns.items():
-            matches = re.findall(pattern, preprocessed_text)
-            features[f'{pattern_name}_count'] = len(matches)
+        for _, regex in self.compiled_patterns:
+            values.append(len(regex.findall(preprocessed_text)))
         
         # 分析语义指标
-        for category, keywords in self.semantic_indicators.items():
-            count = sum(1 for keyword in keywords if keyword in preprocessed_text)
-            features[f'{category}_score'] = count
+        for keywords in self.semantic_indicators.values():
+            values.append(sum(1 for keyword in keywords if keyword in preprocessed_text))
         
         # 词汇多样性（不同词汇占总词汇的比例）
-        words = preprocessed_text.split()
-        if words:
-            features['lexical_diversity'] = len(set(words)) / len(words)
-        else:
-            features['lexical_diversity'] = 0
-            
+        values.append(len(set(words)) / word_count if words else 0)
+        
         # 代词使用比例
-        pronouns = ['我', '你', '他', '她', '它', '我們', '你們', '他們', '她們', '它們',
-                    '这个', '那个', '这些', '那些']
-        pronoun_count = sum(1 for word in words if word in pronouns)
-        features['pronoun_ratio'] = pronoun_count / max(1, features['word_count'])
+        pronoun_set = self.pronoun_set
+        pronoun_count = sum(1 for word in words if word in pronoun_set)
+        values.append(pronoun_count / max(1, word_count))
         
-        return features
+        return values
+    
+    @timed(TEXT_PROCESSING, stage='extract_features_batch')
+    def extract_features_batch(self, texts, processes=None, chunk_size=2000, dtype=np.float32):
+        """
+        批量提取特征，返回固定列的 float32 特征矩阵
+        
+        Args:
+            texts: 文本列表
+            processes: 进程池大小；为 None 或 1 时在当前进程内计算
+            chunk_size: 分发给每个子进程的文本数量
+            dtype: 特征矩阵的数据类型
+            
+        Returns:
+            matrix: 形状为 (len(texts), len(columns)) 的特征矩阵（默认 float32）
+            columns: 列名列表，与 extract_features 返回的键一致
+        """
+        texts = list(texts)
+        columns = list(self.feature_columns)
+        matrix = np.zeros((len(texts), len(columns)), dtype=dtype)
+        
+        if processes and processes > 1 and len(texts) > chunk_size:
+            chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                row = 0
+                for block in executor.map(_extract_chunk, [self] * len(chunks), chunks):
+                    matrix[row:row + len(block)] = block
+                    row += len(block)
+        else:
+            for row, text in enumerate(texts):
+                matrix[row] = self._feature_vector(text)
+        
+        return matrix, columns
     
+    @timed(TEXT_PROCESSING, stage='extract_features')
+    def extract_features(self, text):
+        """从文本中提取潜在的失智症语言特征"""
+        return dict(zip(self.feature_columns, self._feature_vector(text)))
+    
+    @timed(TEXT_PROCESSING, stage='analyze_response_coherence')
     def analyze_response_coherence(self, question, answer):
         """分析问题与回答之间的连贯性"""
         # 这里简化了分析逻辑，实际应用中可能需要更复杂的自然语言处理
@@ -98,12 +169,55 @@ class TextProcessor:
             'response_length': len(answer_keywords)
         }
     
-    def compute_language_decline_indicators(self, text_samples):
+    # 语言能力下降指标及其对应的特征列；direction 为 1 表示数值上升代表下降
+    DECLINE_METRICS = [
+        ('lexical_diversity_change', 'lexical_diversity', -1),
+        ('sentence_length_change', 'avg_words_per_sentence', -1),
+        ('repetition_change', 'repetition_count', 1),
+        ('confusion_change', 'confused_reference_count', 1),
+    ]
+    
+    def _decline_matrix(self, text_samples, timestamps=None, last_n=None, last_days=None):
+        """
+        截取窗口内的样本并提取下降指标所需的特征矩阵
+        
+        Returns:
+            values: 形状为 (样本数, 指标数) 的 float64 矩阵
+            x: 样本横坐标（有时间戳时为天数，否则为 None 表示样本序号）
+        """
+        text_samples = list(text_samples)
+        x = to_day_offsets(timestamps) if timestamps is not None else None
+        if x is not None and len(x) != len(text_samples):
+            raise ValueError('timestamps must have the same length as text_samples')
+        
+        start = 0
+        if last_n is not None:
+            start = max(start, len(text_samples) - last_n)
+        if last_days is not None:
+            if x is None:
+                raise ValueError('last_days requires timestamps')
+            start = max(start, int(np.searchsorted(x, x[-1] - last_days, side='left')))
+        text_samples = text_samples[start:]
+        if x is not None:
+            x = x[start:]
+        
+        # 只为窗口内的样本提取特征，并只保留所需的列
+        matrix, columns = self.extract_features_batch(text_samples, dtype=np.float64)
+        column_index = [columns.index(column) for _, column, _ in self.DECLINE_METRICS]
+        return matrix[:, column_index], x
+    
+    @timed(TEXT_PROCESSING, stage='compute_language_decline_indicators')
+    def compute_language_decline_indicators(self, text_samples, timestamps=None,
+                                            last_n=None, last_days=None):
         """
         计算一系列文本样本中可能表明语言能力下降的指标
         
         Args:
             text_samples: 时间序列排序的文本样本列表
+            timestamps: 各样本的时间戳（可选，datetime 或秒）；提供时按实际时间间隔
+                        计算斜率，单位为每天，否则按样本序号计算
+            last_n: 只使用最近 N 个样本（可选）
+            last_days: 只使用最近 N 天内的样本（可选，需要 timestamps）
             
         Returns:
             decline_metrics: 语言能力下降指标的字典
@@ -111,25 +225,20 @@ class TextProcessor:
         if not text_samples or len(text_samples) < 2:
             return {'sufficient_data': False}
         
-        # 提取每个样本的特征
-        features_over_time = [self.extract_features(text) for text in text_samples]
-        
-        # 计算关键指标随时间的变化
-        decline_metrics = {
-            'sufficient_data': True,
-            'lexical_diversity_change': self._compute_trend([f['lexical_diversity'] for f in features_over_time]),
-            'sentence_length_change': self._compute_trend([f['avg_words_per_sentence'] for f in features_over_time]),
-            'repetition_change': self._compute_trend([f['repetition_count'] for f in features_over_time]),
-            'confusion_change': self._compute_trend([
-                f['confused_reference_count'] for f in features_over_time
-            ]),
-        }
+        values, x = self._decline_matrix(text_samples, timestamps, last_n, last_days)
+        if len(values) < 2:
+            return {'sufficient_data': False}
+        
+        # 一次性计算所有指标随时间的变化斜率
+        slopes = linear_trends(values, x)
+        decline_metrics = {'sufficient_data': True}
+        for (name, _, _), slope in zip(self.DECLINE_METRICS, slopes.tolist()):
+            decline_metrics[name] = slope
         
         # 汇总变化指标以得出总体下降评分
         negative_indicators = [
-            v for k, v in decline_metrics.items() 
-            if k.endswith('_change') and ((k.startswith('repetition') or k.startswith('confusion')) and v > 0 
-                                       or (not k.startswith('repetition') and not k.startswith('confusion')) and v < 0)
+            decline_metrics[name] for name, _, direction in self.DECLINE_METRICS
+            if decline_metrics[name] * direction > 0
         ]
         
         if negative_indicators:
@@ -139,6 +248,26 @@ class TextProcessor:
             
         return decline_metrics
     
+    @timed(TEXT_PROCESSING, stage='compute_rolling_decline_indicators')
+    def compute_rolling_decline_indicators(self, text_samples, window, timestamps=None):
+        """
+        计算滑动窗口内的语言能力下降趋势
+        
+        Args:
+            text_samples: 时间序列排序的文本样本列表
+            window: 每个窗口包含的样本数
+            timestamps: 各样本的时间戳（可选），用法同 compute_language_decline_indicators
+            
+        Returns:
+            rolling_metrics: 指标名到斜率列表的字典，第 i 个元素对应
+                             以第 i + window - 1 个样本结尾的窗口
+        """
+        values, x = self._decline_matrix(text_samples, timestamps)
+        slopes = rolling_trends(values, window, x)
+        return {
+            name: slopes[:, i].tolist() for i, (name, _, _) in enumerate(self.DECLINE_METRICS)
+        }
+    
     def _compute_trend(self, values):
         """
         计算数值序列的趋势斜率
@@ -146,10 +275,131 @@ class TextProcessor:
         """
         if not values or len(values) < 2:
             return 0
-            
-        x = np.array(range(len(values)))
-        y = np.array(values)
         
         # 简单线性回归得到斜率
-        slope = np.polyfit(x, y, 1)[0]
-        return slope
+        return float(linear_trends(values)[0])
+
+def _extract_chunk(processor, texts):
+    """进程池工作函数：为一批文本计算特征矩阵"""
+    return np.array([processor._feature_vector(text) for text in texts], dtype=np.float64)
+
+
+class ConversationFeatureState:
+    """
+    对话级增量特征累加器
+
+    保存整段对话的累计统计量（词数、字符数、句子数、各错误模式计数、
+    语义指标命中、词汇表等），每收到一条新消息只需处理该消息本身，
+    即可随时得到对话级特征而无需重新扫描全部历史消息。
+    各计数按消息分别统计后累加，因此跨消息边界的模式不会被计入。
+    状态可通过 to_dict()/from_dict() 序列化为 JSON，以便跨请求保存；序列化结果只含计数
+    （词汇表只保存不同词的数量），大小与对话长度无关。恢复后的状态不含词汇表，
+    update() 需由调用方判断哪些词首次出现（见 Conversation.update_feature_state）。
+    """
+    
+    def __init__(self, processor=None):
+        """初始化空的累加状态"""
+        self.processor = processor or TextProcessor()
+        self.message_count = 0
+        self.word_count = 0
+        self.char_count = 0
+        self.sentence_count = 0
+        self.pronoun_count = 0
+        self.pattern_counts = {name: 0 for name in self.processor.patterns}
+        # 每个语义类别中出现过的关键词集合
+        self.semantic_hits = {category: set() for category in self.processor.semantic_indicators}
+        # 出现过的词；从 to_dict() 恢复的状态为 None，只有不同词的数量
+        self.vocabulary = set()
+        self.vocabulary_size = 0
+    
+    @timed(TEXT_PROCESSING, stage='feature_state_update')
+    def update(self, text, new_words=None):
+        """
+        累加一条新消息的统计量，耗时仅与该消息长度相关
+        
+        Args:
+            text: 患者消息
+            new_words: 可选，接收本条消息中不同词的集合，记录其中首次出现的词并返回其数量；
+                词汇表不在内存中（从 to_dict() 恢复）时必须提供
+        """
+        preprocessed_text = _preprocess(text)
+        words = preprocessed_text.split()
+        
+        self.message_count += 1
+        self.word_count += len(words)
+        self.char_count += len(preprocessed_text)
+        self.sentence_count += len(SENTENCE_SPLIT_RE.split(preprocessed_text)) - 1
+        
+        for pattern_name, regex in self.processor.compiled_patterns:
+            self.pattern_counts[pattern_name] += len(regex.findall(preprocessed_text))
+        
+        for category, keywords in self.processor.semantic_indicators.items():
+            self.semantic_hits[category].update(
+                keyword for keyword in keywords if keyword in preprocessed_text
+            )
+        
+        unique_words = set(words)
+        if new_words is not None:
+            self.vocabulary_size += new_words(unique_words)
+        elif self.vocabulary is None:
+            raise ValueError('vocabulary is not loaded; pass new_words to update()')
+        else:
+            unique_words -= self.vocabulary
+            self.vocabulary.update(unique_words)
+            self.vocabulary_size += len(unique_words)
+        self.pronoun_count += sum(1 for word in words if word in self.processor.pronoun_set)
+        return self
+    
+    def features(self):
+        """返回与 TextProcessor.extract_features 同名的对话级特征"""
+        features = {}
+        features['word_count'] = self.word_count
+        features['char_count'] = self.char_count
+        features['sentence_count'] = max(1, self.sentence_count)
+        features['avg_words_per_sentence'] = features['word_count'] / features['sentence_count']
+        
+        for pattern_name, count in self.pattern_counts.items():
+            features[f'{pattern_name}_count'] = count
+        
+        for category, hits in self.semantic_hits.items():
+            features[f'{category}_score'] = len(hits)
+        
+        if self.word_count:
+            features['lexical_diversity'] = self.vocabulary_size / self.word_count
+        else:
+            features['lexical_diversity'] = 0
+        
+        features['pronoun_ratio'] = self.pronoun_count / max(1, self.word_count)
+        return features
+    
+    def to_dict(self):
+        """序列化为可存入 JSONField 的字典"""
+        return {
+            'message_count': self.message_count,
+            'word_count': self.word_count,
+            'char_count': self.char_count,
+            'sentence_count': self.sentence_count,
+            'pronoun_count': self.pronoun_count,
+            'pattern_counts': dict(self.pattern_counts),
+            # 每个类别的命中至多为该类别的关键词，排序开销与对话长度无关
+            'semantic_hits': {k: sorted(v) for k, v in self.semantic_hits.items()},
+            'vocabulary_size': self.vocabulary_size,
+        }
+    
+    @classmethod
+    def from_dict(cls, data, processor=None):
+        """从 to_dict() 的结果恢复状态（不含词汇表）；空字典得到初始状态"""
+        state = cls(processor)
+        if not data:
+            return state
+        state.message_count = data.get('message_count', 0)
+        state.word_count = data.get('word_count', 0)
+        state.char_count = data.get('char_count', 0)
+        state.sentence_count = data.get('sentence_count', 0)
+        state.pronoun_count = data.get('pronoun_count', 0)
+        state.pattern_counts.update(data.get('pattern_counts', {}))
+        for category, hits in data.get('semantic_hits', {}).items():
+            state.semantic_hits.setdefault(category, set()).update(hits)
+        state.vocabulary = None
+        state.vocabulary_size = data.get('vocabulary_size', 0)
+        return state
@@ -0,0 +1,53 @@
+"""
+时间序列降采样模块：用于在服务端压缩图表数据点
+"""
+import numpy as np
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样
+
+    在保留序列视觉形状（峰值、拐点）的前提下选出 threshold 个点。
+    首尾两个点总是保留。
+
+    Args:
+        x: 单调递增的横坐标序列
+        y: 纵坐标序列
+        threshold: 目标点数
+
+    Returns:
+        indices: 被选中数据点的下标数组（升序）
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= threshold:
+        return np.arange(n)
+    if threshold < 3:
+        raise ValueError('threshold must be at least 3')
+
+    # 中间 n - 2 个点分成 threshold - 2 个桶
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.intp)
+    indices = np.empty(threshold, dtype=np.intp)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # 下一个桶的平均点（最后一个桶使用末尾点）
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # 选出与前一个选中点和下一桶平均点构成最大三角形的点
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - avg_x) * (y[start:end] - py) - (px - x[start:end]) * (avg_y - py))
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+
+    return indices
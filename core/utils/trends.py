@@ -0,0 +1,102 @@
+"""
+趋势计算模块：以闭式最小二乘一次性计算特征矩阵各列的线性趋势斜率
+"""
+from datetime import datetime
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+
+
+def to_day_offsets(timestamps):
+    """
+    将时间戳序列转换为相对首个样本的天数
+
+    Args:
+        timestamps: datetime 对象或以秒为单位的数值组成的序列
+
+    Returns:
+        offsets: float64 数组，单位为天
+    """
+    seconds = np.array([
+        t.timestamp() if isinstance(t, datetime) else float(t) for t in timestamps
+    ], dtype=np.float64)
+    if len(seconds) == 0:
+        return seconds
+    return (seconds - seconds[0]) / SECONDS_PER_DAY
+
+
+def linear_trends(values, x=None):
+    """
+    计算每一列相对 x 的最小二乘斜率
+
+    slope = Σ(x - x̄)(y - ȳ) / Σ(x - x̄)²，对所有列同时求解，
+    结果与逐列调用 np.polyfit(x, y, 1)[0] 在浮点误差范围内一致。
+
+    Args:
+        values: 形状为 (样本数, 指标数) 的数组
+        x: 样本的横坐标（如天数）；为 None 时使用样本序号，支持不等间距
+
+    Returns:
+        slopes: 长度为指标数的 float64 数组；样本不足两个或 x 无变化时为 0
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n_samples = values.shape[0]
+    if n_samples < 2:
+        return np.zeros(values.shape[1])
+
+    x = np.arange(n_samples, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    x_centered = x - x.mean()
+    denominator = np.dot(x_centered, x_centered)
+    if denominator == 0:
+        return np.zeros(values.shape[1])
+    return x_centered @ (values - values.mean(axis=0)) / denominator
+
+
+def rolling_trends(values, window, x=None):
+    """
+    计算滑动窗口内的趋势斜率（最近 window 个样本）
+
+    利用累积和在 O(样本数 × 指标数) 时间内求出所有窗口的斜率。
+
+    Args:
+        values: 形状为 (样本数, 指标数) 的数组
+        window: 窗口大小（样本数），至少为 2
+        x: 样本的横坐标；为 None 时使用样本序号
+
+    Returns:
+        slopes: 形状为 (样本数 - window + 1, 指标数) 的数组，
+                第 i 行对应以第 i + window - 1 个样本结尾的窗口
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n_samples = values.shape[0]
+    if window < 2:
+        raise ValueError('window must be at least 2')
+    if n_samples < window:
+        return np.zeros((0, values.shape[1]))
+
+    x = np.arange(n_samples, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    # 以均值为中心减小累积和的数值误差
+    x = x - x.mean()
+    y = values - values.mean(axis=0)
+
+    def window_sums(a):
+        cumulative = np.concatenate([np.zeros((1,) + a.shape[1:]), np.cumsum(a, axis=0)])
+        return cumulative[window:] - cumulative[:-window]
+
+    sum_x = window_sums(x)
+    sum_xx = window_sums(x * x)
+    sum_y = window_sums(y)
+    sum_xy = window_sums(x[:, None] * y)
+
+    denominator = window * sum_xx - sum_x * sum_x
+    numerator = window * sum_xy - sum_x[:, None] * sum_y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = numerator / denominator[:, None]
+    slopes[~np.isfinite(slopes)] = 0
+    slopes[np.abs(denominator) <= 1e-12 * np.maximum(1.0, window * sum_xx)] = 0
+    return slopes
@@ -1,19 +1,44 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.contrib import messages
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Avg, Count, Max, Min, Sum, FloatField
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, TruncDay, TruncMonth, TruncWeek
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timesince import timesince
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.urls import reverse
 
+import csv
 import json
+import asyncio
 import datetime
+from heapq import merge
+from operator import itemgetter
 
-from .models import Patient, Conversation, Message, DementiaAssessment
+from asgiref.sync import sync_to_async
+
+from .models import Patient, Conversation, Message, DementiaAssessment, PatientSummary, AssessmentCounter
 from .utils.text_processor import TextProcessor
-from .utils.predictor import DementiaPredictor, ConversationManager
+from .utils.predictor import ConversationManager, PatientHistoryState
+from .utils.registry import get_predictor, registry
+from .utils.batching import get_scheduler
+from .utils.timeseries import lttb_indices
+from .utils.metrics import REGISTRY
+from .utils.cohort import cohort_ranking
+from .utils.page_cache import FragmentRecorder, get_page_cache, page_key
+from .utils.pagination import keyset_page
+from .utils.reports import get_report_engine, report_input
 from .forms import PatientForm
 
+# 评估维度（与 DementiaPredictor.dimensions 一致）
+DIMENSIONS = ['memory', 'orientation', 'language', 'attention', 'problem_solving']
+
 
 def index(request):
     """系统首页"""
@@ -63,35 +88,14 @@ def process_message(request):
         if not patient_input or not conversation_id:
             return JsonResponse({'error': 'Missing required parameters'}, status=400)
         
-        # 获取对话
-        conversation = get_object_or_404(Conversation, id=conversation_id)
+        # 获取对话（连同患者摘要中的历史评估状态）
+        conversation = get_object_or_404(Conversation.objects.select_related('patient__summary'), id=conversation_id)
         
-        # 保存患者消息
-        Message.objects.create(
-            conversation=conversation,
-            sender_type='patient',
-            content=patient_input
-        )
-        
-        # 使用对话管理器生成回复并评估
-        conversation_manager = ConversationManager()
-        response, assessment = conversation_manager.generate_response(patient_input)
-        
-        # 保存系统回复
-        Message.objects.create(
-            conversation=conversation,
-            sender_type='system',
-            content=response
-        )
+        # 生成回复并评估（在事务之外执行，推理期间不持有写锁）
+        response, assessment = _generate_response(patient_input, _patient_history(conversation.patient))
         
-        # 保存评估结果
-        DementiaAssessment.objects.create(
-            patient=conversation.patient,
-            conversation=conversation,
-            severity=assessment['severity_category'],
-            confidence_score=assessment['confidence'],
-            detailed_results=assessment
-        )
+        # 在一个事务中保存患者消息、系统回复和评估结果
+        _save_exchange(conversation, patient_input, response, assessment)
         
         return JsonResponse({
             'response': response,
@@ -102,6 +106,126 @@ def process_message(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _patient_history(patient):
+    """
+    患者的历史评估状态，用于按历史调整预测
+    
+    状态随每条评估在 PatientSummary 中增量更新，读取时无需加载历史评估。
+    """
+    try:
+        return PatientHistoryState.from_dict(patient.summary.history_state)
+    except PatientSummary.DoesNotExist:
+        return None
+
+
+def _generate_response(patient_input, patient_history=None):
+    """
+    生成系统回复和评估结果
+    
+    预测器为进程内共享实例；启用 PREDICTOR_BATCHING 时，请求经微批处理调度器
+    与其他并发请求合并推理。
+    """
+    if getattr(settings, 'PREDICTOR_BATCHING', False):
+        return get_scheduler().generate_response(patient_input, patient_history=patient_history)
+    conversation_manager = ConversationManager(predictor=get_predictor())
+    return conversation_manager.generate_response(patient_input, patient_history=patient_history)
+
+
+def _sse_event(event, data):
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _iter_reply_chunks(response, chunk_size=4):
+    """将系统回复切分为小段，以便逐段推送给前端"""
+    for start in range(0, len(response), chunk_size):
+        yield response[start:start + chunk_size]
+
+
+def _save_exchange(conversation, patient_input, response, assessment):
+    """
+    在一个事务中保存一轮对话：患者消息、系统回复、对话特征状态和评估结果
+    
+    两条消息用 bulk_create 一次写入；任何一步失败时整轮回滚，不会留下只有患者消息的对话。
+    事务的第一条语句就是写入，SQLite 在事务开始时即申请写锁并按 busy_timeout 等待，
+    避免先读后写时锁升级失败。
+    """
+    with transaction.atomic():
+        patient_message, _ = Message.objects.bulk_create([
+            Message(conversation=conversation, sender_type='patient', content=patient_input),
+            Message(conversation=conversation, sender_type='system', content=response),
+        ])
+        # 增量更新对话级语言特征
+        conversation.update_feature_state(patient_input)
+        DementiaAssessment.objects.create(
+            patient_id=conversation.patient_id,
+            conversation=conversation,
+            # 数据库不支持 bulk_create 返回主键时 patient_message.pk 为 None，不记录关联
+            message_id=patient_message.pk,
+            # 记录本次预测实际使用的规则包版本（规则包可能在请求之间热替换）
+            predictor_version=assessment.get('rules_version') or getattr(get_predictor(), 'version', ''),
+            severity=assessment['severity_category'],
+            confidence_score=assessment['confidence'],
+            detailed_results=assessment
+        )
+
+
+async def process_message_stream(request):
+    """
+    处理患者消息并以 Server-Sent Events 流式返回系统回复（异步版本）
+    
+    推理在线程池中执行，数据库写入在推送回复的同时于线程中完成，因此单个 ASGI 进程
+    可以同时服务多个患者会话。事件依次为 token（回复片段）、assessment（评估结果）
+    和 done（数据已保存）；出错时发送 error 事件。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    patient_input = data.get('message', '')
+    conversation_id = data.get('conversation_id')
+    
+    if not patient_input or not conversation_id:
+        return JsonResponse({'error': 'Missing required parameters'}, status=400)
+    
+    try:
+        conversation = await Conversation.objects.select_related('patient__summary').aget(id=conversation_id)
+    except (Conversation.DoesNotExist, ValueError):
+        raise Http404('Conversation not found')
+    
+    async def event_stream():
+        try:
+            # 在线程池中执行推理，避免阻塞事件循环
+            loop = asyncio.get_running_loop()
+            response, assessment = await loop.run_in_executor(
+                None, _generate_response, patient_input, _patient_history(conversation.patient))
+            
+            # 数据库写入（单个事务）与回复推送并行进行
+            save_task = asyncio.ensure_future(
+                sync_to_async(_save_exchange)(conversation, patient_input, response, assessment)
+            )
+            for chunk in _iter_reply_chunks(response):
+                yield _sse_event('token', {'text': chunk})
+            yield _sse_event('assessment', assessment)
+            
+            await save_task
+            yield _sse_event('done', {'response': response})
+        except Exception as e:
+            yield _sse_event('error', {'error': str(e)})
+    
+    streaming_response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    streaming_response['Cache-Control'] = 'no-cache'
+    streaming_response['X-Accel-Buffering'] = 'no'
+    return streaming_response
+
+
+# 异步视图无法直接使用 csrf_exempt 装饰器（Django 4.2），因此直接设置标记
+process_message_stream.csrf_exempt = True
+
+
 @csrf_exempt
 def voice_to_text(request):
     """语音转文本接口（模拟）"""
@@ -116,59 +240,347 @@ def voice_to_text(request):
     })
 
 
+DASHBOARD_PAGE_SIZE = 25
+DASHBOARD_RECENT_ASSESSMENTS = 5
+
+
+def _recent_assessments(patients, limit):
+    """
+    取若干患者中最近的 limit 条评估
+    
+    最近的 limit 条评估只可能属于最新评估日期排在前 limit 位的患者，
+    且日期不早于其中第 limit 位的最新评估日期；先从 PatientSummary 找出这些患者，
+    再按 (patient, assessment_date) 索引读取，避免对所有患者的评估排序。
+    """
+    summaries = list(
+        PatientSummary.objects.filter(patient__in=patients, latest_assessment_date__isnull=False)
+        .order_by('-latest_assessment_date')
+        .values_list('patient_id', 'latest_assessment_date')[:limit]
+    )
+    if not summaries:
+        return []
+    return list(
+        DementiaAssessment.objects.filter(
+            patient_id__in=[patient_id for patient_id, _ in summaries],
+            assessment_date__gte=summaries[-1][1],
+        ).select_related('patient').order_by('-assessment_date')[:limit]
+    )
+
+
+def _render_cached(request, template_name, key, build_context):
+    """
+    渲染使用页面片段缓存的页面（见 core.utils.page_cache）
+    
+    模板中 {% fragment %} 标签包住的部分按 key 缓存。命中时不调用 build_context，
+    不执行任何页面数据查询。build_context(depend) 返回模板上下文，
+    在查询某部分页面数据之前调用 depend(*scopes) 登记该数据所属的失效范围。
+    """
+    page_cache = get_page_cache()
+    fragments = page_cache.get(key)
+    if fragments is not None:
+        return render(request, template_name, {'page_fragments': FragmentRecorder(fragments)})
+    
+    versions = {}
+    
+    def depend(*scopes):
+        versions.update(page_cache.versions(scopes))
+    
+    context = build_context(depend)
+    recorder = FragmentRecorder()
+    context['page_fragments'] = recorder
+    response = render(request, template_name, context)
+    page_cache.set(key, versions, recorder.rendered)
+    return response
+
+
 @login_required
 def caregiver_dashboard(request):
-    """照护人员仪表板"""
+    """
+    照护人员仪表板
+    
+    患者列表和统计数字都读取 PatientSummary 和 AssessmentCounter，
+    查询次数与患者数量无关。页面按照护人员、页码和当地日期缓存，
+    该照护人员或未分配患者的数据变化时失效。
+    """
+    today = timezone.localdate()
+    page_number = request.GET.get('page', '')
+    key = page_key('caregiver_dashboard', request.user.pk, page_number, today.isoformat())
+    return _render_cached(
+        request, 'caregiver_dashboard.html', key,
+        lambda depend: _dashboard_context(request.user, page_number, today, depend),
+    )
+
+
+def _dashboard_context(user, page_number, today, depend):
+    depend(('caregiver', user.pk), ('caregiver', None))
     # 获取照护人员负责的患者
     patients = Patient.objects.filter(
-        Q(caregiver=request.user) | Q(caregiver__isnull=True)
+        Q(caregiver=user) | Q(caregiver__isnull=True)
+    )
+    page = Paginator(
+        patients.select_related('summary').order_by('id'), DASHBOARD_PAGE_SIZE
+    ).get_page(page_number)
+    
+    starts = AssessmentCounter.period_starts(timezone.now())
+    counts = AssessmentCounter.objects.filter(
+        Q(period='day', period_start=starts['day']) | Q(period='week', period_start=starts['week']),
+        patient__in=patients,
+    ).aggregate(
+        today=Sum('count', filter=Q(period='day')),
+        week=Sum('count', filter=Q(period='week')),
     )
+    attention_needed = PatientSummary.objects.filter(
+        patient__in=patients, latest_severity__in=['moderate', 'severe']
+    ).count()
+    # 用本地当日的时间范围过滤，而不是 start_time__date，以便使用 (patient, start_time) 索引
+    day_start = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+    today_conversations = Conversation.objects.filter(
+        patient__in=patients,
+        start_time__gte=day_start,
+        start_time__lt=day_start + datetime.timedelta(days=1),
+    ).count()
+    recent_assessments = _recent_assessments(patients, DASHBOARD_RECENT_ASSESSMENTS)
     
     context = {
         'title': '照护人员仪表板',
-        'patients': patients,
+        'patients': page,
+        'page_obj': page,
+        'patient_count': page.paginator.count,
+        'today_assessments': counts['today'] or 0,
+        'weekly_assessments': counts['week'] or 0,
+        'today_conversations': today_conversations,
+        'attention_needed': attention_needed,
+        'recent_assessments': recent_assessments,
     }
-    return render(request, 'caregiver_dashboard.html', context)
+    return context
+
+
+# 患者详情、对话详情页面及其键集分页接口的默认和最大每页条数
+CONVERSATION_MESSAGES_PAGE_SIZE = 50
+CONVERSATION_ASSESSMENTS_PAGE_SIZE = 20
+PATIENT_ASSESSMENTS_PAGE_SIZE = 20
+PATIENT_CONVERSATIONS_PAGE_SIZE = 10
+KEYSET_MAX_LIMIT = 200
 
 
 @login_required
 def patient_detail(request, patient_id):
-    """患者详细信息页面"""
-    patient = get_object_or_404(Patient, patient_id=patient_id)
-    
-    # 获取患者的评估历史
-    assessments = DementiaAssessment.objects.filter(patient=patient).order_by('-assessment_date')
+    """患者详细信息页面（按患者缓存，患者信息或其对话、评估变化时失效）"""
+    return _render_cached(
+        request, 'patient_detail.html', page_key('patient_detail', patient_id),
+        lambda depend: _patient_detail_context(patient_id, depend),
+    )
+
+
+def _patient_detail_context(patient_id, depend):
+    depend(('patient_code', patient_id))
+    patient = get_object_or_404(Patient.objects.select_related('caregiver', 'summary'), patient_id=patient_id)
+    depend(('patient_data', patient.pk))
     
-    # 获取患者的最近对话
-    conversations = Conversation.objects.filter(patient=patient).order_by('-start_time')[:5]
+    # 评估历史和对话只渲染第一页，其余页面滚动时从键集分页接口加载；
+    # 最新严重程度和评估总数读取 PatientSummary，趋势图表由 patient_progress_data 按需加载
+    assessments, assessments_cursor = keyset_page(
+        _patient_assessment_rows(patient), 'assessment_date',
+        limit=PATIENT_ASSESSMENTS_PAGE_SIZE, descending=True,
+    )
+    conversations, conversations_cursor = keyset_page(
+        Conversation.objects.filter(patient=patient), 'start_time',
+        limit=PATIENT_CONVERSATIONS_PAGE_SIZE, descending=True,
+    )
     
-    context = {
+    return {
         'title': f'患者: {patient.name}',
         'patient': patient,
+        'summary': getattr(patient, 'summary', None),
         'assessments': assessments,
-        'conversations': conversations,
+        'assessments_cursor': assessments_cursor,
+        'conversations': _with_conversation_counts(conversations),
+        'conversations_cursor': conversations_cursor,
     }
-    return render(request, 'patient_detail.html', context)
 
 
 @login_required
 def conversation_detail(request, conversation_id):
-    """对话详细信息页面"""
+    """对话详细信息页面（按对话缓存，对话的消息、评估或患者信息变化时失效）"""
+    return _render_cached(
+        request, 'conversation_detail.html', page_key('conversation_detail', conversation_id),
+        lambda depend: _conversation_detail_context(conversation_id, depend),
+    )
+
+
+def _conversation_detail_context(conversation_id, depend):
+    depend(('conversation', conversation_id))
     conversation = get_object_or_404(Conversation, id=conversation_id)
+    # 患者信息在模板中访问 conversation.patient 时才读取
+    depend(('patient', conversation.patient_id))
     
-    # 获取对话中的所有消息
-    messages = Message.objects.filter(conversation=conversation).order_by('timestamp')
-    
-    # 获取对话相关的评估
-    assessments = DementiaAssessment.objects.filter(conversation=conversation).order_by('assessment_date')
+    # 只渲染最近一页消息和第一页评估，更早的消息和其余评估滚动时从键集分页接口加载
+    # （已归档的对话从归档分片读取）。
+    # 不使用 messages 作为变量名，以免遮盖 base.html 中的提示消息
+    message_rows, assessment_rows = _conversation_rows(conversation)
+    conversation_messages, messages_cursor = keyset_page(
+        message_rows, 'timestamp', limit=CONVERSATION_MESSAGES_PAGE_SIZE, descending=True,
+    )
+    assessments, assessments_cursor = keyset_page(
+        assessment_rows, 'assessment_date', limit=CONVERSATION_ASSESSMENTS_PAGE_SIZE,
+    )
     
-    context = {
+    return {
         'title': f'对话详情',
         'conversation': conversation,
-        'messages': messages,
+        'conversation_messages': conversation_messages[::-1],
+        'messages_cursor': messages_cursor,
+        'message_count': _row_count(message_rows),
         'assessments': assessments,
+        'assessments_cursor': assessments_cursor,
+        'assessment_count': _row_count(assessment_rows),
+        # 对话级语言特征由 feature_state 中的累计值直接计算，不扫描消息
+        'language_features': conversation.get_language_features(),
+    }
+
+
+def _conversation_rows(conversation):
+    """对话的消息和评估：数据库中的对话返回 QuerySet，已归档的对话返回归档分片中的对象列表"""
+    if conversation.is_archived:
+        return conversation.get_messages(), conversation.get_assessments()
+    return Message.objects.filter(conversation=conversation), DementiaAssessment.objects.filter(conversation=conversation)
+
+
+def _row_count(rows):
+    return len(rows) if isinstance(rows, list) else rows.count()
+
+
+def _with_conversation_counts(conversations):
+    """为一页对话附加消息数和评估数（两次聚合查询，不逐个对话查询）"""
+    ids = [conversation.id for conversation in conversations if not conversation.is_archived]
+    message_counts = dict(
+        Message.objects.filter(conversation_id__in=ids)
+        .values_list('conversation_id').annotate(n=Count('id')).order_by()
+    )
+    assessment_counts = dict(
+        DementiaAssessment.objects.filter(conversation_id__in=ids)
+        .values_list('conversation_id').annotate(n=Count('id')).order_by()
+    )
+    for conversation in conversations:
+        conversation.message_count = message_counts.get(conversation.id, 0)
+        conversation.assessment_count = assessment_counts.get(conversation.id, 0)
+    return conversations
+
+
+def _keyset_response(request, rows, field, default_limit, default_order, serialize, prepare=None):
+    """
+    键集分页接口的公共部分：serialize 把一个对象转换为 JSON 字典，
+    prepare（可选）在转换前对整页对象做批量处理（如附加计数）
+    
+    GET 参数:
+        cursor: 上一页返回的 next_cursor（可选，省略时返回第一页）
+        limit: 每页条数（至多 KEYSET_MAX_LIMIT）
+        order: asc / desc
+    """
+    order = request.GET.get('order', default_order)
+    if order not in ('asc', 'desc'):
+        return JsonResponse({'error': f'Invalid order: {order}'}, status=400)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', default_limit)), KEYSET_MAX_LIMIT))
+        items, next_cursor = keyset_page(rows, field, request.GET.get('cursor') or None,
+                                         limit=limit, descending=order == 'desc')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if prepare is not None:
+        items = prepare(items)
+    return JsonResponse({
+        'order': order,
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'results': [serialize(item) for item in items],
+    })
+
+
+def _local_isoformat(moment):
+    return timezone.localtime(moment).isoformat() if moment else None
+
+
+def _assessment_json(assessment, conversation_id=None):
+    url = reverse('assessment_report', args=[assessment.id])
+    if conversation_id is not None:
+        url += f'?conversation={conversation_id}'
+    return {
+        'id': assessment.id,
+        'assessment_date': _local_isoformat(assessment.assessment_date),
+        'severity': assessment.severity,
+        'severity_display': assessment.get_severity_display(),
+        'confidence_score': assessment.confidence_score,
+        'url': url,
     }
-    return render(request, 'conversation_detail.html', context)
+
+
+@login_required
+def conversation_messages(request, conversation_id):
+    """对话消息的键集分页接口（JSON），默认按时间升序；参数见 _keyset_response"""
+    conversation = get_object_or_404(Conversation, id=conversation_id)
+    message_rows, _ = _conversation_rows(conversation)
+    return _keyset_response(
+        request, message_rows, 'timestamp', CONVERSATION_MESSAGES_PAGE_SIZE, 'asc',
+        lambda message: {
+            'id': message.id,
+            'sender_type': message.sender_type,
+            'sender_display': message.get_sender_type_display(),
+            'content': message.content,
+            'timestamp': _local_isoformat(message.timestamp),
+        },
+    )
+
+
+@login_required
+def conversation_assessments(request, conversation_id):
+    """对话评估的键集分页接口（JSON），默认按日期升序；参数见 _keyset_response"""
+    conversation = get_object_or_404(Conversation, id=conversation_id)
+    _, assessment_rows = _conversation_rows(conversation)
+    return _keyset_response(
+        request, assessment_rows, 'assessment_date', CONVERSATION_ASSESSMENTS_PAGE_SIZE, 'asc',
+        lambda assessment: _assessment_json(assessment, conversation.id),
+    )
+
+
+def _patient_assessment_rows(patient):
+    """患者的全部评估：数据库中的评估和已归档对话中的评估，供 keyset_page 合并分页"""
+    return DementiaAssessment.objects.filter(patient=patient), patient.get_archived_assessments()
+
+
+@login_required
+def patient_assessments(request, patient_id):
+    """
+    患者评估的键集分页接口（JSON），默认按日期倒序；参数见 _keyset_response
+    
+    包含已归档对话中的评估，与数据库中的评估按日期合并分页。
+    """
+    patient = get_object_or_404(Patient, patient_id=patient_id)
+    return _keyset_response(
+        request, _patient_assessment_rows(patient), 'assessment_date', PATIENT_ASSESSMENTS_PAGE_SIZE, 'desc',
+        # 已归档的评估需通过所属对话读取报告
+        lambda assessment: _assessment_json(assessment, assessment.conversation_id),
+    )
+
+
+@login_required
+def patient_conversations(request, patient_id):
+    """患者对话的键集分页接口（JSON），默认按开始时间倒序；参数见 _keyset_response"""
+    patient = get_object_or_404(Patient, patient_id=patient_id)
+    return _keyset_response(
+        request, Conversation.objects.filter(patient=patient), 'start_time',
+        PATIENT_CONVERSATIONS_PAGE_SIZE, 'desc',
+        lambda conversation: {
+            'id': conversation.id,
+            'start_time': _local_isoformat(conversation.start_time),
+            'end_time': _local_isoformat(conversation.end_time),
+            'duration': timesince(conversation.start_time, conversation.end_time) if conversation.end_time else None,
+            'archived_month': conversation.archived_month,
+            'message_count': conversation.message_count,
+            'assessment_count': conversation.assessment_count,
+            'url': reverse('conversation_detail', args=[conversation.id]),
+        },
+        prepare=_with_conversation_counts,
+    )
 
 
 @login_required
@@ -216,86 +628,507 @@ def edit_patient(request, patient_id):
 
 @login_required
 def assessment_report(request, assessment_id):
-    """查看评估报告"""
-    assessment = get_object_or_404(DementiaAssessment, id=assessment_id)
+    """
+    查看评估报告
     
-    # 生成评估报告
-    predictor = DementiaPredictor()
-    report = predictor.generate_report(assessment.detailed_results)
+    已归档的评估不在数据库中，需通过 GET 参数 conversation 指明所属对话，从归档分片读取。
+    报告按评估缓存，评估、患者信息或所属对话变化时失效。
+    """
+    conversation_id = request.GET.get('conversation', '')
+    return _render_cached(
+        request, 'assessment_report.html', page_key('assessment_report', assessment_id, conversation_id),
+        lambda depend: _assessment_report_context(assessment_id, conversation_id, depend),
+    )
+
+
+def _assessment_report_context(assessment_id, conversation_id, depend):
+    depend(('assessment', assessment_id))
+    assessment = DementiaAssessment.objects.filter(id=assessment_id).first()
+    if assessment is None:
+        assessment = _archived_assessment(conversation_id, assessment_id)
+    if assessment is None:
+        raise Http404('Assessment not found')
+    # 患者信息和对话消息在模板中访问时才读取
+    depend(('patient', assessment.patient_id), ('conversation', assessment.conversation_id))
     
-    context = {
+    # 生成评估报告（按评估缓存，见 core.utils.reports）
+    report = get_report_engine().report(assessment.id, report_input(assessment.severity, assessment.detailed_results))
+    
+    return {
         'title': '评估报告',
         'assessment': assessment,
         'report': report,
         'patient': assessment.patient,
     }
-    return render(request, 'assessment_report.html', context)
+
+
+def _archived_assessment(conversation_id, assessment_id):
+    """从已归档对话中查找评估，找不到时返回 None"""
+    if not conversation_id or not str(conversation_id).isdigit():
+        return None
+    conversation = Conversation.objects.filter(id=conversation_id).exclude(archived_month='').first()
+    if conversation is None:
+        return None
+    for assessment in conversation.get_assessments():
+        if assessment.id == assessment_id:
+            return assessment
+    return None
+
+
+class _Echo:
+    """csv.writer 的伪文件对象：write() 直接返回写入的内容，供流式响应逐行输出"""
+    
+    def write(self, value):
+        return value
+
+
+EXPORT_HEADER = ['日期', '严重程度', '置信度', '记忆', '方向感', '语言', '注意力', '问题解决']
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _export_rows(queryset, include_patient=False, archived=()):
+    """
+    逐块读取评估记录并生成 CSV 行
+    
+    分数字段直接在数据库中从 JSON 提取，不在 Python 中解码整个 detailed_results；
+    iterator() 按块读取，内存占用与导出行数无关。
+    archived 为 _archived_export_rows() 生成的已归档评估，按 (患者ID, 日期, id) 与数据库中的行合并，
+    queryset 需按同样的顺序排序。
+    """
+    header = list(EXPORT_HEADER)
+    fields = ['assessment_date', 'severity', 'confidence_score']
+    if include_patient:
+        header = ['患者ID', '姓名'] + header
+        fields = ['patient__patient_id', 'patient__name'] + fields
+    yield header
+    
+    dimension_fields = {f'export_{dimension}': KT(f'detailed_results__dimension_scores__{dimension}')
+                        for dimension in DIMENSIONS}
+    rows = (
+        queryset
+        .annotate(**dimension_fields)
+        .values_list('id', *fields, *dimension_fields)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    offset = 2 if include_patient else 0
+    keyed = (((row[1] if include_patient else '', row[offset + 1], row[0]), row[1:]) for row in rows)
+    for _, row in merge(keyed, archived, key=itemgetter(0)):
+        row = list(row)
+        row[offset] = timezone.localtime(row[offset]).strftime('%Y-%m-%d %H:%M')
+        for i in range(offset + 3, len(row)):
+            if row[i] is None:
+                row[i] = 'N/A'
+        yield row
+
+
+def _archived_export_rows(patients, include_patient=False, start=None, end=None):
+    """
+    已归档评估的导出行 ((患者ID, 日期, id), 行)，顺序与 _export_rows 中数据库的行相同
+    
+    逐位患者读取归档分片，内存中只保留一位患者的已归档评估。
+    """
+    for patient in patients:
+        for assessment in patient.get_archived_assessments():
+            date = assessment.assessment_date
+            if (start and date < start) or (end and date >= end):
+                continue
+            dimension_scores = (assessment.detailed_results or {}).get('dimension_scores') or {}
+            row = [date, assessment.severity, assessment.confidence_score]
+            row += [dimension_scores.get(dimension) for dimension in DIMENSIONS]
+            if include_patient:
+                row = [patient.patient_id, patient.name] + row
+            yield (patient.patient_id if include_patient else '', date, assessment.id), row
+
+
+def _csv_streaming_response(rows, filename):
+    """以流式响应输出 CSV，由 csv.writer 负责引号转义"""
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 @login_required
 def export_assessment_data(request, patient_id):
-    """导出患者评估数据（CSV格式）"""
+    """导出患者评估数据（CSV格式，流式输出）"""
     patient = get_object_or_404(Patient, patient_id=patient_id)
     
-    # 获取患者的所有评估
-    assessments = DementiaAssessment.objects.filter(patient=patient).order_by('assessment_date')
+    # 获取患者的所有评估（含已归档对话中的评估）
+    assessments = DementiaAssessment.objects.filter(patient=patient).order_by('assessment_date', 'id')
+    rows = _export_rows(assessments, archived=_archived_export_rows([patient]))
     
-    # 创建CSV数据
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{patient.name}_assessments.csv"'
+    return _csv_streaming_response(rows, f'{patient.name}_assessments.csv')
+
+
+@login_required
+def export_bulk_assessment_data(request):
+    """
+    批量导出照护人员负责的所有患者的评估数据（CSV格式，流式输出）
     
-    # 写入CSV头
-    response.write('日期,严重程度,置信度,记忆,方向感,语言,注意力,问题解决\n')
+    GET 参数 start、end（YYYY-MM-DD，可选）限定评估日期范围。已归档对话中的评估一并导出。
+    """
+    try:
+        start, end = _parse_progress_range(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    # 写入数据行
-    for assessment in assessments:
-        detailed = assessment.detailed_results
-        dimension_scores = detailed.get('dimension_scores', {})
-        
-        date = assessment.assessment_date.strftime('%Y-%m-%d %H:%M')
-        severity = assessment.severity
-        confidence = assessment.confidence_score
-        
-        memory = dimension_scores.get('memory', 'N/A')
-        orientation = dimension_scores.get('orientation', 'N/A')
-        language = dimension_scores.get('language', 'N/A')
-        attention = dimension_scores.get('attention', 'N/A')
-        problem_solving = dimension_scores.get('problem_solving', 'N/A')
-        
-        line = f'{date},{severity},{confidence},{memory},{orientation},{language},{attention},{problem_solving}\n'
-        response.write(line)
+    patients = Patient.objects.filter(Q(caregiver=request.user) | Q(caregiver__isnull=True))
+    assessments = DementiaAssessment.objects.filter(patient__in=patients)
+    if start:
+        assessments = assessments.filter(assessment_date__gte=start)
+    if end:
+        assessments = assessments.filter(assessment_date__lt=end)
+    assessments = assessments.order_by('patient__patient_id', 'assessment_date', 'id')
+    # 只有存在已归档对话的患者需要读取归档分片
+    archived_patients = patients.filter(
+        id__in=Conversation.objects.exclude(archived_month='').values('patient_id')
+    ).order_by('patient_id')
+    archived = _archived_export_rows(archived_patients.iterator(), include_patient=True, start=start, end=end)
     
-    return response
+    filename = 'assessments_{}.csv'.format(timezone.localdate().strftime('%Y%m%d'))
+    return _csv_streaming_response(_export_rows(assessments, include_patient=True, archived=archived), filename)
+
+
+COHORT_DEFAULT_LIMIT = 50
+COHORT_MAX_LIMIT = 500
 
 
 @login_required
-def patient_progress(request, patient_id):
-    """患者进展分析页面"""
+def cohort_decline_ranking(request):
+    """
+    照护人员负责的患者按病情加重速度排序（JSON）
+    
+    斜率、近期变化和百分位由 core.utils.cohort 对全体患者向量化计算，
+    百分位是斜率在全体患者（不限于本照护人员）中的位置。
+    
+    GET 参数:
+        order: desc（加重最快在前，默认）/ asc
+        limit, offset: 分页
+    """
+    order = request.GET.get('order', 'desc')
+    if order not in ('desc', 'asc'):
+        return JsonResponse({'error': f'Invalid order: {order}'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', COHORT_DEFAULT_LIMIT))
+        offset = int(request.GET.get('offset', 0))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    limit = max(1, min(limit, COHORT_MAX_LIMIT))
+    offset = max(0, offset)
+    
+    patient_ids = Patient.objects.filter(
+        Q(caregiver=request.user) | Q(caregiver__isnull=True)
+    ).values_list('id', flat=True)
+    rows, total, summary = cohort_ranking(list(patient_ids), descending=order == 'desc',
+                                          offset=offset, limit=limit)
+    patients = Patient.objects.in_bulk([row['patient_pk'] for row in rows])
+    
+    results = []
+    for row in rows:
+        patient = patients[row['patient_pk']]
+        latest = datetime.datetime.fromtimestamp(row['latest_timestamp'], tz=datetime.timezone.utc)
+        results.append({
+            'patient_id': patient.patient_id,
+            'name': patient.name,
+            'url': reverse('patient_detail', args=[patient.patient_id]),
+            'assessment_count': row['assessment_count'],
+            'slope_per_day': row['slope_per_day'],
+            'recent_delta': row['recent_delta'],
+            'latest_score': row['latest_score'],
+            'latest_assessment': timezone.localtime(latest).isoformat(),
+            'percentile': round(row['percentile'], 1),
+        })
+    
+    return JsonResponse({
+        'order': order,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'cohort': summary,
+        'results': results,
+    })
+
+
+# 图表聚合粒度
+PROGRESS_BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+PROGRESS_DEFAULT_POINTS = 500
+PROGRESS_MAX_POINTS = 5000
+PROGRESS_RECENT_ROWS = 50
+
+
+def _score_expression(*path):
+    """从 detailed_results JSON 中取出数值字段的数据库表达式"""
+    return Cast(KT('detailed_results__' + '__'.join(path)), FloatField())
+
+
+def _score_fields():
+    """图表需要的各项分数字段：(名称, 数据库表达式)"""
+    fields = [('severity', _score_expression('severity_score'))]
+    fields += [(dimension, _score_expression('dimension_scores', dimension)) for dimension in DIMENSIONS]
+    return fields
+
+
+def _parse_progress_range(request):
+    """解析图表请求中的时间范围参数（YYYY-MM-DD 或 ISO 时间）"""
+    bounds = []
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        # 先按日期解析：parse_datetime 也接受只有日期的字符串（视为当日零点），结束日期会少算一天
+        parsed_date = parse_date(value)
+        if parsed_date is not None:
+            parsed = datetime.datetime.combine(parsed_date, datetime.time.min)
+            if name == 'end':
+                parsed += datetime.timedelta(days=1)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(f'Invalid {name}: {value}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        bounds.append(parsed)
+    return bounds
+
+
+def _score_value(value):
+    """与数据库中 CAST(... AS REAL) 对应的 Python 转换"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _archived_score_rows(patient, start=None, end=None):
+    """
+    已归档评估的分数行，格式与数据库查询结果一致：
+    (assessment_date, severity_score, 各维度分数...)，按日期升序
+    """
+    rows = []
+    for assessment in patient.get_archived_assessments():
+        date = assessment.assessment_date
+        if (start and date < start) or (end and date >= end):
+            continue
+        results = assessment.detailed_results or {}
+        dimension_scores = results.get('dimension_scores') or {}
+        scores = [results.get('severity_score')] + [dimension_scores.get(dimension) for dimension in DIMENSIONS]
+        rows.append((date, *[_score_value(score) for score in scores]))
+    return rows
+
+
+def _bucket_start(moment, bucket):
+    """某一时刻所在时间桶的开始日期（本地时区），与 Trunc* 函数的结果一致"""
+    day = timezone.localtime(moment).date()
+    if bucket == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _progress_series_bucketed(queryset, bucket, archived_rows=()):
+    """
+    在数据库中按时间桶聚合，返回每个桶每项分数的均值、最小值、最大值和数量
+    
+    archived_rows 为已归档评估的分数行，在 Python 中并入相同的时间桶。
+    """
+    names = [name for name, _ in _score_fields()]
+    aggregates = {'count': Count('id')}
+    for name, expression in _score_fields():
+        aggregates[f'{name}_n'] = Count(expression)
+        aggregates[f'{name}_mean'] = Avg(expression)
+        aggregates[f'{name}_min'] = Min(expression)
+        aggregates[f'{name}_max'] = Max(expression)
+
+    rows = (
+        queryset
+        .annotate(bucket=PROGRESS_BUCKETS[bucket]('assessment_date'))
+        .values('bucket')
+        .annotate(**aggregates)
+        .order_by('bucket')
+    )
+
+    # 每个桶：总数，以及每项分数的 [非空数量, 总和, 最小值, 最大值]
+    buckets = {}
+    for row in rows:
+        entry = buckets[timezone.localtime(row['bucket']).date()] = {'count': row['count']}
+        for name in names:
+            n, mean = row[f'{name}_n'], row[f'{name}_mean']
+            entry[name] = [n, mean * n if mean is not None else 0.0, row[f'{name}_min'], row[f'{name}_max']]
+    for row in archived_rows:
+        key = _bucket_start(row[0], bucket)
+        entry = buckets.get(key)
+        if entry is None:
+            entry = buckets[key] = {'count': 0, **{name: [0, 0.0, None, None] for name in names}}
+        entry['count'] += 1
+        for name, value in zip(names, row[1:]):
+            if value is None:
+                continue
+            stats = entry[name]
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = value if stats[2] is None else min(stats[2], value)
+            stats[3] = value if stats[3] is None else max(stats[3], value)
+
+    series = {'labels': [], 'count': []}
+    for name in names:
+        series[name] = {'mean': [], 'min': [], 'max': []}
+    for key in sorted(buckets):
+        entry = buckets[key]
+        series['labels'].append(key.strftime('%Y-%m-%d'))
+        series['count'].append(entry['count'])
+        for name in names:
+            n, total, low, high = entry[name]
+            for stat, value in (('mean', total / n if n else None), ('min', low), ('max', high)):
+                series[name][stat].append(round(value, 4) if value is not None else None)
+    return series
+
+
+def _progress_series_raw(queryset, points, archived_rows=()):
+    """逐条返回评估分数（含已归档评估），超过目标点数时以 LTTB 降采样"""
+    fields = _score_fields()
+    rows = list(
+        queryset
+        .order_by('assessment_date')
+        .annotate(**{f'score_{name}': expression for name, expression in fields})
+        .values_list('assessment_date', *[f'score_{name}' for name, _ in fields])
+    )
+    if archived_rows:
+        rows = sorted(rows + list(archived_rows), key=lambda row: row[0])
+
+    if len(rows) > points:
+        x = [row[0].timestamp() for row in rows]
+        y = [row[1] if row[1] is not None else 0 for row in rows]
+        rows = [rows[i] for i in lttb_indices(x, y, points)]
+
+    series = {'labels': [], 'count': [1] * len(rows)}
+    for name, _ in fields:
+        series[name] = {'mean': [], 'min': [], 'max': []}
+    for row in rows:
+        series['labels'].append(timezone.localtime(row[0]).strftime('%Y-%m-%d %H:%M'))
+        for (name, _), value in zip(fields, row[1:]):
+            value = value if value is not None else 0
+            for stat in ('mean', 'min', 'max'):
+                series[name][stat].append(value)
+    return series
+
+
+@login_required
+def patient_progress_data(request, patient_id):
+    """
+    患者进展图表数据（JSON）
+    
+    GET 参数:
+        bucket: raw / day / week / month / auto（默认 auto，按数据量自动选择）
+        start, end: 时间范围（可选），用于图表缩放
+        points: 逐条模式下的最大返回点数，超过时以 LTTB 降采样
+    """
     patient = get_object_or_404(Patient, patient_id=patient_id)
     
-    # 获取患者的所有评估，按时间排序
-    assessments = DementiaAssessment.objects.filter(patient=patient).order_by('assessment_date')
+    try:
+        start, end = _parse_progress_range(request)
+        points = int(request.GET.get('points', PROGRESS_DEFAULT_POINTS))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    points = max(3, min(points, PROGRESS_MAX_POINTS))
+    bucket = request.GET.get('bucket', 'auto')
+    if bucket not in ('auto', 'raw', *PROGRESS_BUCKETS):
+        return JsonResponse({'error': f'Invalid bucket: {bucket}'}, status=400)
     
-    # 准备图表数据
-    dates = [assessment.assessment_date.strftime('%Y-%m-%d') for assessment in assessments]
-    severity_scores = [assessment.detailed_results.get('severity_score', 0) for assessment in assessments]
+    queryset = DementiaAssessment.objects.filter(patient=patient)
+    if start:
+        queryset = queryset.filter(assessment_date__gte=start)
+    if end:
+        queryset = queryset.filter(assessment_date__lt=end)
     
-    # 按维度准备数据
-    dimensions = ['memory', 'orientation', 'language', 'attention', 'problem_solving']
-    dimension_data = {}
+    # 已归档对话中的评估从归档分片读取
+    archived_rows = _archived_score_rows(patient, start, end)
     
-    for dimension in dimensions:
-        dimension_data[dimension] = []
-        for assessment in assessments:
-            score = assessment.detailed_results.get('dimension_scores', {}).get(dimension, 0)
-            dimension_data[dimension].append(score)
+    total = queryset.count() + len(archived_rows)
+    if bucket == 'auto':
+        # 点数不多时逐条显示，否则选择使桶数不超过目标点数的最细粒度
+        bucket = 'raw'
+        if total > points:
+            span = queryset.aggregate(first=Min('assessment_date'), last=Max('assessment_date'))
+            dates = [date for date in (span['first'], span['last']) if date is not None]
+            if archived_rows:
+                dates += [archived_rows[0][0], archived_rows[-1][0]]
+            days = (max(dates) - min(dates)).days + 1
+            for candidate, days_per_bucket in (('day', 1), ('week', 7), ('month', 30)):
+                bucket = candidate
+                if days / days_per_bucket <= points:
+                    break
+    
+    if bucket == 'raw':
+        series = _progress_series_raw(queryset, points, archived_rows)
+    else:
+        series = _progress_series_bucketed(queryset, bucket, archived_rows)
+    
+    return JsonResponse({'bucket': bucket, 'total': total, **series})
+
+
+@login_required
+def patient_progress(request, patient_id):
+    """患者进展分析页面（图表数据由 patient_progress_data 按需加载）"""
+    patient = get_object_or_404(Patient, patient_id=patient_id)
+    
+    # 概览只查询汇总信息，页面大小不随评估数量增长
+    assessments = DementiaAssessment.objects.filter(patient=patient)
+    archived = patient.get_archived_assessments()
+    assessment_count = assessments.count() + len(archived)
+    candidates = [assessment for assessment in (
+        assessments.order_by('assessment_date').first(),
+        assessments.order_by('-assessment_date').first(),
+        archived[0] if archived else None,
+        archived[-1] if archived else None,
+    ) if assessment is not None]
+    first_assessment = min(candidates, key=lambda a: a.assessment_date, default=None)
+    latest_assessment = max(candidates, key=lambda a: a.assessment_date, default=None)
+    
+    # 评估历史表只显示最近的记录（含已归档评估），完整数据可通过导出获取
+    recent_assessments = sorted(
+        list(assessments.order_by('-assessment_date')[:PROGRESS_RECENT_ROWS]) + archived[-PROGRESS_RECENT_ROWS:],
+        key=lambda a: a.assessment_date, reverse=True,
+    )[:PROGRESS_RECENT_ROWS]
     
     context = {
         'title': f'患者进展: {patient.name}',
         'patient': patient,
-        'dates': json.dumps(dates),
-        'severity_scores': json.dumps(severity_scores),
-        'dimension_data': json.dumps(dimension_data),
-        'assessments': assessments,
+        'assessment_count': assessment_count,
+        'first_assessment': first_assessment,
+        'latest_assessment': latest_assessment,
+        'recent_assessments': recent_assessments,
+        'recent_rows': PROGRESS_RECENT_ROWS,
     }
     return render(request, 'patient_progress.html', context)
+
+
+@login_required
+def predictor_status(request):
+    """预测器加载状态（版本、加载耗时、内存占用）及微批处理调度指标"""
+    status = {'predictors': registry.stats()}
+    if getattr(settings, 'PREDICTOR_BATCHING', False):
+        status['scheduler'] = get_scheduler().stats()
+    return JsonResponse(status)
+
+
+def metrics(request):
+    """
+    Prometheus 抓取接口，输出 core.utils.metrics 中的全部指标
+
+    仅允许 settings.METRICS_ALLOWED_IPS 中的地址或已登录的管理员访问。
+    """
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
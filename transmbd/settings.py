@@ -30,11 +30,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',  # 放在最前面，请求耗时包含其余中间件
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',  # 按需采样分析，PROFILING_ENABLED = False 时不加载
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -43,7 +45,7 @@ ROOT_URLCONF = 'transmbd.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templating.TimedDjangoTemplates',  # 记录模板渲染耗时的 DjangoTemplates
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -67,6 +69,17 @@ DATABASES = {
     }
 }
 
+# SQLite 连接参数（见 core.signals.configure_sqlite）
+# - WAL：读写可以并发，提交只追加写入日志文件
+# - synchronous=NORMAL：WAL 模式下提交时不再 fsync，仅在检查点时同步；
+#   断电可能丢失最近提交的事务，但不会损坏数据库
+# - busy_timeout：并发写入时最多等待 5 秒获取写锁
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+
 # 密码验证
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,6 +114,30 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 对话归档（python manage.py archive_conversations）
+# 结束超过 ARCHIVE_AFTER_DAYS 天的对话，其消息和评估移入 ARCHIVE_ROOT 下按月压缩的分片
+ARCHIVE_ROOT = os.path.join(BASE_DIR, 'archive')
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_CACHE_SHARDS = 4
+
+# 群体趋势排名（core.utils.cohort，/caregiver/cohort/decline/）
+COHORT_RECENT_COUNT = 5  # 计算近期变化使用的最近评估次数
+COHORT_MIN_ASSESSMENTS = 3  # 参与排名的最少评估次数
+COHORT_MIN_SPAN_DAYS = 7  # 参与排名的最短评估跨度（天），跨度过短时每天的斜率没有意义
+COHORT_REBUILD_SECONDS = 600  # 全量重新载入的间隔（秒），期间只增量读取新评估
+
+# 运行指标（/metrics，Prometheus 文本格式）
+METRICS_ENABLED = True  # 关闭后中间件和计时装饰器不再记录
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # 无需登录即可抓取 /metrics 的地址
+
+# 按需采样分析（core.middleware.ProfilingMiddleware），结果保存在 MEDIA_ROOT/profiles/，可在管理后台查看
+# 管理员访问页面时加 ?profile=1，或在请求头 X-Profile 中带上 python manage.py profiling_token 生成的令牌
+PROFILING_ENABLED = True  # 关闭后中间件不加载
+PROFILING_SAMPLE_RATE = 0.0  # 自动分析的线上请求比例（0.01 表示 1%）
+PROFILING_INTERVAL_MS = 5  # 采样间隔（毫秒）
+PROFILING_TOKEN_MAX_AGE = 3600  # X-Profile 令牌有效期（秒）
+PROFILING_MAX_CAPTURES = 200  # 最多保留的分析记录数
+
 # 默认主键字段类型
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -113,6 +150,24 @@ LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = 'caregiver_dashboard'
 LOGOUT_REDIRECT_URL = 'index'
 
+# 缓存设置
+# pages：照护人员页面的片段缓存（见 core/utils/page_cache.py），使用本地文件，
+# 同一台机器上的多个工作进程共享缓存和失效版本号，无需额外的缓存服务
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'pages'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+PAGE_CACHE_ALIAS = 'pages'
+PAGE_CACHE_TIMEOUT = 300  # 片段缓存有效期（秒），限制“进行中 N 分钟”等相对时间的陈旧程度；0 表示不缓存
+
 # 会话设置
 SESSION_COOKIE_AGE = 86400  # 1天
 SESSION_SAVE_EVERY_REQUEST = True
@@ -122,3 +177,18 @@ MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 
 # 运行模式
 DEMO_MODE = True  # 演示模式，用于本地演示
+
+# 预测器设置
+PREDICTOR_BACKEND = 'rules'  # 使用的预测器后端名称（见 core/utils/registry.py）
+RULE_PACK_PATH = os.path.join(BASE_DIR, 'rules', 'rules.json')  # 规则包源文件，修改后自动热替换
+RULE_PACK_COMPILED_DIR = os.path.join(BASE_DIR, 'cache', 'rules')  # 编译后的规则包，各工作进程共享映射
+RULE_PACK_CHECK_INTERVAL = 5.0  # 检查规则包文件变化的间隔（秒）
+PREDICTOR_WARMUP = True  # 服务进程启动时（WSGI/ASGI 入口）预先加载预测器
+PREDICTOR_BATCHING = False  # 是否通过微批处理调度器合并并发推理请求
+PREDICTOR_BATCH_MAX_SIZE = 32  # 每批最多请求数
+PREDICTOR_BATCH_MAX_WAIT_MS = 5.0  # 收集一批的最长等待时间（毫秒）
+PREDICTION_CACHE_SIZE = 10000  # 预测结果缓存容量，0 表示不启用缓存
+PREDICTION_CACHE_TTL = 3600  # 预测结果缓存有效期（秒）
+REPORT_CACHE_SIZE = 10000  # 评估报告缓存容量（按评估和规则集/报告模板版本），0 表示不启用缓存
+REPORT_WORKERS = None  # generate_reports 命令默认的进程数，None 表示 CPU 核数
+RESCORE_CHECKPOINT = BASE_DIR / 'rescore-checkpoint.json'  # rescore_messages 命令的检查点文件
@@ -2,4 +2,9 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transmbd.settings')
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# 服务进程启动时预热预测器，避免首个请求承担模型加载开销
+from core.utils.registry import warm_up_from_settings  # noqa: E402
+
+warm_up_from_settings()
\ No newline at end of file